@@ -0,0 +1,215 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+
+from adsingestp import utils
+
+# parser instances of the current worker thread or process, by (input format, options)
+_local = threading.local()
+
+# AsyncParser used by parse_async
+_default = None
+
+
+def _get_parser(input_format, options):
+    """
+    :param input_format: key of adsingestp.registry.PARSERS
+    :param options: tuple of (name, value) constructor options
+    :return: parser instance of the current worker, created the first time it's needed
+    """
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+        # loads the author name data once per process
+        utils.get_author_names()
+    key = (input_format, options)
+    if key not in parsers:
+        from adsingestp.registry import create_parser
+
+        parsers[key] = create_parser(input_format, **dict(options))
+    return parsers[key]
+
+
+def _parse(input_format, options, data):
+    """
+    Parses a document in a worker thread or process
+    :param input_format: key of adsingestp.registry.PARSERS
+    :param options: tuple of (name, value) constructor options
+    :param data: input, see IngestBase.read_input
+    :return: output of the parser
+    """
+    # parsers reset their state at the start of each document, so one instance is reused
+    return _get_parser(input_format, options).parse(data)
+
+
+class AsyncParser(object):
+    """
+    Parses documents from asyncio code without blocking the event loop: parsing is CPU bound, so
+    it's run in a pool of worker threads or processes, each of which keeps a parser instance per
+    input format. The number of documents being parsed or waiting for a worker is limited, so
+    that a fast producer doesn't queue up an unbounded number of them.
+
+    Threads share the GIL, so they keep the event loop responsive but parse one document at a
+    time; processes parse in parallel, at the cost of pickling the input and output.
+
+    Example:
+
+        async with AsyncParser("process", max_workers=4) as parser:
+            output = await parser.parse("jats", text)
+            async for output in parser.parse_stream("jats", texts):
+                ...
+    """
+
+    EXECUTORS = ["thread", "process"]
+
+    def __init__(self, executor="thread", max_workers=None, max_in_flight=None, **options):
+        """
+        :param executor: 'thread' (default) or 'process' for a pool of worker threads or processes
+            created for this instance, or a concurrent.futures.Executor, which close leaves open
+        :param max_workers: integer, number of workers of the pool created for this instance; by
+            default, as many as concurrent.futures uses by default
+        :param max_in_flight: integer, number of documents being parsed or waiting for a worker at
+            a time; by default, twice the number of workers
+        :param options: constructor options of the parsers, e.g. references="none"; each parser is
+            given the options it accepts, see adsingestp.registry.create_parser
+        """
+        if isinstance(executor, concurrent.futures.Executor):
+            self.executor = executor
+            self._owns_executor = False
+        elif executor == "thread":
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers, thread_name_prefix="adsingestp"
+            )
+            self._owns_executor = True
+        elif executor == "process":
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+            self._owns_executor = True
+        else:
+            raise ValueError(
+                "Unknown executor %s, must be one of %s or an Executor"
+                % (executor, self.EXECUTORS)
+            )
+        if max_in_flight is None:
+            max_in_flight = 2 * getattr(self.executor, "_max_workers", 1)
+        self.max_in_flight = max_in_flight
+        self.options = tuple(sorted(options.items()))
+        # (event loop, semaphore limiting the documents in flight), see _get_semaphore
+        self._semaphore = (None, None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Shuts down the pool of workers, if it was created for this instance
+        :return: none
+        """
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    def _get_semaphore(self):
+        """
+        :return: semaphore limiting the documents in flight, of the running event loop; an
+            instance can be used by one event loop at a time, e.g. in successive asyncio.run calls
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.max_in_flight))
+        return self._semaphore[1]
+
+    async def _submit(self, input_format, data):
+        """
+        Waits until fewer than max_in_flight documents are in flight, and submits one to the pool
+        :param input_format: key of adsingestp.registry.PARSERS
+        :param data: input, see IngestBase.read_input
+        :return: asyncio future of the output of the parser
+        """
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, _parse, input_format, self.options, data)
+        future.add_done_callback(lambda f: semaphore.release())
+        return future
+
+    async def parse(self, input_format, data):
+        """
+        :param input_format: key of adsingestp.registry.PARSERS, e.g. "jats"
+        :param data: input, see IngestBase.read_input; file objects can't be sent to processes
+        :return: output of the parser
+        """
+        return await (await self._submit(input_format, data))
+
+    async def parse_stream(self, input_format, inputs, ordered=True, return_exceptions=False):
+        """
+        Parses a stream of documents, with up to max_in_flight of them being parsed, or parsed
+        and waiting to be yielded, at a time
+
+        :param input_format: key of adsingestp.registry.PARSERS, e.g. "jats"
+        :param inputs: iterable or async iterable of inputs, see parse
+        :param ordered: boolean, set to False to yield outputs as soon as they're ready rather than
+            in input order
+        :param return_exceptions: boolean, set to True to yield the exception raised by a parser
+            in place of its output, rather than raising it, which ends the stream
+        :return: async iterator of outputs
+        """
+        pending = collections.deque() if ordered else set()
+
+        async def wait():
+            if ordered:
+                done = [pending.popleft()]
+                await asyncio.wait(done)
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+            return done
+
+        def result(future):
+            if return_exceptions and future.exception() is not None:
+                return future.exception()
+            return future.result()
+
+        if not hasattr(inputs, "__aiter__"):
+            inputs = _aiter(inputs)
+        try:
+            async for data in inputs:
+                while len(pending) >= self.max_in_flight:
+                    for future in await wait():
+                        yield result(future)
+                future = await self._submit(input_format, data)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+            while pending:
+                for future in await wait():
+                    yield result(future)
+        finally:
+            # e.g. after an error, or if the caller stops iterating
+            for future in pending:
+                future.cancel()
+
+
+async def _aiter(iterable):
+    """
+    :param iterable: iterable
+    :return: async iterator of its items
+    """
+    for item in iterable:
+        yield item
+
+
+async def parse_async(input_format, data):
+    """
+    Parses a document in a pool of worker threads shared by all callers, see AsyncParser
+    :param input_format: key of adsingestp.registry.PARSERS, e.g. "jats"
+    :param data: input, see IngestBase.read_input
+    :return: output of the parser
+    """
+    global _default
+    if _default is None:
+        _default = AsyncParser()
+    return await _default.parse(input_format, data)
@@ -0,0 +1,265 @@
+import collections
+import hashlib
+import logging
+import sqlite3
+import time
+
+from adsingestp import serializer
+from adsingestp.version import __version__
+
+logger = logging.getLogger(__name__)
+
+# counters kept in the cache database, see ResultCache.stats
+COUNTERS = ["hits", "misses", "evictions", "bytes"]
+
+# number of lookups whose updates are kept in memory before get writes them, see ResultCache
+FLUSH_LOOKUPS = 1000
+
+
+class ResultCache(object):
+    """
+    On-disk cache of parser output, to skip parsing input files that were parsed before, e.g. when
+    a publisher delivers the same files again. Results are keyed by a hash of the input bytes, the
+    parser class, its options (see IngestBase.OPTIONS) and the adsingestp version, so upgrading
+    adsingestp or changing the options doesn't return stale output.
+
+    The cache is a SQLite database, which can be shared by any number of processes on the same
+    host: each result is written in a transaction, so readers never see a partial result. When the
+    results take up more than max_bytes, the least recently used ones are removed.
+
+    Lookups only read the database. The access time of a hit and the hit and miss counters are
+    kept in memory, and written by put, stats and close, or every FLUSH_LOOKUPS lookups without
+    waiting for the write lock (if another process holds it, they're kept for the next time).
+    Updates still pending when a process is killed are lost, which only makes the counters and the
+    least recently used order slightly off.
+
+    Example:
+
+        cache = ResultCache("results.db", max_bytes=10 * 2**30)
+        output = cache.parse(JATSParser(), text)
+    """
+
+    def __init__(self, path, max_bytes=None, timeout=60.0):
+        """
+        :param path: path to the SQLite database, created if it doesn't exist
+        :param max_bytes: integer, total size of the cached results to keep, or None (default) to
+            keep all of them
+        :param timeout: seconds to wait for another process that's writing to the cache
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        # hits and misses of this instance; see stats for the totals of all processes
+        self.hits = 0
+        self.misses = 0
+        # updates not written yet, see flush: counter increments, and access times by key
+        self._counts = collections.Counter()
+        self._accessed = {}
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        # in WAL mode, readers don't wait for writers, which only wait for each other
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        with self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key BLOB PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL,
+                    value BLOB NOT NULL
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+                CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN
+                    UPDATE counters SET value = value + new.size WHERE name = 'bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results BEGIN
+                    UPDATE counters SET value = value + new.size - old.size WHERE name = 'bytes';
+                END;
+                CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN
+                    UPDATE counters SET value = value - old.size WHERE name = 'bytes';
+                END;
+                """
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO counters VALUES (?, 0)", [(c,) for c in COUNTERS]
+            )
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def key(self, parser, data):
+        """
+        :param parser: parser instance
+        :param data: input, str or bytes
+        :return: 32 byte digest
+        """
+        parser_class = type(parser)
+        options = sorted((name, getattr(parser, name, None)) for name in parser.OPTIONS)
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(
+            repr(
+                (parser_class.__module__, parser_class.__qualname__, options, __version__)
+            ).encode("utf-8")
+        )
+        digest.update(b"\0")
+        digest.update(data.encode("utf-8") if isinstance(data, str) else data)
+        return digest.digest()
+
+    def get(self, key):
+        """
+        :param key: cache key, see key
+        :return: cached JSON bytes, or None
+        """
+        row = self.connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self._counts["misses"] += 1
+        else:
+            self.hits += 1
+            self._counts["hits"] += 1
+            self._accessed[key] = time.time()
+        if self._counts["hits"] + self._counts["misses"] >= FLUSH_LOOKUPS:
+            self.flush(wait=False)
+        return row[0] if row is not None else None
+
+    def flush(self, wait=True):
+        """
+        Writes the access times and counter increments of the lookups made since the last update
+        :param wait: boolean, set to False to keep the updates for later, rather than wait, if
+            another process is writing to the cache
+        :return: none
+        """
+        if not self._counts and not self._accessed:
+            return
+        if not wait:
+            self.connection.execute("PRAGMA busy_timeout = 0")
+        try:
+            with self.connection:
+                self._write_pending()
+        except sqlite3.OperationalError as err:
+            if wait or "locked" not in str(err):
+                raise
+            return
+        finally:
+            if not wait:
+                self.connection.execute("PRAGMA busy_timeout = %d" % (self.timeout * 1000))
+        self._counts.clear()
+        self._accessed.clear()
+
+    def _write_pending(self):
+        """
+        Writes the pending updates, in the current transaction; the caller clears them once it's
+        committed
+        :return: none
+        """
+        self.connection.executemany(
+            "UPDATE results SET accessed = MAX(accessed, ?) WHERE key = ?",
+            [(accessed, key) for key, accessed in self._accessed.items()],
+        )
+        for name, increment in self._counts.items():
+            self._count(name, increment)
+
+    def put(self, key, value):
+        """
+        :param key: cache key, see key
+        :param value: JSON bytes
+        :return: none
+        """
+        with self.connection:
+            # the pending access times are written first, for _evict
+            self._write_pending()
+            self.connection.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "size = excluded.size, accessed = excluded.accessed, value = excluded.value",
+                (key, len(value), time.time(), value),
+            )
+            if self.max_bytes is not None:
+                self._evict()
+        self._counts.clear()
+        self._accessed.clear()
+
+    def _count(self, name, increment=1):
+        """
+        :param name: counter name, see COUNTERS
+        :param increment: integer
+        :return: none
+        """
+        self.connection.execute(
+            "UPDATE counters SET value = value + ? WHERE name = ?", (increment, name)
+        )
+
+    def _evict(self):
+        """
+        Removes the least recently used results while the cache is larger than max_bytes
+        :return: none
+        """
+        excess = self._counter("bytes") - self.max_bytes
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM results ORDER BY accessed"
+        ):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM results WHERE key = ?", keys)
+        self._count("evictions", len(keys))
+        logger.debug("Evicted %s results from %s", len(keys), self.path)
+
+    def _counter(self, name):
+        """
+        :param name: counter name, see COUNTERS
+        :return: integer
+        """
+        return self.connection.execute(
+            "SELECT value FROM counters WHERE name = ?", (name,)
+        ).fetchone()[0]
+
+    def stats(self):
+        """
+        :return: dictionary of the totals of all processes using the cache: hits, misses, evictions
+            and bytes (total size of the cached results), and the number of cached results
+        """
+        self.flush()
+        stats = dict(self.connection.execute("SELECT name, value FROM counters"))
+        stats["results"] = len(self)
+        return stats
+
+    def clear(self):
+        """
+        Removes all cached results, and resets the counters
+        :return: none
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+            self.connection.execute("UPDATE counters SET value = 0")
+        self.hits = self.misses = 0
+        self._counts.clear()
+        self._accessed.clear()
+
+    def parse(self, parser, text):
+        """
+        Returns the cached output of parser.parse(text), or parses text and caches the output. The
+        output of a cached result is as it was when it was cached, including its parsedTime;
+        dictionaries are stored as JSON, so tuples in the output come back as lists. Parsers
+        created with references="offsets" always parse, as they set reference_spans.
+
+        :param parser: parser instance
+        :param text: input, see IngestBase.read_input
+        :return: output of parser.parse
+        """
+        data = parser.read_input(text)
+        if getattr(parser, "references", None) == "offsets":
+            return parser.parse(data)
+        key = self.key(parser, data)
+        value = self.get(key)
+        if value is not None:
+            return value if parser.output == "json" else serializer.loads(value)
+
+        output = parser.parse(data)
+        self.put(key, output if isinstance(output, bytes) else serializer.dumps(output))
+        return output
@@ -1,5 +1,19 @@
+import collections
+import glob
+import multiprocessing
+import multiprocessing.util
+import os
+
 import click
 
+from adsingestp import utils as ingest_utils
+from adsingestp.cache import ResultCache
+from adsingestp.incremental import Manifest, data_hash, parser_fingerprint
+from adsingestp.ingest_exceptions import IngestParserException
+from adsingestp.registry import AUTO, PARSERS, Dispatcher
+from adsingestp.resolver import ReferenceIndex
+from adsingestp.writer import NDJSONWriter, QueuedWriter
+
 try:
     import lvtn1_utils as utils
 
@@ -11,6 +25,152 @@ except ImportError:
     config = {}
     logger = logging.getLogger("adsingestp.cli")
 
+# state of the current worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(input_format, cache=None, cache_size=None, hash_inputs=False):
+    """
+    Sets up a worker process: creates the parser and loads the author name data once, rather
+    than for every file
+
+    :param input_format: key of PARSERS, or AUTO to pick the parser of each file by its contents
+    :param cache: path to a ResultCache database, or None to parse every file
+    :param cache_size: integer, max_bytes of the ResultCache
+    :param hash_inputs: boolean, set to True for _parse_file to return the size, modification time
+        and hash of each input as it was read, see Manifest.update
+    :return: none
+    """
+    _worker["parser"] = Dispatcher() if input_format == AUTO else PARSERS[input_format]()
+    _worker["cache"] = ResultCache(cache, max_bytes=cache_size) if cache else None
+    if _worker["cache"] is not None and multiprocessing.parent_process() is not None:
+        # writes the updates the cache hasn't written yet (see ResultCache.flush) when the worker
+        # process exits
+        multiprocessing.util.Finalize(_worker["cache"], _worker["cache"].close, exitpriority=0)
+    _worker["hash_inputs"] = hash_inputs
+    ingest_utils.get_author_names()
+
+
+def _parse_file(filename):
+    """
+    Parses one input file in a worker process
+
+    :param filename: path to input file
+    :return: dictionary, {"file": filename, "record": parsed record} or, if the file couldn't be
+        read or parsed, {"file": filename, "error": {"type": exception class, "message": message}};
+        with hash_inputs (see _init_worker), "input" is {"size": size, "mtime": modification time,
+        "hash": hash} of the bytes that were parsed
+    """
+    result = {"file": filename}
+    try:
+        with open(filename, "rb") as fp:
+            # the file is stat'ed before it's read, so that a change made while it's read is seen
+            # as a change by the next run
+            stat = os.fstat(fp.fileno())
+            data = fp.read()
+        if _worker["hash_inputs"]:
+            result["input"] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": data_hash(data),
+            }
+        parser = _worker["parser"]
+        if isinstance(parser, Dispatcher):
+            parser = parser.parser_for(data)
+        # parsers reset their state at the start of each document, so one instance is reused
+        if _worker["cache"] is not None:
+            result["record"] = _worker["cache"].parse(parser, data)
+        else:
+            result["record"] = parser.parse(data)
+    except (IngestParserException, OSError) as err:
+        logger.warning("Error parsing %s: %s", filename, err)
+        result["error"] = {"type": type(err).__name__, "message": str(err)}
+    except Exception as err:
+        logger.exception("Unexpected error parsing %s", filename)
+        result["error"] = {"type": type(err).__name__, "message": str(err)}
+    return result
+
+
+def _find_files(inputs, manifest=None):
+    """
+    Expands the input arguments into a list of files
+
+    :param inputs: list of files, directories (all files in them) and/or glob patterns
+    :param manifest: file object listing one input file per line, or None
+    :return: list of paths
+    """
+    filenames = []
+    for i in inputs:
+        if os.path.isdir(i):
+            filenames.extend(
+                sorted(
+                    os.path.join(i, f) for f in os.listdir(i) if os.path.isfile(os.path.join(i, f))
+                )
+            )
+        elif glob.has_magic(i):
+            filenames.extend(sorted(glob.glob(i)))
+        else:
+            filenames.append(i)
+
+    if manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                filenames.append(line)
+
+    return filenames
+
+
+def ingest_files(
+    filenames,
+    input_format,
+    workers=1,
+    chunksize=8,
+    ordered=True,
+    cache=None,
+    cache_size=None,
+    hash_inputs=False,
+):
+    """
+    Parses input files, using a pool of worker processes
+
+    :param filenames: list of paths to input files
+    :param input_format: key of PARSERS, or AUTO to pick the parser of each file by its contents
+    :param workers: integer, number of worker processes; with 1, files are parsed in this process
+    :param chunksize: integer, number of files sent to a worker at a time
+    :param ordered: boolean, set to False to return results as soon as they're ready rather than in
+        input order
+    :param cache: path to a ResultCache database, to return the cached output of files that were
+        parsed before rather than parsing them again; None (default) parses every file
+    :param cache_size: integer, max_bytes of the ResultCache
+    :param hash_inputs: boolean, set to True to return the size, modification time and hash of
+        each input as it was read, see _parse_file
+    :return: iterator of dictionaries, see _parse_file
+    """
+    if workers <= 1:
+        _init_worker(input_format, cache, cache_size, hash_inputs)
+        for f in filenames:
+            yield _parse_file(f)
+        if _worker["cache"] is not None:
+            # writes the updates the cache hasn't written yet, see ResultCache.flush
+            _worker["cache"].close()
+        return
+
+    with multiprocessing.Pool(
+        workers,
+        initializer=_init_worker,
+        initargs=(input_format, cache, cache_size, hash_inputs),
+    ) as pool:
+        if ordered:
+            results = pool.imap(_parse_file, filenames, chunksize)
+        else:
+            results = pool.imap_unordered(_parse_file, filenames, chunksize)
+        for r in results:
+            yield r
+        # lets the workers exit, rather than be terminated, so that they close their cache
+        pool.close()
+        pool.join()
+
 
 @click.group()
 def cli():
@@ -23,5 +183,298 @@ def hello():
     print("Hello World!")
 
 
+@cli.command()
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--format",
+    "-f",
+    "input_format",
+    type=click.Choice(sorted(PARSERS) + [AUTO], case_sensitive=False),
+    required=True,
+    help="Format of the input files; auto detects the format of each file from its first bytes",
+)
+@click.option(
+    "--manifest", "-m", type=click.File("r"), help="File listing one input file per line"
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="Output file (NDJSON); with --max-bytes, a path containing {shard}, which is replaced "
+    "by the shard number, e.g. records-{shard:04d}.jsonl",
+)
+@click.option("--compression", type=click.Choice(["gzip", "zstd"]), help="Compress the output")
+@click.option(
+    "--max-bytes",
+    type=click.IntRange(min=1),
+    help="Start a new output file once the current one reaches this size",
+)
+@click.option(
+    "--cache",
+    type=click.Path(dir_okay=False),
+    help="Result cache database: files that were parsed before aren't parsed again",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    help="Size of the result cache, in bytes; the least recently used results are removed",
+)
+@click.option(
+    "--queue-size",
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="Number of parsed records waiting to be written, before parsing waits for the output",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of worker processes",
+)
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of files sent to a worker at a time",
+)
+@click.option(
+    "--ordered/--unordered",
+    default=True,
+    show_default=True,
+    help="Write the output in input order, or as soon as each file is parsed",
+)
+def ingest(
+    inputs,
+    input_format,
+    manifest,
+    output,
+    compression,
+    max_bytes,
+    cache,
+    cache_size,
+    queue_size,
+    workers,
+    chunksize,
+    ordered,
+):
+    """Parse INPUTS (files, directories and/or glob patterns) and write one JSON line per file"""
+    filenames = _find_files(inputs, manifest)
+    if not filenames:
+        raise click.UsageError("No input files given")
+
+    if output == "-":
+        output = click.open_file("-", "wb")
+    try:
+        record_writer = NDJSONWriter(output, compression=compression, max_bytes=max_bytes)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+
+    if cache:
+        result_cache = ResultCache(cache, max_bytes=cache_size)
+        cache_stats = result_cache.stats()
+
+    errors = 0
+    with QueuedWriter(record_writer, maxsize=queue_size) as queued_writer:
+        for result in ingest_files(
+            filenames, input_format.lower(), workers, chunksize, ordered, cache, cache_size
+        ):
+            if "error" in result:
+                errors += 1
+            queued_writer.put(result)
+
+    if cache:
+        stats = result_cache.stats()
+        result_cache.close()
+        logger.info(
+            "Result cache: %s hits, %s misses, %s results (%s bytes)",
+            stats["hits"] - cache_stats["hits"],
+            stats["misses"] - cache_stats["misses"],
+            stats["results"],
+            stats["bytes"],
+        )
+
+    logger.info("Parsed %s files, %s errors", len(filenames) - errors, errors)
+
+
+@cli.command()
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--format",
+    "-f",
+    "input_format",
+    type=click.Choice(sorted(PARSERS), case_sensitive=False),
+    required=True,
+    help="Format of the input files",
+)
+@click.option(
+    "--manifest", "-m", type=click.File("r"), help="File listing one input file per line"
+)
+@click.option(
+    "--state",
+    "-s",
+    "state_path",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Manifest of the files processed by earlier runs (NDJSON), updated by this run; with "
+    "--shards, a path containing {shard}, e.g. manifest-{shard}.jsonl",
+)
+@click.option(
+    "--shard", type=click.IntRange(min=0), default=0, show_default=True, help="Shard to process"
+)
+@click.option(
+    "--shards",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of shards the input files are split into, e.g. one per node",
+)
+@click.option(
+    "--verify",
+    is_flag=True,
+    help="Hash every file, even if its size and modification time are unchanged",
+)
+@click.option(
+    "--changed-only", is_flag=True, help="Only write the records whose output has changed"
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default="-",
+    help="Output file (NDJSON)",
+)
+@click.option("--compression", type=click.Choice(["gzip", "zstd"]), help="Compress the output")
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=os.cpu_count(),
+    show_default=True,
+    help="Number of worker processes",
+)
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of files sent to a worker at a time",
+)
+def reprocess(
+    inputs,
+    input_format,
+    manifest,
+    state_path,
+    shard,
+    shards,
+    verify,
+    changed_only,
+    output,
+    compression,
+    workers,
+    chunksize,
+):
+    """Parse the files of INPUTS (files, directories and/or glob patterns) that are new or have
+    changed since the last run, or whose parser has changed, and write one JSON line per file"""
+    filenames = _find_files(inputs, manifest)
+    if not filenames:
+        raise click.UsageError("No input files given")
+
+    try:
+        state = Manifest(state_path, shard, shards)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    input_format = input_format.lower()
+    parser = PARSERS[input_format]()
+    fingerprint = parser_fingerprint(parser)
+
+    selected = state.select(filenames)
+    todo = []
+    reasons = collections.Counter()
+    for f in selected:
+        try:
+            reason = state.check(f, fingerprint, verify)
+        except OSError as err:
+            logger.warning("Error reading %s: %s", f, err)
+            continue
+        if reason:
+            todo.append(f)
+            reasons[reason] += 1
+    logger.info(
+        "%s of %s files in shard %s to process: %s",
+        len(todo),
+        len(selected),
+        shard,
+        ", ".join("%s %s" % (n, reason) for reason, n in sorted(reasons.items())) or "none",
+    )
+
+    if output == "-":
+        output = click.open_file("-", "wb")
+    try:
+        record_writer = NDJSONWriter(output, compression=compression)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+
+    changed = errors = 0
+    try:
+        with QueuedWriter(record_writer) as queued_writer:
+            for result in ingest_files(todo, input_format, workers, chunksize, hash_inputs=True):
+                error = None
+                if "error" in result:
+                    errors += 1
+                    error = "%(type)s: %(message)s" % result["error"]
+                # the manifest records the input that was parsed, even if the file has changed
+                # since; it isn't part of the output
+                input_stat = result.pop("input", None)
+                try:
+                    output_changed = state.update(
+                        result["file"],
+                        parser,
+                        fingerprint,
+                        result.get("record"),
+                        error,
+                        input_stat,
+                    )
+                except OSError as err:
+                    logger.warning("Error reading %s: %s", result["file"], err)
+                    continue
+                if output_changed:
+                    changed += 1
+                if output_changed or not changed_only:
+                    queued_writer.put(result)
+    finally:
+        # files processed before an interruption aren't processed again
+        state.save()
+
+    logger.info(
+        "Processed %s files, %s errors, %s with changed output", len(todo), errors, changed
+    )
+
+
+@cli.command("index-references")
+@click.argument("index", type=click.Path(dir_okay=False))
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--manifest", "-m", type=click.File("r"), help="File listing one result file per line"
+)
+def index_references(index, inputs, manifest):
+    """Add the references of the resolver result files INPUTS (files, directories and/or glob
+    patterns) to the SQLite index INDEX, see JATSParser.citation_context"""
+    filenames = _find_files(inputs, manifest)
+    if not filenames:
+        raise click.UsageError("No input files given")
+
+    reference_index = ReferenceIndex(index)
+    try:
+        reference_index.build(filenames)
+        click.echo("%s references in %s" % (len(reference_index), index))
+    finally:
+        reference_index.close()
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,259 @@
+import glob
+import hashlib
+import inspect
+import logging
+import os
+import sys
+import tempfile
+
+from adsingestp import serializer
+from adsingestp.version import __version__
+
+logger = logging.getLogger(__name__)
+
+# number of bytes file_hash reads at a time
+HASH_BLOCKSIZE = 1024 * 1024
+
+# why Manifest.check wants a file processed
+NEW = "new"
+CHANGED = "changed"
+PARSER_CHANGED = "parser changed"
+
+
+def file_hash(path):
+    """
+    :param path: path to a file
+    :return: hex digest of the contents of the file
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(HASH_BLOCKSIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def data_hash(data):
+    """
+    :param data: bytes, e.g. the contents of a file as it was read for parsing
+    :return: hex digest, equal to file_hash of a file with these contents
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def output_hash(record):
+    """
+    Hash of a parsed record, leaving out its parsedTime, so that it only changes if the output does
+    :param record: record dictionary, as returned by a parser
+    :return: hex digest
+    """
+    record_data = record.get("recordData", {})
+    if "parsedTime" in record_data:
+        record = dict(record, recordData=dict(record_data, parsedTime=""))
+    return hashlib.blake2b(serializer.dumps(record), digest_size=16).hexdigest()
+
+
+def parser_fingerprint(parser):
+    """
+    Hash of what the output of a parser depends on: the source of the modules the parser and its
+    base classes are defined in, and of adsingestp.utils, its options (see IngestBase.OPTIONS) and
+    the adsingestp version. It changes when any of them does, e.g. when adsingestp is upgraded.
+
+    :param parser: parser instance
+    :return: hex digest
+    """
+    modules = {"adsingestp.utils"}
+    for cls in type(parser).__mro__:
+        if cls.__module__.split(".")[0] == "adsingestp":
+            modules.add(cls.__module__)
+
+    digest = hashlib.blake2b(digest_size=16)
+    for module in sorted(modules):
+        digest.update(module.encode("utf-8"))
+        digest.update(inspect.getsource(sys.modules[module]).encode("utf-8"))
+    options = sorted((name, getattr(parser, name, None)) for name in parser.OPTIONS)
+    digest.update(repr((options, __version__)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def shard_of(path, shards):
+    """
+    :param path: path to an input file
+    :param shards: integer, number of shards
+    :return: integer, the shard the file is in, from 0 to shards - 1
+    """
+    digest = hashlib.blake2b(path.encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class Manifest(object):
+    """
+    Record of the input files processed by earlier runs, to only process new and changed files,
+    and files whose parser has changed, when a corpus is processed again. For each file, it has
+    its size, modification time and hash, the parser and its fingerprint (see parser_fingerprint),
+    the adsingestp version, and the hash of the output (see output_hash) or the error.
+
+    The manifest is an NDJSON file, one line per file. The work can be split between nodes with
+    shards: each node processes the files of its shard (see shard_of), and keeps their manifest in
+    a file of its own, whose path is made by formatting the path of the manifest with the shard
+    number, e.g. "manifest-{shard}.jsonl". The manifests of all shards are read, so that the number
+    of shards can be changed between runs.
+
+    Example:
+
+        manifest = Manifest("manifest-{shard}.jsonl", shard=0, shards=4)
+        fingerprint = parser_fingerprint(parser)
+        for filename in manifest.select(filenames):
+            if manifest.check(filename, fingerprint):
+                output = parser.parse(...)
+                manifest.update(filename, parser, fingerprint, output)
+        manifest.save()
+    """
+
+    def __init__(self, path, shard=0, shards=1):
+        """
+        :param path: path to the manifest file, created by save if it doesn't exist; with more than
+            one shard, a path containing "{shard}"
+        :param shard: integer, shard of this manifest, from 0 to shards - 1
+        :param shards: integer, number of shards
+        """
+        if shards > 1 and "{shard" not in path:
+            raise ValueError("A sharded manifest requires a path containing {shard}")
+        if not 0 <= shard < shards:
+            raise ValueError("Shard %s must be from 0 to %s" % (shard, shards - 1))
+        self.path = path.format(shard=shard)
+        self.shard = shard
+        self.shards = shards
+        # entries by file
+        self.entries = {}
+        # hashes of the files checked by this run, by file
+        self._hashes = {}
+
+        # the other shards' manifests are read too, in case the number of shards has changed; this
+        # shard's is read last, as its entries are the latest
+        paths = []
+        if "{shard" in path:
+            paths = [p for p in sorted(glob.glob(self._glob_pattern(path))) if p != self.path]
+        for p in paths + [self.path]:
+            if os.path.exists(p):
+                self._read(p)
+
+    @staticmethod
+    def _glob_pattern(path):
+        """
+        :param path: manifest path containing "{shard}", or e.g. "{shard:04d}"
+        :return: glob pattern matching the manifest paths of all shards
+        """
+        start = path.index("{shard")
+        end = path.index("}", start) + 1
+        return glob.escape(path[:start]) + "*" + glob.escape(path[end:])
+
+    def _read(self, path):
+        """
+        :param path: path to a manifest file
+        :return: none
+        """
+        with open(path, "rb") as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                entry = serializer.loads(line)
+                if shard_of(entry["file"], self.shards) == self.shard:
+                    self.entries[entry["file"]] = entry
+
+    def select(self, filenames):
+        """
+        :param filenames: list of paths to input files
+        :return: list of the files in this shard
+        """
+        if self.shards == 1:
+            return list(filenames)
+        return [f for f in filenames if shard_of(f, self.shards) == self.shard]
+
+    def check(self, filename, fingerprint, verify=False):
+        """
+        Checks whether a file needs to be processed. Files whose size and modification time are
+        unchanged aren't read, unless verify is set; files that were touched but not changed are
+        hashed, and aren't processed. Files that couldn't be parsed are processed again when they,
+        or the parser, change.
+
+        :param filename: path to an input file
+        :param fingerprint: fingerprint of the parser, see parser_fingerprint
+        :param verify: boolean, set to True to hash files even if their size and modification time
+            are unchanged
+        :return: why the file needs processing (NEW, CHANGED or PARSER_CHANGED), or None
+        """
+        entry = self.entries.get(filename)
+        if entry is None:
+            return NEW
+
+        stat = os.stat(filename)
+        if verify or stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime"]:
+            file_digest = file_hash(filename)
+            if file_digest != entry["hash"]:
+                # kept for update, so that the file isn't read again
+                self._hashes[filename] = file_digest
+                return CHANGED
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime_ns
+
+        if entry["fingerprint"] != fingerprint:
+            return PARSER_CHANGED
+        return None
+
+    def update(self, filename, parser, fingerprint, output=None, error=None, input_stat=None):
+        """
+        Records that a file was processed
+
+        :param filename: path to the input file
+        :param parser: parser instance
+        :param fingerprint: fingerprint of the parser, see parser_fingerprint
+        :param output: record dictionary, or None if the file couldn't be parsed
+        :param error: error message, if the file couldn't be parsed
+        :param input_stat: dictionary with the size, mtime (in ns) and hash (see data_hash) of the
+            input as it was read for parsing, with the file stat'ed before it was read. If it's
+            None, the file is stat'ed and hashed now, so a change made since it was parsed would be
+            recorded as processed.
+        :return: boolean, True if the output (or error) differs from the last run's
+        """
+        if input_stat is None:
+            stat = os.stat(filename)
+            input_stat = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": self._hashes.pop(filename, None) or file_hash(filename),
+            }
+        else:
+            self._hashes.pop(filename, None)
+        parser_class = type(parser)
+        previous = self.entries.get(filename, {})
+        entry = {
+            "file": filename,
+            "size": input_stat["size"],
+            "mtime": input_stat["mtime"],
+            "hash": input_stat["hash"],
+            "parser": "%s.%s" % (parser_class.__module__, parser_class.__qualname__),
+            "fingerprint": fingerprint,
+            "version": __version__,
+            "output": output_hash(output) if output is not None else None,
+        }
+        if error is not None:
+            entry["error"] = error
+        self.entries[filename] = entry
+        return entry["output"] != previous.get("output") or error != previous.get("error")
+
+    def save(self):
+        """
+        Writes the manifest. The file is replaced in one step, so an interrupted run leaves the
+        manifest of the last run.
+        :return: none
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".manifest-")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                for filename in sorted(self.entries):
+                    fp.write(serializer.dumps(self.entries[filename]) + b"\n")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
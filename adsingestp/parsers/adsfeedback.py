@@ -1,21 +1,27 @@
 import json
 import logging
 
-from adsingestp import utils
+from adsingestp import serializer, utils
 from adsingestp.parsers.base import BaseBeautifulSoupParser
 
 logger = logging.getLogger(__name__)
 
 
 class ADSFeedbackParser(BaseBeautifulSoupParser):
-    def __init__(self, json_string=None):
-        super(BaseBeautifulSoupParser, self).__init__()
+    def __init__(self, json_string=None, output="dict"):
+        """
+        :param json_string: JSON text of a feedback form submission, to parse when parse is called
+            without one
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(output=output)
         if json_string:
-            self.data = json.loads(json_string)
+            self.data = json.loads(self.read_input(json_string))
 
     def parse(self, json_string=None, **kwargs):
-        if json_string:
-            self.data = json.loads(json_string)
+        # an empty string is parsed rather than reusing the data of the previous record
+        if json_string is not None:
+            self.data = json.loads(self.read_input(json_string))
         output_metadata = dict()
 
         simple_fields = [
@@ -80,8 +86,10 @@ class ADSFeedbackParser(BaseBeautifulSoupParser):
 
         # Fix names
         old_names = output_metadata["authors"]
-        authparse = utils.AuthorNames()
+        authparse = utils.get_author_names()
         new_names = [authparse.parse(name) for name in old_names]
         output_metadata["authors"] = new_names
 
+        if self.output == "json":
+            return serializer.dumps(output_metadata)
         return output_metadata
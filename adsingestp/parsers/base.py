@@ -1,13 +1,939 @@
+import codecs
+import functools
 import html
+import logging
+import os
 import re
 import warnings
+from collections.abc import Sequence
+from copy import copy
 from datetime import datetime
 
 import bs4
 from bs4 import MarkupResemblesLocatorWarning
+from bs4.builder import HTMLTreeBuilder, TreeBuilder
+from lxml import etree
 
+from adsingestp import serializer, timing
 from adsingestp.ingest_exceptions import WrongFormatException
 
+logger = logging.getLogger(__name__)
+
+# lxml equivalents of the BeautifulSoup tree operations used by the parsers. BeautifulSoup's
+# lxml-xml builder collapses whitespace-only strings and stores comments and processing
+# instructions as strings; LxmlTag.fromstring and these helpers do the same, so that both trees
+# give identical output.
+
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+
+XPATH_FIND = etree.XPath("descendant::*[local-name()=$name or name()=$name][1]")
+XPATH_FIND_ALL = etree.XPath("descendant::*[local-name()=$name or name()=$name]")
+XPATH_FIND_CHILDREN = etree.XPath("child::*[local-name()=$name or name()=$name]")
+# searching a whole document also includes the root element
+XPATH_FIND_DOCUMENT = etree.XPath("descendant-or-self::*[local-name()=$name or name()=$name][1]")
+XPATH_FIND_ALL_DOCUMENT = etree.XPath("descendant-or-self::*[local-name()=$name or name()=$name]")
+
+# target of the processing instructions left in place of removed elements, see _etree_remove
+REMOVED_TARGET = "adsingestp-removed"
+
+# number of bytes IngestBase.iter_chunks reads at a time
+CHUNK_BLOCKSIZE = 1024 * 1024
+
+
+def _etree_is_tag(node):
+    """
+    :param node: lxml node
+    :return: boolean, True for elements and False for comments, processing instructions, etc.
+    """
+    return isinstance(node.tag, str)
+
+
+def _etree_is_removed(node):
+    """
+    :param node: lxml node
+    :return: boolean, True for the placeholder left by _etree_remove
+    """
+    return node.tag is etree.PI and node.target == REMOVED_TARGET
+
+
+def _etree_name(e):
+    """
+    Qualified name of an lxml element, as BeautifulSoup reports it, e.g. "mml:math"
+    :param e: lxml element
+    :return: tag name, including the namespace prefix if any
+    """
+    name = etree.QName(e).localname
+    if e.prefix:
+        return e.prefix + ":" + name
+    return name
+
+
+def _etree_attr_name(e, key):
+    """
+    Attribute name as BeautifulSoup reports it, e.g. "xlink:href"
+    :param e: lxml element
+    :param key: lxml attribute key, e.g. "{http://www.w3.org/1999/xlink}href"
+    :return: attribute name, including the namespace prefix if any
+    """
+    if not key.startswith("{"):
+        return key
+    namespace, name = key[1:].split("}", 1)
+    if namespace == XML_NAMESPACE:
+        return "xml:" + name
+    for prefix, uri in e.nsmap.items():
+        if uri == namespace and prefix:
+            return prefix + ":" + name
+    return name
+
+
+def _etree_attrs(e, parent_nsmap=None):
+    """
+    Equivalent of BeautifulSoup's Tag.attrs, which includes the namespaces declared on the element
+    (lxml doesn't report a namespace redeclared with the same URI, so that is left out)
+    :param e: lxml element
+    :param parent_nsmap: namespaces already declared, defaults to those of the parent element
+    :return: dictionary of attribute names and values
+    """
+    if parent_nsmap is None:
+        parent = e.getparent()
+        parent_nsmap = parent.nsmap if parent is not None else {}
+    attrs = {}
+    for key, value in e.attrib.items():
+        attrs[_etree_attr_name(e, key)] = value
+    for prefix, uri in e.nsmap.items():
+        if parent_nsmap.get(prefix) != uri:
+            attrs["xmlns:" + prefix if prefix else "xmlns"] = uri
+    return attrs
+
+
+def _etree_string(text):
+    """
+    Text as BeautifulSoup stores it: whitespace-only strings become a single newline or space
+    :param text: text or tail of an lxml node
+    :return: string
+    """
+    if text.strip(bs4.BeautifulSoup.ASCII_SPACES):
+        return text
+    if "\n" in text:
+        return "\n"
+    return " "
+
+
+def _etree_normalize(root):
+    """
+    Collapses whitespace-only text in an lxml tree, as BeautifulSoup does while parsing
+    :param root: lxml element
+    :return: none
+    """
+    for node in root.iter():
+        if node.text and node.tag is not etree.PI:
+            node.text = _etree_string(node.text)
+        if node.tail:
+            node.tail = _etree_string(node.tail)
+
+
+def _etree_node_string(node):
+    """
+    String value BeautifulSoup gives a comment or processing instruction
+    :param node: lxml comment or processing instruction
+    :return: string
+    """
+    if node.tag is etree.PI:
+        return node.target + " " + (node.text or "")
+    return node.text or ""
+
+
+def _etree_contents(e):
+    """
+    Equivalent of BeautifulSoup's Tag.contents
+    :param e: lxml element
+    :return: list of strings (text) and lxml nodes (elements, comments, processing instructions)
+    """
+    contents = []
+    if e.text:
+        contents.append(e.text)
+    for c in e:
+        if not _etree_is_removed(c):
+            contents.append(c)
+        if c.tail:
+            contents.append(c.tail)
+    return contents
+
+
+def _etree_strings(e):
+    """
+    Equivalent of BeautifulSoup's Tag._all_strings, i.e. the strings used by get_text
+    :param e: lxml element
+    :return: list of strings
+    """
+    strings = []
+    if e.text:
+        strings.append(e.text)
+    for c in e:
+        if _etree_is_tag(c):
+            strings.extend(_etree_strings(c))
+        if c.tail:
+            strings.append(c.tail)
+    return strings
+
+
+def _etree_tag_string(e):
+    """
+    Equivalent of BeautifulSoup's Tag.string
+    :param e: lxml element
+    :return: string, or None if the element doesn't contain exactly one string
+    """
+    contents = _etree_contents(e)
+    if len(contents) != 1:
+        return None
+    c = contents[0]
+    if isinstance(c, str):
+        return c
+    if _etree_is_tag(c):
+        return _etree_tag_string(c)
+    return _etree_node_string(c)
+
+
+def _etree_remove(e):
+    """
+    Removes an lxml element from its tree. In lxml the text following an element belongs to it,
+    so it is moved to the preceding node; if that already has text, an empty placeholder carries
+    it instead, since BeautifulSoup keeps the two strings separate (e.g. for get_text(separator)).
+    :param e: lxml element
+    :return: none
+    """
+    parent = e.getparent()
+    if parent is None:
+        return
+    if e.tail:
+        previous = e.getprevious()
+        if previous.tail if previous is not None else parent.text:
+            placeholder = etree.PI(REMOVED_TARGET)
+            placeholder.tail = e.tail
+            e.addprevious(placeholder)
+        elif previous is not None:
+            previous.tail = e.tail
+        else:
+            parent.text = e.tail
+    e.tail = None
+    parent.remove(e)
+
+
+def _etree_decode(node, out, parent_nsmap=None):
+    """
+    Serializes an lxml node as BeautifulSoup does (str(tag)): attributes sorted by name, namespace
+    declarations as attributes, empty elements as <tag/>
+    :param node: lxml node or string
+    :param out: list of output strings
+    :param parent_nsmap: namespaces already declared, defaults to those of the parent element
+    :return: none
+    """
+    if isinstance(node, str):
+        out.append(bs4.dammit.EntitySubstitution.substitute_xml(node))
+    elif node.tag is etree.PI:
+        out.append("<?" + _etree_node_string(node) + "?>")
+    elif node.tag is etree.Comment:
+        out.append("<!--" + _etree_node_string(node) + "-->")
+    elif _etree_is_tag(node):
+        name = _etree_name(node)
+        out.append("<" + name)
+        for key, value in sorted(_etree_attrs(node, parent_nsmap).items()):
+            value = bs4.dammit.EntitySubstitution.substitute_xml(value)
+            out.append(
+                " " + key + "=" + bs4.dammit.EntitySubstitution.quoted_attribute_value(value)
+            )
+        contents = _etree_contents(node)
+        if not contents:
+            out.append("/>")
+            return
+        out.append(">")
+        for c in contents:
+            _etree_decode(c, out)
+        out.append("</" + name + ">")
+
+
+def etree_fromsource(source, parser=None):
+    """
+    Parses XML with lxml without making a decoded copy of the input: paths and file objects are
+    read by lxml itself, and the encoding of bytes-like input is detected from the XML declaration
+    :param source: XML text blob, bytes-like object, os.PathLike or binary file object
+    :param parser: etree.XMLParser
+    :return: root element
+    """
+    if isinstance(source, os.PathLike) or hasattr(source, "read"):
+        return etree.parse(source, parser).getroot()
+    return etree.fromstring(source, parser)
+
+
+class LxmlTag(object):
+    """
+    Wrapper giving an lxml element (or document) the subset of the BeautifulSoup Tag interface used by
+    the parsers, so the same extraction code can run against either tree. Name matching follows
+    BeautifulSoup: find("title") matches any element with that local name, and find("mml:math")
+    matches the prefixed name. Lookups use precompiled XPath.
+    """
+
+    def __init__(self, element):
+        self.element = element
+
+    @classmethod
+    def fromstring(cls, input_xml, prune=None):
+        """
+        Parses XML with the settings BeautifulSoup's lxml-xml parser uses
+        :param input_xml: XML text blob, bytes-like object, os.PathLike or binary file object
+        :param prune: function called with the root element before the tree is normalized, e.g. to
+            remove the parts of the document that aren't needed
+        :return: LxmlTag wrapping the lxml document
+        """
+        if isinstance(input_xml, str):
+            input_xml = input_xml.encode("utf-8")
+            parser = etree.XMLParser(recover=True, strip_cdata=False, encoding="utf-8")
+        else:
+            parser = etree.XMLParser(recover=True, strip_cdata=False)
+        root = etree_fromsource(input_xml, parser)
+        if root is None:
+            raise etree.XMLSyntaxError("Document is empty", None, 0, 0)
+        if prune is not None:
+            prune(root)
+        _etree_normalize(root)
+        return cls(root.getroottree())
+
+    def __getattr__(self, name):
+        # tag.year is shorthand for tag.find("year"), as in BeautifulSoup
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.find(name)
+
+    def __call__(self, name, attrs=None, recursive=True):
+        return self.find_all(name, attrs, recursive)
+
+    def __bool__(self):
+        return True
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __copy__(self):
+        # as in BeautifulSoup, a copy is a detached deep copy
+        element = copy(self.element)
+        element.tail = None
+        return LxmlTag(element)
+
+    def __str__(self):
+        element = self.element
+        if isinstance(element, etree._ElementTree):
+            element = element.getroot()
+        out = []
+        _etree_decode(element, out)
+        return "".join(out)
+
+    def _attr_key(self, key):
+        if ":" not in key:
+            return key
+        prefix, name = key.split(":", 1)
+        if prefix == "xml":
+            return "{%s}%s" % (XML_NAMESPACE, name)
+        namespace = self.element.nsmap.get(prefix)
+        if namespace:
+            return "{%s}%s" % (namespace, name)
+        return key
+
+    def _matches(self, element, attrs):
+        for key, value in attrs.items():
+            if LxmlTag(element).get(key) != value:
+                return False
+        return True
+
+    @property
+    def name(self):
+        return etree.QName(self.element).localname
+
+    @property
+    def string(self):
+        return _etree_tag_string(self.element)
+
+    @property
+    def text(self):
+        return self.get_text()
+
+    @property
+    def attrs(self):
+        return _etree_attrs(self.element)
+
+    @property
+    def contents(self):
+        contents = []
+        for c in _etree_contents(self.element):
+            if isinstance(c, str):
+                contents.append(bs4.NavigableString(c))
+            elif _etree_is_tag(c):
+                contents.append(LxmlTag(c))
+            elif c.tag is etree.PI:
+                contents.append(bs4.XMLProcessingInstruction(_etree_node_string(c)))
+            else:
+                contents.append(bs4.Comment(_etree_node_string(c)))
+        return contents
+
+    @property
+    def children(self):
+        for c in self.element:
+            if _etree_is_tag(c):
+                yield LxmlTag(c)
+
+    def get(self, key, default=None):
+        return self.element.get(self._attr_key(key), default)
+
+    def has_attr(self, key):
+        return self.get(key) is not None
+
+    def find(self, name, attrs=None):
+        if not attrs:
+            if isinstance(self.element, etree._ElementTree):
+                found = XPATH_FIND_DOCUMENT(self.element.getroot(), name=name)
+            else:
+                found = XPATH_FIND(self.element, name=name)
+            return LxmlTag(found[0]) if found else None
+        found = self.find_all(name, attrs)
+        return found[0] if found else None
+
+    def find_all(self, name, attrs=None, recursive=True):
+        if isinstance(self.element, etree._ElementTree):
+            found = XPATH_FIND_ALL_DOCUMENT(self.element.getroot(), name=name)
+        elif recursive:
+            found = XPATH_FIND_ALL(self.element, name=name)
+        else:
+            found = XPATH_FIND_CHILDREN(self.element, name=name)
+        if attrs:
+            found = [e for e in found if self._matches(e, attrs)]
+        return [LxmlTag(e) for e in found]
+
+    def get_text(self, separator="", strip=False):
+        strings = _etree_strings(self.element)
+        if strip:
+            strings = [s.strip() for s in strings if s.strip()]
+        return separator.join(strings)
+
+    def decode_contents(self):
+        out = []
+        for c in _etree_contents(self.element):
+            _etree_decode(c, out)
+        return "".join(out)
+
+    def append(self, tag):
+        self.element.append(tag.element)
+
+    def insert(self, position, tag):
+        """
+        Inserts a tag or string into the contents, as BeautifulSoup's Tag.insert does
+        :param position: index in contents; positions past the end append
+        :param tag: LxmlTag or string
+        :return: none
+        """
+        e = self.element
+        if isinstance(tag, LxmlTag):
+            node = tag.element
+            if node.getparent() is e:
+                # as in BeautifulSoup, the position counts the tag where it is now
+                if any(c is node for c in _etree_contents(e)[:position]):
+                    position -= 1
+            if node.getparent() is not None:
+                _etree_remove(node)
+            node.tail = None
+        else:
+            # strings are carried by a placeholder, which is dropped below if it isn't needed
+            node = etree.PI(REMOVED_TARGET)
+            node.tail = tag
+
+        # the content the new one goes before: a child, or the text or tail of a child
+        # (the element itself for its text)
+        before, string_of = None, None
+        index = 0
+        if e.text:
+            if index == position:
+                string_of = e
+            index += 1
+        if string_of is None:
+            for c in e:
+                if not _etree_is_removed(c):
+                    if index == position:
+                        before = c
+                        break
+                    index += 1
+                if c.tail:
+                    if index == position:
+                        string_of = c
+                        break
+                    index += 1
+
+        if before is not None:
+            before.addprevious(node)
+        elif string_of is not None:
+            # the string is split off: it follows the new node, and a new string takes its place
+            text = string_of.text if string_of is e else string_of.tail
+            new_text = None if isinstance(tag, LxmlTag) else node.tail
+            node.tail = text
+            if string_of is e:
+                e.text = new_text
+                e.insert(0, node)
+            else:
+                string_of.tail = new_text
+                string_of.addnext(node)
+        else:
+            e.append(node)
+
+        if not isinstance(tag, LxmlTag) and _etree_is_removed(node):
+            # a placeholder isn't needed if there's no string just before it
+            previous = node.getprevious()
+            if not (previous.tail if previous is not None else e.text):
+                if previous is not None:
+                    previous.tail = node.tail
+                else:
+                    e.text = node.tail
+                node.tail = None
+                e.remove(node)
+
+    def extract(self):
+        _etree_remove(self.element)
+        return self
+
+    def decompose(self):
+        _etree_remove(self.element)
+
+    def to_soup(self):
+        """
+        Converts the element to a BeautifulSoup tree, e.g. for code that modifies the tree extensively
+        :return: BeautifulSoup object/tree
+        """
+        # lxml's serialization keeps namespace declarations where the input has them
+        element = etree.tostring(self.element, encoding="unicode", with_tail=False)
+        return bs4.BeautifulSoup(element.replace("<?%s?>" % REMOVED_TARGET, ""), "lxml-xml")
+
+
+@functools.lru_cache(maxsize=None)
+def _tag_regex(names, binary):
+    """
+    :param names: tuple of tag names, e.g. ("ref",)
+    :param binary: True to match bytes rather than str
+    :return: compiled regex matching the start or end tag of any of these elements
+    """
+    pattern = r"<(/?)(%s)(?=[\s/>])" % "|".join(re.escape(name) for name in names)
+    if binary:
+        return re.compile(pattern.encode("utf-8"))
+    return re.compile(pattern)
+
+
+def _element_spans(data, names, start=0, end=None):
+    """
+    Finds elements in XML text without parsing it, e.g. to return the location of the references
+    rather than their contents
+    :param data: XML text, str or bytes
+    :param names: tuple of tag names
+    :param start: offset to start looking at
+    :param end: offset to stop looking at
+    :return: list of (start, end) offsets of each element with one of these names, in document
+        order; nested elements are included
+    """
+    binary = isinstance(data, bytes)
+    close = b">" if binary else ">"
+    slash = b"/" if binary else "/"
+    if end is None:
+        end = len(data)
+
+    spans = []
+    # start offset and name of the elements that are open at this point
+    open_tags = []
+    for match in _tag_regex(names, binary).finditer(data, start, end):
+        tag_end = data.find(close, match.end(), end)
+        if tag_end == -1:
+            break
+        if not match.group(1):
+            if data[tag_end - 1 : tag_end] == slash:
+                # empty element
+                spans.append((match.start(), tag_end + 1))
+            else:
+                spans.append(None)
+                open_tags.append((len(spans) - 1, match.start(), match.group(2)))
+        else:
+            # close the innermost open element with this name
+            for i in range(len(open_tags) - 1, -1, -1):
+                if open_tags[i][2] == match.group(2):
+                    index, tag_start, name = open_tags.pop(i)
+                    spans[index] = (tag_start, tag_end + 1)
+                    break
+    return [span for span in spans if span is not None]
+
+
+class LazyReferences(Sequence):
+    """
+    Reference strings that are serialized when they're first accessed rather than when the
+    document is parsed, for parsers created with references="lazy"
+    """
+
+    def __init__(self, refs, serialize):
+        """
+        :param refs: list of reference tags, removed from the document
+        :param serialize: function returning the output string of a reference tag
+        """
+        self._refs = refs
+        self._serialize = serialize
+        self._strings = [None] * len(refs)
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if self._strings[index] is None:
+            self._strings[index] = self._serialize(self._refs[index])
+        return self._strings[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyReferences)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "LazyReferences(%d references)" % len(self)
+
+
+class ListOf(object):
+    """
+    Output list in FORMAT_SPEC, with an output item for each item of an input list
+    """
+
+    def __init__(self, source, item):
+        """
+        :param source: input key, tuple of nested input keys, or function of the input returning
+            the input items
+        :param item: field spec of each output item, whose input is the input item
+        """
+        self.source = source
+        self.item = item
+
+
+def _pub_year(input_dict):
+    """
+    :param input_dict: parsed metadata dictionary
+    :return: publication year: of the version of record, the print or electronic publication, or
+        the first other date
+    """
+    # new decision tree for pubyear
+    versionOfRecordDate = ""
+    if input_dict.get("pubdate_other", []):
+        for o in input_dict["pubdate_other"]:
+            if o.get("type", "") == "version-of-record":
+                versionOfRecordDate = o.get("date")[0:4]
+    if versionOfRecordDate:
+        return versionOfRecordDate
+    if "pubdate_print" in input_dict:
+        return input_dict["pubdate_print"][0:4]
+    if "pubdate_electronic" in input_dict:
+        return input_dict["pubdate_electronic"][0:4]
+    if "pubdate_other" in input_dict:
+        return input_dict.get("pubdate_other", {})[0].get("date", "")[0:4]
+    return ""
+
+
+def _affiliations(author):
+    """
+    :param author: author dictionary
+    :return: list of (affiliation, affiliation IDs)
+    """
+    affid = author.get("affid")
+    return [(aff, affid[idx] if affid else []) for idx, aff in enumerate(author.get("aff", []))]
+
+
+def _references(input_dict):
+    """
+    :param input_dict: parsed metadata dictionary
+    :return: references output
+    """
+    refs = input_dict.get("references", None)
+    if not refs:
+        return None
+    if isinstance(refs, (list, LazyReferences)):
+        return refs
+    if isinstance(refs, str):
+        return list(refs)
+    logger.warning("Unsupported references type %s, references left out", type(refs).__name__)
+    return None
+
+
+# Output field spec of IngestBase.format, besides recordData. Each output key maps to
+#   - a key of the parsed metadata dictionary (or, for items of ListOf, of the input item)
+#   - a tuple of nested keys
+#   - an index, for tuple input items
+#   - a function of the input
+#   - a dictionary, for nested output fields with the same input
+#   - a list, for an output list with one item per field spec
+#   - ListOf, for an output list with an item per input item
+# Empty values are left out of the output.
+FORMAT_SPEC = {
+    "relatedTo": ListOf("relatedto", {"relationship": "relationship", "relatedDocID": "id"}),
+    "editorialHistory": {
+        "receivedDates": "edhist_rec",
+        "revisedDates": "edhist_rev",
+        "acceptedDate": "edhist_acc",
+    },
+    "pubDate": {
+        "electrDate": "pubdate_electronic",
+        "printDate": "pubdate_print",
+        "otherDate": ListOf("pubdate_other", {"otherDateType": "type", "otherDateValue": "date"}),
+    },
+    "publication": {
+        # "docType": "XXX",
+        "pubName": "publication",
+        "confName": "conf_name",
+        "confLocation": "conf_location",
+        "confDates": "conf_date",
+        # "confEditors": ["XXX"],
+        # "confPID": "XXX",
+        "publisher": "publisher",
+        "issueNum": "issue",
+        "volumeNum": "volume",
+        "pubYear": _pub_year,
+        "bookSeries": {
+            "seriesName": "series_title",
+            "seriesID": "series_id",
+            "seriesDescription": "series_id_description",
+        },
+        "ISSN": ListOf("issn", {"pubtype": 0, "issnString": 1}),
+        # "isRefereed": True or False
+    },
+    "persistentIDs": [
+        {
+            # 'Crossref': 'XXX',
+            "ISBN": ListOf("isbn", {"pubtype": "type", "isbnString": "isbn_str"}),
+            "DOI": ("ids", "doi"),
+            "preprint": {
+                "source": ("ids", "preprint", "source"),
+                "identifier": ("ids", "preprint", "id"),
+            },
+        }
+    ],
+    "publisherIDs": ListOf(
+        ("ids", "pub-id"), {"attribute": "attribute", "Identifier": "Identifier"}
+    ),
+    "pagination": {
+        "firstPage": "page_first",
+        "lastPage": "page_last",
+        "pageCount": "numpages",
+        "pageRange": "page_range",
+        "electronicID": "electronic_id",
+    },
+    "authors": ListOf(
+        "authors",
+        {
+            "name": {
+                "surname": "surname",
+                "given_name": "given",
+                "middle_name": "middle",
+                "prefix": "prefix",
+                "suffix": "suffix",
+                "pubraw": "nameraw",
+                "native_lang": "native_lang",
+                "collab": "collab",
+            },
+            "affiliation": ListOf(_affiliations, {"affPubRaw": 0, "affPubID": 1}),
+            "attrib": {
+                "collab": lambda author: bool(author.get("collab", "")),
+                "corresp": lambda author: bool(author.get("corresp", "")),
+                # "deceased": True or False, # TODO need an example
+                # "coauthor": True or False, # TODO need an example
+                "email": "email",
+                # "funding": "XXX", # TODO need an example
+                "orcid": "orcid",
+            },
+        },
+    ),
+    "otherContributor": ListOf(
+        "contributors",
+        {
+            "role": "role",
+            "contrib": {
+                "name": {
+                    "surname": "surname",
+                    "given_name": "given",
+                    "middle_name": "middle",
+                    "prefix": "prefix",
+                    "suffix": "suffix",
+                    "pubraw": "nameraw",
+                    # "native_lang": "XXX",
+                    "collab": "collab",
+                },
+                "affiliation": ListOf(_affiliations, {"affPubRaw": 0, "affPubID": 1}),
+                "attrib": {
+                    "collab": lambda contributor: bool(contributor.get("collab", "")),
+                    # "deceased": True or False,
+                    # "coauthor": True or False,
+                    "email": "email",
+                    # "funding": "XXX",
+                    "orcid": "orcid",
+                },
+            },
+        },
+    ),
+    "title": {
+        "textEnglish": "title",
+        "textNative": "title_native",
+        "langNative": "lang_native",
+        "textNotes": "title_notes",
+    },
+    "subtitle": {
+        "textEnglish": "subtitle",
+        "textNative": "subtitle_native",
+        "langNative": "sub_lang_native",
+        "textNotes": "subtitle_notes",
+    },
+    "abstract": {
+        "textEnglish": "abstract",  # TODO need to tweak for case of foreign language abstract
+        # "textNative": "XXX", # TODO
+        # "langNative": "XXX" # TODO
+    },
+    "comments": ListOf("comments", {"commentOrigin": "origin", "commentText": "text"}),
+    # "fulltext": {
+    #     "language": "XXX",
+    #     "body": "XXX"
+    # }, # TODO this is from fulltext
+    # "acknowledgements": "XXX", # TODO this is from fulltext
+    "references": _references,
+    # "backmatter": [
+    #     {
+    #         "backType": "XXX",
+    #         "language": "XXX",
+    #         "body": "XXX"
+    #     }
+    # ], # TODO need an example
+    # "astronomicalObjects": [
+    #     "XXX"
+    # ], # TODO need an example
+    "esources": ListOf("esources", {"source": 0, "location": 1}),
+    # "dataLinks": [
+    #     {
+    #         "title": "XXX",
+    #         "identifier": "XXX",
+    #         "location": "XXX",
+    #         "dataType": "XXX",
+    #         "comment": "XXX"
+    #     }
+    # ], # TODO need an example
+    "doctype": "doctype",
+    "keywords": ListOf(
+        "keywords",
+        {
+            "keyString": "string",
+            "keySystem": "system",
+            "keyID": lambda k: k.get("id", "") if k.get("id", "") and k.get("system", "") else "",
+        },
+    ),
+    "copyright": {
+        "status": lambda input_dict: "copyright" in input_dict,  # TODO ask MT about this
+        "statement": "copyright",
+    },
+    "openAccess": {
+        "open": ("openAccess", "open"),
+        "license": ("openAccess", "license"),
+        "licenseURL": ("openAccess", "licenseURL"),
+        # "preprint": "XXX",
+        # "startDate": "XXX",
+        # "endDate": "XXX",
+        # "embargoLength": "XXX"
+    },  # TODO need an example
+    # "pubnote": "XXX", # TODO need an example
+    "funding": "funding",
+    # "version": "XXX", # TODO need an example
+}
+
+
+def _compile_field(spec, keys_to_keep):
+    """
+    Compiles a field spec of FORMAT_SPEC
+    :param spec: field spec
+    :param keys_to_keep: output keys to keep, even if their values are empty
+    :return: function (input, clean) returning the output value, with empty values left out; clean
+        is the function that removes the empty values from dictionaries and lists copied from the
+        input
+    """
+    if isinstance(spec, dict):
+        fields = [(k, _compile_field(v, keys_to_keep), k in keys_to_keep) for k, v in spec.items()]
+
+        def build_dict(data, clean):
+            output = {}
+            for key, field, keep in fields:
+                value = field(data, clean)
+                if value or keep:
+                    output[key] = value
+            return output
+
+        return build_dict
+
+    if isinstance(spec, list):
+        items = [_compile_field(v, keys_to_keep) for v in spec]
+
+        def build_list(data, clean):
+            return [v for v in (item(data, clean) for item in items) if v]
+
+        return build_list
+
+    if isinstance(spec, ListOf):
+        source = _compile_field(spec.source, keys_to_keep)
+        item = _compile_field(spec.item, keys_to_keep)
+
+        def build_list_of(data, clean):
+            output = []
+            for i in source(data, None) or []:
+                value = item(i, clean)
+                if value:
+                    output.append(value)
+            return output
+
+        return build_list_of
+
+    if isinstance(spec, str):
+
+        def get(data, clean):
+            value = data.get(spec)
+            if clean is not None and isinstance(value, (dict, list)):
+                return clean(value)
+            return value
+
+        return get
+
+    if isinstance(spec, tuple):
+
+        def get_nested(data, clean):
+            for key in spec:
+                data = data.get(key)
+                if data is None:
+                    return None
+            if clean is not None and isinstance(data, (dict, list)):
+                return clean(data)
+            return data
+
+        return get_nested
+
+    if isinstance(spec, int):
+
+        def get_index(data, clean):
+            value = data[spec]
+            if clean is not None and isinstance(value, (dict, list)):
+                return clean(value)
+            return value
+
+        return get_index
+
+    def call(data, clean):
+        value = spec(data)
+        if clean is not None and isinstance(value, (dict, list)):
+            return clean(value)
+        return value
+
+    return call
+
 
 class IngestBase(object):
     TIMESTAMP_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
@@ -22,29 +948,200 @@ class IngestBase(object):
         "recordOrigin",
     ]
 
-    def __init__(self, xml_ref=True):
+    # builds the output of format from the parsed metadata dictionary, see FORMAT_SPEC
+    _format_fields = staticmethod(_compile_field(FORMAT_SPEC, required_keys))
+
+    # how references are output, see __init__
+    REFERENCE_MODES = ["xml", "lazy", "offsets", "none"]
+
+    # parsers that output references set these, see reference_offsets: the elements the references
+    # are in, outermost first, and the reference tag names
+    REFERENCE_CONTAINERS = []
+    REFERENCE_TAGS = []
+
+    # what format returns, see __init__
+    OUTPUT_MODES = ["dict", "json"]
+
+    # constructor options that change the output, which adsingestp.cache keys results by; options
+    # that only change how the output is made, e.g. JATSParser's backend, aren't included
+    OPTIONS = ["xml_ref", "references", "output"]
+
+    def __init__(self, xml_ref=True, references="xml", output="dict"):
+        """
+        :param xml_ref: boolean, set to False to unescape entities in the references
+        :param references: 'xml' (default) outputs each reference as an XML string; 'lazy' as a
+            LazyReferences sequence, which serializes the references when they're accessed;
+            'offsets' leaves them out of the record, which stays schema-valid, and sets the
+            reference_spans attribute to the (start, end) offsets of each reference in the input,
+            which isn't decoded first; 'none' leaves the references out
+        :param output: 'dict' (default) for format and parse to return the record as a dictionary;
+            'json' as JSON bytes, see adsingestp.serializer
+        """
         warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning, module="bs4")
+        if references not in self.REFERENCE_MODES:
+            raise ValueError(
+                "Unknown references mode %s, must be one of %s"
+                % (references, self.REFERENCE_MODES)
+            )
+        if output not in self.OUTPUT_MODES:
+            raise ValueError(
+                "Unknown output mode %s, must be one of %s" % (output, self.OUTPUT_MODES)
+            )
         self.xml_ref = xml_ref
+        self.references = references
+        self.output = output
+        self.reset()
+        if timing.get_default_sink() is not None:
+            timing.instrument(self, timing.get_default_sink())
+
+    def read_input(self, source):
+        """
+        Returns the contents of a parser input. Bytes are returned undecoded, so that the XML parser
+        detects their encoding. A bytearray or memoryview is copied to bytes, as BeautifulSoup only
+        takes str or bytes; the lxml backend (see lxmlstrtotree) parses them without this copy.
+        :param source: XML text blob, bytes-like object, os.PathLike or binary file object
+        :return: str or bytes
+        """
+        if isinstance(source, (str, bytes)):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            return bytes(source)
+        if isinstance(source, os.PathLike):
+            with open(source, "rb") as fp:
+                return fp.read()
+        if hasattr(source, "read"):
+            return source.read()
+        raise TypeError("Unsupported input type: %s" % type(source).__name__)
+
+    def reference_offsets(self, data):
+        """
+        Finds the references in the input without parsing it
+        :param data: XML text, str or bytes
+        :return: list of (start, end) offsets of each reference in data
+        """
+        start, end = 0, len(data)
+        for name in self.REFERENCE_CONTAINERS:
+            spans = _element_spans(data, (name,), start, end)
+            if not spans:
+                return []
+            start, end = spans[0]
+        return _element_spans(data, tuple(self.REFERENCE_TAGS), start, end)
+
+    def _get_references(self, text):
+        """
+        Adds the references to base_metadata, as set by the references parameter
+        :param text: input XML, as read by read_input if references is 'offsets'
+        :return: none
+        """
+        if self.references == "offsets":
+            self.reference_spans = self.reference_offsets(text)
+        elif self.references != "none":
+            self._parse_references()
+
+    def _references_output(self, refs, serialize):
+        """
+        :param refs: list of reference tags, removed from the document
+        :param serialize: function returning the output string of a reference tag
+        :return: list of reference strings or, if references is 'lazy', LazyReferences
+        """
+        if self.references == "lazy":
+            if not self.xml_ref:
+                return LazyReferences(refs, lambda r: html.unescape(serialize(r)))
+            return LazyReferences(refs, serialize)
+        return [serialize(r) for r in refs]
 
-    def _clean_empty(self, input_to_clean, keys_to_keep=required_keys):
+    def reset(self):
         """
+        Clears the state kept from the last parsed document. Parsers set up their per-document
+        attributes here and call it at the start of parse, so that one instance can parse any
+        number of documents.
+        :return: none
+        """
+        self.base_metadata = {}
+        # offsets of the references in the input, if references is 'offsets'
+        self.reference_spans = []
+
+    def _clean_empty(self, input_to_clean, keys_to_keep=required_keys, in_place=False):
+        """
+        Removes empty values from nested dictionaries and lists. Dictionaries and lists that don't
+        contain any empty values are returned as they are, rather than copied, so the output can
+        share parts of the input. The structure is walked without recursion, so it can be
+        arbitrarily deep.
 
         :param input_to_clean: dictionary that contains empty key/value pairs to remove
         :param keys_to_keep: list of keys to keep, even if they"re empty
-        :return: copy of input dict with all keys that contain empty values removed
+        :param in_place: boolean, set to True to remove the empty values from the input dictionaries
+            and lists themselves rather than from copies
+        :return: input with all keys that contain empty values removed
         """
+        if not isinstance(input_to_clean, (dict, list)):
+            return input_to_clean
+
+        # one frame per dictionary or list being cleaned, innermost last:
+        # [input, iterator of its (key, value), kept (key, value), changed, key in its parent]
+        stack = [[input_to_clean, self._clean_items(input_to_clean), [], False, None]]
+        while True:
+            frame = stack[-1]
+            node, items, kept = frame[0], frame[1], frame[2]
+            is_dict = isinstance(node, dict)
+            for key, value in items:
+                if value and isinstance(value, (dict, list)):
+                    if isinstance(value, list) and self._is_clean_list(value):
+                        # fast path, e.g. for lists of strings
+                        kept.append((key, value))
+                        continue
+                    stack.append([value, self._clean_items(value), [], False, key])
+                    break
+                if value or (is_dict and key in keys_to_keep):
+                    kept.append((key, value))
+                else:
+                    frame[3] = True
+            else:
+                stack.pop()
+                if not frame[3]:
+                    cleaned = node
+                elif in_place:
+                    if is_dict:
+                        node.clear()
+                        node.update(kept)
+                    else:
+                        node[:] = [v for k, v in kept]
+                    cleaned = node
+                elif is_dict:
+                    cleaned = dict(kept)
+                else:
+                    cleaned = [v for k, v in kept]
+
+                if not stack:
+                    return cleaned
+                parent = stack[-1]
+                if cleaned or (isinstance(parent[0], dict) and frame[4] in keys_to_keep):
+                    parent[2].append((frame[4], cleaned))
+                    if cleaned is not node:
+                        parent[3] = True
+                else:
+                    parent[3] = True
 
-        if isinstance(input_to_clean, dict):
-            return {
-                k: v
-                for k, v in ((k, self._clean_empty(v)) for k, v in input_to_clean.items())
-                if v or (k in keys_to_keep)
-            }
-
-        if isinstance(input_to_clean, list):
-            return [v for v in map(self._clean_empty, input_to_clean) if v]
+    @staticmethod
+    def _clean_items(node):
+        """
+        :param node: dictionary or list
+        :return: iterator of (key, value), or (index, value) for lists
+        """
+        if isinstance(node, dict):
+            return iter(node.items())
+        return enumerate(node)
 
-        return input_to_clean
+    @staticmethod
+    def _is_clean_list(values):
+        """
+        :param values: list
+        :return: True if values is a list of non-empty strings, which _clean_empty leaves as is
+        """
+        for v in values:
+            if not v or type(v) is not str:
+                return False
+        return True
 
     def _clean_output(self, input):
         """
@@ -87,7 +1184,8 @@ class IngestBase(object):
         :param start_pattern: string, regex pattern to match at beginning of a chunk
         :param end_pattern: string, regex pattern to match at end of a chunk
         :param head_foot: boolean, option to return the header/footer with each chunk
-        :return: iterator of chunks
+        :return: iterator of chunks; a last chunk without an end (e.g. of a truncated input) is
+            logged and skipped
         """
 
         start = re.compile(start_pattern, re.IGNORECASE)
@@ -99,8 +1197,9 @@ class IngestBase(object):
 
         istart = first.start()
         iend = None
-        for first in end.finditer(input_xml, istart + 1):
-            iend = first.end() + 1
+        last = None
+        for last in end.finditer(input_xml, istart + 1):
+            iend = last.end() + 1
         if iend is None:
             return input_xml  # not found, return the whole thing
 
@@ -116,9 +1215,113 @@ class IngestBase(object):
             yield header + input_xml[istart:next_start] + footer
             istart = snext.start()
 
+        if last.start() < istart:
+            # the last chunk has no end, e.g. the input was truncated
+            logger.warning(
+                "Skipping the last chunk, which has no end: %s", input_xml[istart : istart + 100]
+            )
+            return
         yield header + input_xml[istart:iend] + footer
 
-    def format(self, input_dict, format):
+    def iter_chunks(
+        self, source, start_pattern, end_pattern, head_foot=False, blocksize=CHUNK_BLOCKSIZE
+    ):
+        """
+        Streaming version of get_chunks: reads the input a block at a time and yields the same
+        chunks, so only the current chunk is held in memory
+
+        :param source: path to a UTF-8 encoded XML file, or a binary file object (which must be
+            seekable if head_foot is True)
+        :param start_pattern: string, regex pattern to match at beginning of a chunk
+        :param end_pattern: string, regex pattern to match at end of a chunk
+        :param head_foot: boolean, option to return the header/footer with each chunk
+        :param blocksize: integer, number of bytes to read at a time
+        :return: iterator of chunks
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as fp:
+                yield from self.iter_chunks(fp, start_pattern, end_pattern, head_foot, blocksize)
+            return
+
+        start = re.compile(start_pattern, re.IGNORECASE)
+        end = re.compile(end_pattern, re.IGNORECASE)
+
+        header = ""
+        footer = ""
+        if head_foot:
+            footer = self._read_footer(source, end, blocksize)
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        found_start = False
+        eof = False
+        while not eof:
+            block = source.read(blocksize)
+            eof = not block
+            buffer += decoder.decode(block, final=eof)
+
+            if not found_start:
+                first = start.search(buffer)
+                if first is None:
+                    continue
+                found_start = True
+                if head_foot:
+                    header = buffer[: first.start()]
+                buffer = buffer[first.start() :]
+
+            # the buffer begins with the current chunk's start tag; a match is always complete,
+            # since the patterns end in ">"
+            istart = 0
+            for snext in start.finditer(buffer, 1):
+                yield header + buffer[istart : snext.start()] + footer
+                istart = snext.start()
+            buffer = buffer[istart:]
+
+        if not found_start:
+            return
+        last = None
+        for last in end.finditer(buffer, 1):
+            pass
+        if last is None:
+            # see get_chunks
+            logger.warning("Skipping the last chunk, which has no end: %s", buffer[:100])
+            return
+        yield header + buffer[: last.end() + 1] + footer
+
+    def _read_footer(self, source, end, blocksize):
+        """
+        Finds the footer of a file, i.e. everything after the last match of end, by reading backwards
+        from the end of the file; the file position is left unchanged
+
+        :param source: seekable binary file object
+        :param end: compiled regex matching the end of a chunk
+        :param blocksize: integer, number of bytes to read at a time
+        :return: footer string
+        """
+        if not source.seekable():
+            raise ValueError("Header/footer can only be read from a seekable input")
+
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        tail_size = blocksize
+        while True:
+            offset = max(size - tail_size, position)
+            source.seek(offset)
+            # the read may begin in the middle of a multi-byte character
+            tail = source.read(size - offset).decode("utf-8", errors="ignore")
+            last = None
+            for last in end.finditer(tail):
+                pass
+            if last is not None or offset == position:
+                break
+            tail_size *= 2
+        source.seek(position)
+
+        if last is None:
+            return ""
+        return tail[last.end() + 1 :]
+
+    def format(self, input_dict, format, output=None):
         """
         Converts parsed metadata dictionary into formal data model. Parsed metadata dictionary should be
         of the following format:
@@ -206,7 +1409,8 @@ class IngestBase(object):
 
         :param input_dict: parsed metadata dictionary to format into formal data model
         :param format: JATS, OtherXML, HTML, Text
-        :return: serialized JSON that follows our internal data model
+        :param output: 'dict' or 'json', see __init__; defaults to the output mode of the parser
+        :return: dictionary, or JSON bytes, that follows our internal data model
         """
 
         if format not in [
@@ -221,276 +1425,28 @@ class IngestBase(object):
             "Springer",
         ]:
             raise WrongFormatException
-
-        output = {}
-
-        output["recordData"] = {
-            "createdTime": "",
-            "parsedTime": datetime.utcnow().strftime(self.TIMESTAMP_FMT),
-            "loadType": "fromURL" if format == "HTML" else "fromFile",
-            "loadFormat": format,
-            "loadLocation": "",
-            "recordOrigin": "",
-        }
-
-        output["relatedTo"] = [
-            {"relationship": i.get("relationship", ""), "relatedDocID": i.get("id", "")}
-            for i in input_dict.get("relatedto", [])
-        ]
-
-        output["editorialHistory"] = {
-            "receivedDates": input_dict.get("edhist_rec", ""),
-            "revisedDates": input_dict.get("edhist_rev", ""),
-            "acceptedDate": input_dict.get("edhist_acc", ""),
-        }
-
-        output["pubDate"] = {
-            "electrDate": input_dict.get("pubdate_electronic", ""),
-            "printDate": input_dict.get("pubdate_print", ""),
-            "otherDate": [
-                {"otherDateType": i.get("type", ""), "otherDateValue": i.get("date", "")}
-                for i in input_dict.get("pubdate_other", [])
-            ],
-        }
-
-        # new decision tree for pubyear
-        versionOfRecordDate = ""
-        if input_dict.get("pubdate_other", []):
-            for o in input_dict["pubdate_other"]:
-                if o.get("type", "") == "version-of-record":
-                    versionOfRecordDate = o.get("date")[0:4]
-        output["publication"] = {
-            # "docType": "XXX",
-            "pubName": input_dict.get("publication", ""),
-            "confName": input_dict.get("conf_name", ""),
-            "confLocation": input_dict.get("conf_location", ""),
-            "confDates": input_dict.get("conf_date", ""),
-            # "confEditors": ["XXX"],
-            # "confPID": "XXX",
-            "publisher": input_dict.get("publisher", ""),
-            "issueNum": input_dict.get("issue", ""),
-            "volumeNum": input_dict.get("volume", ""),
-            "pubYear": versionOfRecordDate
-            if versionOfRecordDate
-            else (
-                input_dict["pubdate_print"][0:4]
-                if "pubdate_print" in input_dict
-                else (
-                    input_dict["pubdate_electronic"][0:4]
-                    if "pubdate_electronic" in input_dict
-                    else (
-                        input_dict.get("pubdate_other", {})[0].get("date", "")[0:4]
-                        if "pubdate_other" in input_dict
-                        else ""
-                    )
-                )
-            ),
-            "bookSeries": {
-                "seriesName": input_dict.get("series_title", ""),
-                "seriesID": input_dict.get("series_id", ""),
-                "seriesDescription": input_dict.get("series_id_description", ""),
-            },
-            "ISSN": [
-                {"pubtype": pubtype, "issnString": issn}
-                for (pubtype, issn) in input_dict.get("issn", "")
-            ],
-            # "isRefereed": True or False
-        }
-
-        output["persistentIDs"] = [
-            {
-                # 'Crossref': 'XXX',
-                "ISBN": [
-                    {"pubtype": i.get("type", ""), "isbnString": i.get("isbn_str", "")}
-                    for i in input_dict.get("isbn", [])
-                ],
-                "DOI": input_dict.get("ids", {}).get("doi", ""),
-                "preprint": {
-                    "source": input_dict.get("ids", {}).get("preprint", {}).get("source", ""),
-                    "identifier": input_dict.get("ids", {}).get("preprint", {}).get("id", ""),
-                },
-            }
-        ]
-
-        output["publisherIDs"] = [
-            {"attribute": i.get("attribute", ""), "Identifier": i.get("Identifier", "")}
-            for i in input_dict.get("ids", {}).get("pub-id", "")
-        ]
-
-        output["pagination"] = {
-            "firstPage": input_dict.get("page_first", ""),
-            "lastPage": input_dict.get("page_last", ""),
-            "pageCount": input_dict.get("numpages", ""),
-            "pageRange": input_dict.get("page_range", ""),
-            "electronicID": input_dict.get("electronic_id", ""),
-        }
-
-        output["authors"] = [
-            {
-                "name": {
-                    "surname": i.get("surname", ""),
-                    "given_name": i.get("given", ""),
-                    "middle_name": i.get("middle", ""),
-                    "prefix": i.get("prefix", ""),
-                    "suffix": i.get("suffix", ""),
-                    "pubraw": i.get("nameraw", ""),
-                    "native_lang": i.get("native_lang", ""),
-                    "collab": i.get("collab", ""),
-                },
-                "affiliation": [
-                    {"affPubRaw": j, "affPubID": i.get("affid")[idx] if i.get("affid") else []}
-                    for idx, j in enumerate(i.get("aff", []))
-                ],
-                "attrib": {
-                    "collab": True if i.get("collab", "") else False,
-                    "corresp": True if i.get("corresp", "") else False,
-                    # "deceased": True or False, # TODO need an example
-                    # "coauthor": True or False, # TODO need an example
-                    "email": i.get("email", ""),
-                    # "funding": "XXX", # TODO need an example
-                    "orcid": i.get("orcid", ""),
-                },
-            }
-            for i in input_dict.get("authors", [])
-        ]
-
-        output["otherContributor"] = [
-            {
-                "role": i.get("role", ""),
-                "contrib": {
-                    "name": {
-                        "surname": i.get("surname", ""),
-                        "given_name": i.get("given", ""),
-                        "middle_name": i.get("middle", ""),
-                        "prefix": i.get("prefix", ""),
-                        "suffix": i.get("suffix", ""),
-                        "pubraw": i.get("nameraw", ""),
-                        # "native_lang": "XXX",
-                        "collab": i.get("collab", ""),
-                    },
-                    "affiliation": [
-                        {"affPubRaw": j, "affPubID": i.get("affid")[idx] if i.get("affid") else []}
-                        for idx, j in enumerate(i.get("aff", []))
-                    ],
-                    "attrib": {
-                        "collab": True if i.get("collab", "") else False,
-                        # "deceased": True or False,
-                        # "coauthor": True or False,
-                        "email": i.get("email", ""),
-                        # "funding": "XXX",
-                        "orcid": i.get("orcid", ""),
-                    },
-                },
+        output = output or self.output
+        if output not in self.OUTPUT_MODES:
+            raise ValueError(
+                "Unknown output mode %s, must be one of %s" % (output, self.OUTPUT_MODES)
+            )
+
+        record = {
+            "recordData": {
+                "createdTime": "",
+                "parsedTime": datetime.utcnow().strftime(self.TIMESTAMP_FMT),
+                "loadType": "fromURL" if format == "HTML" else "fromFile",
+                "loadFormat": format,
+                "loadLocation": "",
+                "recordOrigin": "",
             }
-            for i in input_dict.get("contributors", [])
-        ]
-
-        output["title"] = {
-            "textEnglish": input_dict.get("title", ""),
-            "textNative": input_dict.get("title_native", ""),
-            "langNative": input_dict.get("lang_native", ""),
-            "textNotes": input_dict.get("title_notes", []),
-        }
-
-        output["subtitle"] = {
-            "textEnglish": input_dict.get("subtitle", ""),
-            "textNative": input_dict.get("subtitle_native", ""),
-            "langNative": input_dict.get("sub_lang_native", ""),
-            "textNotes": input_dict.get("subtitle_notes", []),
-        }
-
-        output["abstract"] = {
-            "textEnglish": input_dict.get(
-                "abstract", ""
-            ),  # TODO need to tweak for case of foreign language abstract
-            # "textNative": "XXX", # TODO
-            # "langNative": "XXX" # TODO
         }
+        # empty values are left out as the output is built, rather than removed from a copy of it
+        record.update(self._format_fields(input_dict, self._clean_empty))
 
-        output["comments"] = [
-            {"commentOrigin": i.get("origin", ""), "commentText": i.get("text", "")}
-            for i in input_dict.get("comments", [])
-        ]
-
-        # output["fulltext"] = {
-        #     "language": "XXX",
-        #     "body": "XXX"
-        # } # TODO this is from fulltext
-
-        # output["acknowledgements"] = "XXX" # TODO this is from fulltext
-
-        if input_dict.get("references", None):
-            if type(input_dict.get("references")) == list:
-                input_refs = input_dict.get("references")
-            elif type(input_dict.get("references")) == str:
-                input_refs = list(input_dict.get("references"))
-            else:
-                # TODO add error handling here
-                input_refs = ""
-            output["references"] = input_refs
-
-        # output["backmatter"] = [
-        #     {
-        #         "backType": "XXX",
-        #         "language": "XXX",
-        #         "body": "XXX"
-        #     }
-        # ] # TODO need an example
-
-        # output["astronomicalObjects"] = [
-        #     "XXX"
-        # ] # TODO need an example
-
-        output["esources"] = [
-            {"source": source, "location": location}
-            for (source, location) in input_dict.get("esources", "")
-        ]
-
-        # output["dataLinks"] = [
-        #     {
-        #         "title": "XXX",
-        #         "identifier": "XXX",
-        #         "location": "XXX",
-        #         "dataType": "XXX",
-        #         "comment": "XXX"
-        #     }
-        # ] # TODO need an example
-
-        output["doctype"] = input_dict.get("doctype", "")
-
-        output["keywords"] = [
-            {
-                "keyString": i.get("string", ""),
-                "keySystem": i.get("system", ""),
-                "keyID": i.get("id", "") if i.get("id", "") and i.get("system", "") else "",
-            }
-            for i in input_dict.get("keywords", [])
-        ]
-
-        output["copyright"] = {
-            "status": True if "copyright" in input_dict else False,  # TODO ask MT about this
-            "statement": input_dict.get("copyright", ""),
-        }
-
-        output["openAccess"] = {
-            "open": input_dict.get("openAccess", {}).get("open", False),
-            "license": input_dict.get("openAccess", {}).get("license", ""),
-            "licenseURL": input_dict.get("openAccess", {}).get("licenseURL", "")
-            # "preprint": "XXX",
-            # "startDate": "XXX",
-            # "endDate": "XXX",
-            # "embargoLength": "XXX"
-        }  # TODO need an example
-
-        # output["pubnote"] = "XXX" # TODO need an example
-        #
-        output["funding"] = input_dict.get("funding", [])
-        #
-        # output["version"] = "XXX" # TODO need an example
-
-        output_clean = self._clean_empty(output)
-
-        return output_clean
+        if output == "json":
+            return serializer.dumps(record)
+        return record
 
 
 class BaseBeautifulSoupParser(IngestBase):
@@ -549,19 +1505,40 @@ class BaseBeautifulSoupParser(IngestBase):
     def bsstrtodict(self, input_xml, parser="lxml-xml"):
         """
         Returns a BeautifulSoup tree given an XML text
-        :param input_xml: XML text blob
-        :param parser: e.g. 'html.parser', 'html5lib', 'lxml-xml' (default)
+        :param input_xml: XML text blob, bytes-like object, os.PathLike or binary file object
+        :param parser: e.g. 'html.parser', 'html5lib', 'lxml-xml' (default), or a TreeBuilder class
+            or instance
         :return: BeautifulSoup object/tree
         """
 
-        return bs4.BeautifulSoup(input_xml, parser)
+        if isinstance(parser, (type, TreeBuilder)):
+            return bs4.BeautifulSoup(self.read_input(input_xml), builder=parser)
+        return bs4.BeautifulSoup(self.read_input(input_xml), parser)
+
+    def lxmlstrtotree(self, input_xml, prune=None):
+        """
+        Returns an lxml tree given an XML text, parsed with the settings BeautifulSoup's lxml-xml
+        parser uses, wrapped so that it can be searched like a BeautifulSoup tree
+        :param input_xml: XML text blob, bytes-like object (parsed in place, without a copy),
+            os.PathLike or binary file object
+        :param prune: function called with the root element before the tree is normalized, see
+            LxmlTag.fromstring
+        :return: LxmlTag wrapping the lxml document
+        """
+        return LxmlTag.fromstring(input_xml, prune=prune)
 
     def _remove_latex(self, r):
         """
         Removes LaTeX markup inside <tex-math> tags from input BeautifulSoup object
-        :param r: BeautifulSoup object
+        :param r: BeautifulSoup object or lxml element
         :return: newr: string with LaTeX removed
         """
+        if isinstance(r, LxmlTag):
+            self._remove_latex_etree(r.element)
+            return r
+        if isinstance(r, etree._Element):
+            return self._remove_latex_etree(r)
+
         math_elements = r.find_all("tex-math")
         for e in math_elements:
             text = e.get_text()
@@ -577,73 +1554,46 @@ class BaseBeautifulSoupParser(IngestBase):
     def _detag(self, r, tags_keep):
         """
         Removes tags from input BeautifulSoup object
-        :param r: BeautifulSoup object (not string)
+        :param r: BeautifulSoup object or lxml element (not string)
         :param tags_keep: this function will remove all tags except those passed here
         :return: newr: striing with cleaned text
         """
-        # note that parser=lxml is recommended here - if the more stringent lxml-xml is used,
-        # the output is slightly different and the code will need to be modified
-        newr = self.bsstrtodict(str(r), "lxml")
-
-        # list of all tags in the object
-        if newr.find_all():
-            tag_list = list(set([x.name for x in newr.find_all()]))
-        else:
-            tag_list = []
-
-        # list of all processing instructions in the object like <?index>
-        if newr.find_all(string=True):
-            instruction_list = newr.find_all(string=True)
-        else:
-            instruction_list = []
-        for ins in instruction_list:
-            if ins.startswith("index"):
-                # Remove preceding white-space
-                if ins.previous_sibling and isinstance(ins.previous_sibling, str):
-                    ins.previous_sibling.replace_with(ins.previous_sibling.rstrip())
-                ins.extract()
-
-        # Modify the semantics tag before unwrapping newr
-        if "annotation" in tag_list and "semantics" in tag_list:
-            semantics_elements = newr.find_all("semantics", None)
-            for se in semantics_elements:
-                annotation_elements = se.find_all("annotation", None)
-                if annotation_elements:
-                    se.clear()
-                    for ae in annotation_elements:
-                        # Replace the contents of <semantics> with the contents of the child <annotation> tag
-                        se.append(ae.text.strip())
-
-            # reset tag list
-            tag_list = list(set([x.name for x in newr.find_all()]))
-
-        for t in tag_list:
-            elements = newr.find_all(t)
-            for e in elements:
-                if e.attrs:
-                    e.attrs.clear()
-                if t in self.HTML_TAGS_DANGER:
-                    e.decompose()
-                elif (t == "alternatives") or (t == "inline-formula"):
-                    alt_math_element = e.find_all("mml:math", [])
-                    alt_tex_element = e.find_all("tex-math", [])
-                    if alt_math_element and alt_tex_element:
-                        for ee in alt_tex_element:
-                            ee.decompose()
-                    if t not in tags_keep:
-                        e.unwrap()
-                elif t in tags_keep:
-                    continue
-                else:
-                    if t.lower() == "sc":
-                        if e.string:
-                            e.string = e.string.upper()
-                    e.unwrap()
-
-        # Note: newr is converted from a bs4 object to a string here.
-        # Everything after this point is string manipulation.
-        newr = str(newr)
-
+        if isinstance(r, LxmlTag):
+            r = r.element
+        if isinstance(r, etree._Element):
+            newr = self._detag_etree(r, tags_keep)
+            return self._detag_cleanup(newr)
+
+        if not isinstance(r, bs4.Tag):
+            # note that parser=lxml is recommended here - if the more stringent lxml-xml is used,
+            # the output is slightly different and the code will need to be modified
+            r = self.bsstrtodict(str(r), "lxml")
+
+        # Fast path: a leaf element (e.g. <year>, <fpage>, <issn>, <article-id>) is just its text
+        newr = self._detag_leaf(r)
+        if newr is None:
+            # walk the existing tree, rather than re-serializing and re-parsing it
+            tags_keep = set(tags_keep)
+            has_semantics = False
+            has_annotation = False
+            for x in r.find_all():
+                qname = self._detag_name(x)
+                if qname == "semantics":
+                    has_semantics = True
+                elif qname == "annotation":
+                    has_annotation = True
+            out = []
+            self._detag_node(r, tags_keep, has_semantics and has_annotation, False, out)
+            newr = "".join(out)
+
+        return self._detag_cleanup(newr)
+
+    def _detag_cleanup(self, newr):
+        """
+        String cleanup shared by the BeautifulSoup and lxml versions of _detag
+        :param newr: detagged string
+        :return: newr: string with fixed ampersands and normalized whitespace
+        """
         for reamp in self.re_ampersands:
             amp_fix = reamp.findall(newr)
             for s in amp_fix:
@@ -656,3 +1606,338 @@ class BaseBeautifulSoupParser(IngestBase):
         newr = newr.strip()
 
         return newr
+
+    def _detag_name(self, e):
+        """
+        Name of a tag as _detag matches it against tags_keep, e.g. "mml:math"
+        :param e: BeautifulSoup tag
+        :return: lowercased tag name, including the namespace prefix if any
+        """
+        if e.prefix:
+            return (e.prefix + ":" + e.name).lower()
+        return e.name.lower()
+
+    def _detag_leaf(self, r):
+        """
+        _detag for the common case of an element that contains only text
+        :param r: BeautifulSoup tag
+        :return: string with the escaped text of the element, or None if r isn't a simple text-only element
+        """
+        text = []
+        for c in r.contents:
+            if type(c) is not bs4.NavigableString:
+                return None
+            text.append(c)
+        qname = self._detag_name(r)
+        if qname in self.HTML_TAGS_DANGER:
+            return ""
+        text = "".join(text)
+        if text.startswith("index"):
+            # text of an <?index> processing instruction
+            return ""
+        if qname == "sc":
+            text = text.upper()
+        return self._detag_escape(text)
+
+    def _detag_escape(self, text):
+        return bs4.dammit.EntitySubstitution.substitute_xml(text)
+
+    def _detag_children(self, e):
+        """
+        Children of a tag, minus <?index> processing instructions (and the whitespace preceding them)
+        :param e: BeautifulSoup tag
+        :return: list of BeautifulSoup nodes and/or plain strings
+        """
+        children = []
+        for c in e.contents:
+            if isinstance(c, bs4.NavigableString) and c.startswith("index"):
+                if children and isinstance(children[-1], str):
+                    children[-1] = str(children[-1]).rstrip()
+                continue
+            children.append(c)
+        return children
+
+    def _detag_string(self, e):
+        """
+        Equivalent of BeautifulSoup's Tag.string, ignoring removed tags
+        :param e: BeautifulSoup tag
+        :return: string, or None if the tag doesn't contain exactly one string
+        """
+        children = [
+            c
+            for c in self._detag_children(e)
+            if not (isinstance(c, bs4.Tag) and self._detag_name(c) in self.HTML_TAGS_DANGER)
+        ]
+        if len(children) != 1:
+            return None
+        if isinstance(children[0], bs4.Tag):
+            return self._detag_string(children[0])
+        return str(children[0])
+
+    def _detag_text(self, e):
+        """
+        Equivalent of BeautifulSoup's Tag.get_text, ignoring removed tags
+        :param e: BeautifulSoup tag
+        :return: string
+        """
+        text = []
+        for c in self._detag_children(e):
+            if isinstance(c, bs4.Tag):
+                text.append(self._detag_text(c))
+            elif type(c) in (str, bs4.NavigableString, bs4.CData):
+                text.append(c)
+        return "".join(text)
+
+    def _detag_node(self, e, tags_keep, fix_semantics, drop_tex, out):
+        """
+        Appends the detagged contents of a tag to out: tags in tags_keep are kept (without attributes),
+        tags in HTML_TAGS_DANGER are removed along with their contents, and all other tags are unwrapped
+        :param e: BeautifulSoup tag
+        :param tags_keep: set of tag names to keep
+        :param fix_semantics: boolean, replace the contents of <semantics> with the text of its <annotation>s
+        :param drop_tex: boolean, remove <tex-math> (set inside an alternatives/inline-formula block that
+            also has MathML)
+        :param out: list of output strings
+        :return: none
+        """
+        qname = None if isinstance(e, bs4.BeautifulSoup) else self._detag_name(e)
+
+        if qname in self.HTML_TAGS_DANGER:
+            return
+        if drop_tex and qname == "tex-math":
+            return
+
+        if qname in ("alternatives", "inline-formula") and not drop_tex:
+            has_math = False
+            has_tex = False
+            for x in e.find_all():
+                xname = self._detag_name(x)
+                if xname == "mml:math":
+                    has_math = True
+                elif xname == "tex-math":
+                    has_tex = True
+            drop_tex = has_math and has_tex
+
+        keep = qname in tags_keep
+        if keep:
+            if not e.contents and qname in HTMLTreeBuilder.empty_element_tags:
+                out.append("<" + qname + "/>")
+                return
+            out.append("<" + qname + ">")
+
+        if qname == "sc" and not keep and self._detag_string(e) is not None:
+            out.append(self._detag_escape(self._detag_string(e).upper()))
+        elif (
+            qname == "semantics"
+            and fix_semantics
+            and e.find_all(lambda x: self._detag_name(x) == "annotation")
+        ):
+            # Replace the contents of <semantics> with the contents of the child <annotation> tag
+            for ae in e.find_all(lambda x: self._detag_name(x) == "annotation"):
+                out.append(self._detag_escape(self._detag_text(ae).strip()))
+        else:
+            for c in self._detag_children(e):
+                if isinstance(c, bs4.Tag):
+                    self._detag_node(c, tags_keep, fix_semantics, drop_tex, out)
+                elif isinstance(c, bs4.NavigableString) and type(c) is not bs4.NavigableString:
+                    # comments, processing instructions, etc.
+                    out.append(c.output_ready())
+                else:
+                    out.append(self._detag_escape(c))
+
+        if keep:
+            out.append("</" + qname + ">")
+
+    def _remove_latex_etree(self, r):
+        """
+        lxml version of _remove_latex
+        :param r: lxml element
+        :return: lxml element with LaTeX removed
+        """
+        for e in XPATH_FIND_ALL(r, name="tex-math"):
+            text = "".join(_etree_strings(e))
+            begin = text.find("\\begin{document}")
+            end = text.find("\\end{document}")
+            begin_len = len("\\begin{document}")
+            if begin == -1 or end == -1:
+                continue
+            for c in list(e):
+                e.remove(c)
+            e.text = text[begin + begin_len : end]
+        return r
+
+    def _detag_etree(self, r, tags_keep):
+        """
+        lxml version of _detag, before the final string cleanup
+        :param r: lxml element
+        :param tags_keep: this function will remove all tags except those passed here
+        :return: string
+        """
+        newr = self._detag_etree_leaf(r)
+        if newr is None:
+            tags_keep = set(tags_keep)
+            has_semantics = False
+            has_annotation = False
+            for x in r.iterdescendants():
+                if not _etree_is_tag(x):
+                    continue
+                qname = _etree_name(x).lower()
+                if qname == "semantics":
+                    has_semantics = True
+                elif qname == "annotation":
+                    has_annotation = True
+            out = []
+            self._detag_etree_node(r, tags_keep, has_semantics and has_annotation, False, out)
+            newr = "".join(out)
+        return newr
+
+    def _detag_etree_leaf(self, r):
+        """
+        lxml version of _detag_leaf
+        :param r: lxml element
+        :return: string with the escaped text of the element, or None if r isn't a simple text-only element
+        """
+        if len(r):
+            # removed elements leave placeholders, but r may still contain only strings
+            text = _etree_contents(r)
+            if not all(isinstance(c, str) for c in text):
+                return None
+            text = "".join(text)
+        else:
+            text = r.text or ""
+        qname = _etree_name(r).lower()
+        if qname in self.HTML_TAGS_DANGER:
+            return ""
+        if text.startswith("index"):
+            return ""
+        if qname == "sc":
+            text = text.upper()
+        return self._detag_escape(text)
+
+    def _detag_etree_children(self, e):
+        """
+        lxml version of _detag_children
+        :param e: lxml element
+        :return: list of lxml nodes and/or plain strings
+        """
+        children = []
+        for c in _etree_contents(e):
+            if isinstance(c, str):
+                value = c
+            elif _etree_is_tag(c):
+                children.append(c)
+                continue
+            else:
+                value = _etree_node_string(c)
+            if value.startswith("index"):
+                if children and (isinstance(children[-1], str) or not _etree_is_tag(children[-1])):
+                    previous = children[-1]
+                    if not isinstance(previous, str):
+                        previous = _etree_node_string(previous)
+                    children[-1] = previous.rstrip()
+                continue
+            children.append(c)
+        return children
+
+    def _detag_etree_string(self, e):
+        """
+        lxml version of _detag_string
+        :param e: lxml element
+        :return: string, or None if the element doesn't contain exactly one string
+        """
+        children = [
+            c
+            for c in self._detag_etree_children(e)
+            if isinstance(c, str)
+            or not _etree_is_tag(c)
+            or _etree_name(c).lower() not in self.HTML_TAGS_DANGER
+        ]
+        if len(children) != 1:
+            return None
+        c = children[0]
+        if isinstance(c, str):
+            return c
+        if _etree_is_tag(c):
+            return self._detag_etree_string(c)
+        return _etree_node_string(c)
+
+    def _detag_etree_text(self, e):
+        """
+        lxml version of _detag_text
+        :param e: lxml element
+        :return: string
+        """
+        text = []
+        for c in self._detag_etree_children(e):
+            if isinstance(c, str):
+                text.append(c)
+            elif _etree_is_tag(c):
+                text.append(self._detag_etree_text(c))
+        return "".join(text)
+
+    def _detag_etree_node(self, e, tags_keep, fix_semantics, drop_tex, out):
+        """
+        lxml version of _detag_node
+        :param e: lxml element
+        :param tags_keep: set of tag names to keep
+        :param fix_semantics: boolean, replace the contents of <semantics> with the text of its <annotation>s
+        :param drop_tex: boolean, remove <tex-math>
+        :param out: list of output strings
+        :return: none
+        """
+        qname = _etree_name(e).lower()
+
+        if qname in self.HTML_TAGS_DANGER:
+            return
+        if drop_tex and qname == "tex-math":
+            return
+
+        if qname in ("alternatives", "inline-formula") and not drop_tex:
+            has_math = False
+            has_tex = False
+            for x in e.iterdescendants():
+                if not _etree_is_tag(x):
+                    continue
+                xname = _etree_name(x).lower()
+                if xname == "mml:math":
+                    has_math = True
+                elif xname == "tex-math":
+                    has_tex = True
+            drop_tex = has_math and has_tex
+
+        keep = qname in tags_keep
+        if keep:
+            if not _etree_contents(e) and qname in HTMLTreeBuilder.empty_element_tags:
+                out.append("<" + qname + "/>")
+                return
+            out.append("<" + qname + ">")
+
+        annotations = []
+        if qname == "semantics" and fix_semantics:
+            annotations = [
+                x
+                for x in e.iterdescendants()
+                if _etree_is_tag(x) and _etree_name(x).lower() == "annotation"
+            ]
+
+        if qname == "sc" and not keep and self._detag_etree_string(e) is not None:
+            out.append(self._detag_escape(self._detag_etree_string(e).upper()))
+        elif annotations:
+            # Replace the contents of <semantics> with the contents of the child <annotation> tag
+            for ae in annotations:
+                out.append(self._detag_escape(self._detag_etree_text(ae).strip()))
+        else:
+            for c in self._detag_etree_children(e):
+                if isinstance(c, str):
+                    out.append(self._detag_escape(c))
+                elif _etree_is_tag(c):
+                    self._detag_etree_node(c, tags_keep, fix_semantics, drop_tex, out)
+                elif c.tag is etree.PI:
+                    out.append("<?" + _etree_node_string(c) + "?>")
+                elif c.tag is etree.Comment:
+                    out.append("<!--" + _etree_node_string(c) + "-->")
+                else:
+                    out.append(_etree_node_string(c))
+
+        if keep:
+            out.append("</" + qname + ">")
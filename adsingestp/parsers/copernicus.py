@@ -21,9 +21,18 @@ class CopernicusParser(BaseBeautifulSoupParser):
         "remove_the": False,
     }
 
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    REFERENCE_CONTAINERS = ["references"]
+    REFERENCE_TAGS = ["reference"]
+
+    def __init__(self, references="xml", output="dict"):
+        """
+        :param references: 'xml' (default), 'lazy', 'offsets' or 'none', see IngestBase
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(references=references, output=output)
+
+    def reset(self):
+        super(CopernicusParser, self).reset()
         self.input_header = None
         self.input_metadata = None
 
@@ -79,7 +88,7 @@ class CopernicusParser(BaseBeautifulSoupParser):
 
     def _parse_author(self):
         author_list = []
-        name_parser = utils.AuthorNames()
+        name_parser = utils.get_author_names()
 
         affil_map = {}
 
@@ -144,13 +153,15 @@ class CopernicusParser(BaseBeautifulSoupParser):
         if self.input_metadata.find("references") and self.input_metadata.find("references").find(
             "reference"
         ):
-            references = []
-            for ref in self.input_metadata.find("references").find_all("reference"):
-                # output raw XML for reference service to parse later
-                ref_xml = str(ref.extract()).replace("\n", " ")
-                references.append(ref_xml)
-
-            self.base_metadata["references"] = references
+            references = [
+                ref.extract()
+                for ref in self.input_metadata.find("references").find_all("reference")
+            ]
+
+            # output raw XML for reference service to parse later
+            self.base_metadata["references"] = self._references_output(
+                references, lambda r: str(r).replace("\n", " ")
+            )
 
     def _parse_esources(self):
         links = []
@@ -169,6 +180,11 @@ class CopernicusParser(BaseBeautifulSoupParser):
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
+        if self.references == "offsets":
+            text = self.read_input(text)
+
         try:
             d = self.bsstrtodict(text, parser="lxml-xml")
         except Exception as err:
@@ -190,7 +206,7 @@ class CopernicusParser(BaseBeautifulSoupParser):
         self._parse_pubdate()
         self._parse_pagination()
         self._parse_abstract()
-        self._parse_references()
+        self._get_references(text)
         self._parse_esources()
 
         self.base_metadata = self._entity_convert(self.base_metadata)
@@ -16,9 +16,18 @@ re_issn = re.compile(r"^\d{4}-?\d{3}[0-9X]$")  # XXXX-XXXX
 
 
 class CrossrefParser(BaseBeautifulSoupParser):
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    REFERENCE_CONTAINERS = ["citation_list"]
+    REFERENCE_TAGS = ["citation"]
+
+    def __init__(self, references="xml", output="dict"):
+        """
+        :param references: 'xml' (default), 'lazy', 'offsets' or 'none', see IngestBase
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(references=references, output=output)
+
+    def reset(self):
+        super(CrossrefParser, self).reset()
         self.input_metadata = None
         self.record_meta = None
         self.record_type = None
@@ -386,12 +395,10 @@ class CrossrefParser(BaseBeautifulSoupParser):
         if self.record_meta.find("citation_list"):
             refs_raw = self.record_meta.find("citation_list").find_all("citation")
 
-            ref_list = []
             # output raw XML for reference parser to handle
-            for r in refs_raw:
-                ref_list.append(str(r.extract()).replace("\n", " "))
-
-            self.base_metadata["references"] = ref_list
+            self.base_metadata["references"] = self._references_output(
+                [r.extract() for r in refs_raw], lambda r: str(r).replace("\n", " ")
+            )
 
     def _parse_esources(self):
         links = []
@@ -416,6 +423,11 @@ class CrossrefParser(BaseBeautifulSoupParser):
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
+        if self.references == "offsets":
+            text = self.read_input(text)
+
         try:
             d = self.bsstrtodict(text, parser="lxml-xml")
         except Exception as err:
@@ -539,7 +551,7 @@ class CrossrefParser(BaseBeautifulSoupParser):
         self._parse_edhistory_copyright()
         self._parse_page()
         self._parse_ids()
-        self._parse_references()
+        self._get_references(text)
         self._parse_esources()
         self._dedup_titles()
 
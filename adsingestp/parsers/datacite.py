@@ -39,14 +39,19 @@ class DataciteParser(BaseBeautifulSoupParser):
         "Other": "misc",
     }
 
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    def __init__(self, output="dict"):
+        """
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(output=output)
+
+    def reset(self):
+        super(DataciteParser, self).reset()
         self.input_metadata = None
 
     def _parse_contrib(self, author=True):
         contribs_out = []
-        name_parser = utils.AuthorNames()
+        name_parser = utils.get_author_names()
         if author:
             if self.input_metadata.find("creators"):
                 contrib_array = self.input_metadata.find("creators").find_all("creator")
@@ -277,6 +282,8 @@ class DataciteParser(BaseBeautifulSoupParser):
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
         try:
             d = self.bsstrtodict(text, parser="lxml-xml")
         except Exception as err:
@@ -1,7 +1,9 @@
+import io
 import logging
 
 from adsingestp import utils
 from adsingestp.ingest_exceptions import (
+    IngestParserException,
     MissingAuthorsException,
     MissingTitleException,
     NoSchemaException,
@@ -21,17 +23,50 @@ class MultiDublinCoreParser(IngestBase):
         """
         Separate multi-record DublinCore XML document into individual XML documents
 
-        :param text: string, input XML text from a multi-record XML document
+        :param text: string, input XML text from a multi-record XML document; or, if it's UTF-8
+            encoded, a bytes-like object, os.PathLike or binary file object
         :param header: boolean (default: False), set to True to preserve overall
             document header/footer for each separate record's document
         :return: list, each item is the XML of a separate DublinCore document
         """
+        if isinstance(text, str):
+            chunks = self.get_chunks(text, self.start_re, self.end_re, head_foot=header)
+        else:
+            if isinstance(text, (bytes, bytearray, memoryview)):
+                text = io.BytesIO(text)
+            chunks = self.iter_chunks(text, self.start_re, self.end_re, head_foot=header)
+
         output_chunks = []
-        for chunk in self.get_chunks(text, self.start_re, self.end_re, head_foot=header):
+        for chunk in chunks:
             output_chunks.append(chunk.strip())
 
         return output_chunks
 
+    def iter_records(self, source, header=False, parsed=False):
+        """
+        Streaming version of parse: reads the input incrementally and yields one record at a time,
+        so that memory use doesn't grow with the size of the harvest
+
+        :param source: path to a UTF-8 encoded multi-record XML file, or a binary file object
+        :param header: boolean (default: False), set to True to preserve overall
+            document header/footer for each separate record's document
+        :param parsed: boolean (default: False), set to True to yield the output of
+            DublinCoreParser for each record instead of its XML; records that can't be parsed
+            (e.g. deleted records, which have no metadata) are logged and skipped
+        :return: iterator, each item is the XML of a separate DublinCore document, or its parsed
+            contents in JSON format
+        """
+        record_parser = DublinCoreParser()
+        for chunk in self.iter_chunks(source, self.start_re, self.end_re, head_foot=header):
+            chunk = chunk.strip()
+            if not parsed:
+                yield chunk
+                continue
+            try:
+                yield record_parser.parse(chunk)
+            except IngestParserException as err:
+                logger.warning("Skipping record that could not be parsed: %s", err)
+
 
 class DublinCoreParser(BaseBeautifulSoupParser):
     # Generic Dublin Core parser
@@ -43,9 +78,14 @@ class DublinCoreParser(BaseBeautifulSoupParser):
         "remove_the": False,
     }
 
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    def __init__(self, output="dict"):
+        """
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(output=output)
+
+    def reset(self):
+        super(DublinCoreParser, self).reset()
         self.input_header = None
         self.input_metadata = None
 
@@ -87,7 +127,7 @@ class DublinCoreParser(BaseBeautifulSoupParser):
 
     def _parse_author(self):
         authors_out = []
-        name_parser = utils.AuthorNames()
+        name_parser = utils.get_author_names()
 
         author_array = self.input_metadata.find_all("dc:creator")
 
@@ -157,6 +197,8 @@ class DublinCoreParser(BaseBeautifulSoupParser):
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
         try:
             d = self.bsstrtodict(text, parser="lxml-xml")
         except Exception as err:
@@ -2,6 +2,7 @@ import logging
 import re
 
 import validators
+from bs4.builder import LXMLTreeBuilderForXML
 from lxml import etree
 
 from adsingestp import utils
@@ -31,12 +32,52 @@ def flatten_author_groups(soup):
     return group_list
 
 
+class ElsevierTreeBuilder(LXMLTreeBuilderForXML):
+    """
+    BeautifulSoup lxml-xml tree builder that renames Elsevier formatting tags (e.g. ce:italic) to
+    their HTML equivalents as the elements are parsed
+    """
+
+    TAG_CONVERSIONS = {
+        "italics": "i",
+        "italic": "i",
+        "bold": "b",
+        "sup": "sup",
+        "inf": "sub",
+        "list": "ul",
+        "list-item": "li",
+        "para": "p",
+    }
+
+    def default_parser(self, encoding):
+        # malformed documents are rejected rather than recovered from
+        return etree.XMLParser(target=self, strip_cdata=False, recover=False, encoding=encoding)
+
+    def start(self, name, attrs, nsmap={}):
+        # lxml gives names as {namespace}localname
+        name = self.TAG_CONVERSIONS.get(name.rpartition("}")[2], name)
+        LXMLTreeBuilderForXML.start(self, name, attrs, nsmap)
+
+    def end(self, name):
+        name = self.TAG_CONVERSIONS.get(name.rpartition("}")[2], name)
+        LXMLTreeBuilderForXML.end(self, name)
+
+
 class ElsevierParser(BaseBeautifulSoupParser):
     author_collaborations_params = {}
 
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    REFERENCE_CONTAINERS = ["ce:bibliography"]
+    REFERENCE_TAGS = ["sb:reference", "ce:other-ref"]
+
+    def __init__(self, references="xml", output="dict"):
+        """
+        :param references: 'xml' (default), 'lazy', 'offsets' or 'none', see IngestBase
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(references=references, output=output)
+
+    def reset(self):
+        super(ElsevierParser, self).reset()
         self.record_header = None
         self.record_meta = None
 
@@ -339,7 +380,7 @@ class ElsevierParser(BaseBeautifulSoupParser):
             for ag in author_groups:
                 author_list.extend(self._parse_author_group(ag))
         elif self.record_header.find("dct:creator"):
-            name_parser = utils.AuthorNames()
+            name_parser = utils.get_author_names()
             authors_raw = self.record_header.find_all("dct:creator")
             for author in authors_raw:
                 author_name_raw = author.get_text()
@@ -378,13 +419,11 @@ class ElsevierParser(BaseBeautifulSoupParser):
     def _parse_references(self):
         bibsoup = self.record_meta.find("ce:bibliography")
         if bibsoup:
-            refs = bibsoup.find_all(["sb:reference", "ce:other-ref"])
-            references = []
-            for ref in refs:
-                # output raw XML for reference service to parse later
-                ref_xml = str(ref.extract()).replace("\n", " ")
-                references.append(ref_xml)
-            self.base_metadata["references"] = references
+            refs = [ref.extract() for ref in bibsoup.find_all(["sb:reference", "ce:other-ref"])]
+            # output raw XML for reference service to parse later
+            self.base_metadata["references"] = self._references_output(
+                refs, lambda r: str(r).replace("\n", " ")
+            )
 
     def _parse_esources(self):
         links = []
@@ -415,44 +454,19 @@ class ElsevierParser(BaseBeautifulSoupParser):
             if d.find(art_type, None):
                 return art_type, article_types[art_type]
 
-    def _remove_namespaces(self, text):
-        convert = {
-            "italics": "i",
-            "italic": "i",
-            "bold": "b",
-            "sup": "sup",
-            "inf": "sub",
-            "list": "ul",
-            "list-item": "li",
-            "para": "p",
-        }
-
-        root = etree.fromstring(text)
-
-        # Iterate through all XML elements
-        for elem in root.getiterator():
-            # Skip comments and processing instructions,
-            # because they do not have names
-            if not (
-                isinstance(elem, etree._Comment) or isinstance(elem, etree._ProcessingInstruction)
-            ):
-                # Remove a namespace URI in the element's name if element is specified in convert
-                if etree.QName(elem).localname in convert.keys():
-                    elem.tag = convert[etree.QName(elem).localname]
-
-        # Remove unused namespace declarations
-        etree.cleanup_namespaces(root)
-        return etree.tostring(root)
-
     def parse(self, text):
         """
         Parse Elsevier XML into standard JSON format
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
+        if self.references == "offsets":
+            text = self.read_input(text)
+
         try:
-            detagged_text = self._remove_namespaces(text)
-            d = self.bsstrtodict(detagged_text, parser="lxml-xml")
+            d = self.bsstrtodict(text, parser=ElsevierTreeBuilder)
         except Exception as err:
             raise XmlLoadException(err)
 
@@ -475,7 +489,7 @@ class ElsevierParser(BaseBeautifulSoupParser):
         self._parse_permissions()
         self._parse_authors()
         self._parse_keywords()
-        self._parse_references()
+        self._get_references(text)
         self._parse_esources()
         self.base_metadata = self._entity_convert(self.base_metadata)
         output = self.format(self.base_metadata, format="Elsevier")
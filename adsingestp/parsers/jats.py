@@ -1,22 +1,253 @@
+import inspect
 import logging
 import re
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from copy import copy
 
 import bs4
 import validators
+from bs4.builder import LXMLTreeBuilderForXML
+from lxml import etree
 from ordered_set import OrderedSet
 
 from adsingestp import utils
 from adsingestp.ingest_exceptions import XmlLoadException
-from adsingestp.parsers.base import BaseBeautifulSoupParser
+from adsingestp.parsers.base import BaseBeautifulSoupParser, LxmlTag
 
 logger = logging.getLogger(__name__)
 
 
+def _author_key(value):
+    """
+    :param value: author dictionary, or one of its values
+    :return: hashable value that is equal for equal authors
+    """
+    if isinstance(value, dict):
+        return frozenset((k, _author_key(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return (list, tuple(_author_key(v) for v in value))
+    return value
+
+
+class _AuthorList(object):
+    """
+    List of author dictionaries, indexed by author and by rid so that checking for duplicates and
+    finding collaboration members doesn't scan the whole list, which is quadratic for papers with
+    thousands of authors. Authors can only be appended or replaced, so that the index can't go
+    stale; an author that is changed once added must be stored again with authors[i] = author to
+    update the index, and must keep its rid.
+    """
+
+    def __init__(self):
+        self._authors = []
+        self._keys = []
+        self._key_counts = Counter()
+        self._rids = {}
+
+    def __contains__(self, author):
+        return self._key_counts[_author_key(author)] > 0
+
+    def __getitem__(self, index):
+        return self._authors[index]
+
+    def __iter__(self):
+        return iter(self._authors)
+
+    def __len__(self):
+        return len(self._authors)
+
+    def __setitem__(self, index, author):
+        if not isinstance(index, int):
+            raise TypeError("Authors can only be replaced one at a time")
+        key = _author_key(author)
+        self._key_counts[self._keys[index]] -= 1
+        self._key_counts[key] += 1
+        self._keys[index] = key
+        self._authors[index] = author
+
+    def append(self, author):
+        key = _author_key(author)
+        self._key_counts[key] += 1
+        self._keys.append(key)
+        if author.get("rid") not in self._rids:
+            self._rids[author.get("rid")] = len(self._authors)
+        self._authors.append(author)
+
+    def find_rid(self, rid):
+        """
+        :param rid: contrib id
+        :return: (index, author) of the first author with this rid, or None
+        """
+        if rid not in self._rids:
+            return None
+        index = self._rids[rid]
+        return index, self._authors[index]
+
+
+# Tag.extract takes the position of the tag as a private argument in the versions of
+# BeautifulSoup this was written for (4.x); if a later version drops it, _extract_all falls back
+# to extracting the tags one by one, which is correct but quadratic
+_EXTRACT_SELF_INDEX = "_self_index" in inspect.signature(bs4.Tag.extract).parameters
+
+
+def _extract_all(tags):
+    """
+    Removes tags from the tree. Tag.extract looks for each tag in its parent from the start, so
+    removing the members of a large collaboration one by one is quadratic; this finds their
+    positions in one pass per parent instead, see _EXTRACT_SELF_INDEX.
+    :param tags: list of tags
+    :return: tags
+    """
+    positions = {}
+    if _EXTRACT_SELF_INDEX:
+        for tag in tags:
+            if not isinstance(tag, LxmlTag) and tag.parent is not None:
+                if id(tag.parent) not in positions:
+                    positions[id(tag.parent)] = {
+                        id(c): i for i, c in enumerate(tag.parent.contents)
+                    }
+    # removing the last tags first keeps the positions of the others
+    for tag in reversed(tags):
+        if not isinstance(tag, LxmlTag) and id(tag.parent) in positions:
+            tag.extract(_self_index=positions[id(tag.parent)][id(tag)])
+        else:
+            tag.extract()
+    return tags
+
+
+ARTICLE_TAGS = ("article", "conf-article")
+
+
+def _skip_element(name, parents, references=True):
+    """
+    Parts of an article the metadata isn't taken from, see JATSParser(fulltext=False)
+    :param name: local name of an element
+    :param parents: local names of its ancestors, outermost first
+    :param references: set to False to skip the reference list as well
+    :return: True if the element (and its contents) can be left out
+    """
+    if parents and parents[-1] in ARTICLE_TAGS:
+        return name in ("body", "floats-group") or (name == "back" and not references)
+    if len(parents) > 1 and parents[-1] == "back" and parents[-2] in ARTICLE_TAGS:
+        return name != "ref-list"
+    return False
+
+
+def _prune_etree(root, references=True):
+    """
+    Removes the elements _skip_element leaves out from an lxml tree
+    :param root: lxml root element
+    :param references: set to False to remove the reference list as well
+    :return: none
+    """
+    if etree.QName(root).localname in ARTICLE_TAGS:
+        articles = [root]
+    else:
+        articles = root.xpath("//*[local-name()='article' or local-name()='conf-article']")
+    for article in articles:
+        parents = [etree.QName(article).localname]
+        for child in article.iterchildren(tag=etree.Element):
+            name = etree.QName(child).localname
+            if _skip_element(name, parents, references):
+                _etree_drop(child)
+            elif name == "back":
+                for c in child.iterchildren(tag=etree.Element):
+                    if _skip_element(etree.QName(c).localname, parents + [name], references):
+                        _etree_drop(c)
+
+
+def _etree_drop(element):
+    """
+    Removes an lxml element and its contents for good, while the tree is pruned and before it's
+    normalized. Unlike base._etree_remove, which keeps the strings on either side of a removed
+    element separate (as BeautifulSoup does when a tag is removed from a tree), the text that
+    follows the element is joined to the text before it, as if the element had never been in the
+    input; and the element is emptied first, since it isn't reused.
+    :param element: lxml element
+    :return: none
+    """
+    parent = element.getparent()
+    tail = element.tail
+    if tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + tail
+        else:
+            parent.text = (parent.text or "") + tail
+    # lxml moves a removed element to a new document, updating each node under it, so it's
+    # emptied first
+    element.clear()
+    parent.remove(element)
+
+
+class JATSFrontTreeBuilder(LXMLTreeBuilderForXML):
+    """
+    BeautifulSoup lxml-xml tree builder that leaves out the parts of a JATS article the metadata
+    isn't taken from (the body, and the back matter but the reference list) as the document is
+    parsed, so that no tags are created for the full text
+    """
+
+    def __init__(self, references=True, **kwargs):
+        """
+        :param references: set to False to leave out the reference list as well
+        """
+        super(JATSFrontTreeBuilder, self).__init__(**kwargs)
+        self.references = references
+        self._parents = []
+        self._skip_depth = 0
+
+    def initialize_soup(self, soup):
+        super(JATSFrontTreeBuilder, self).initialize_soup(soup)
+        self._parents = []
+        self._skip_depth = 0
+
+    def start(self, name, attrs, nsmap={}):
+        if self._skip_depth:
+            self._skip_depth += 1
+            return
+        # lxml gives names as {namespace}localname
+        local_name = name.rpartition("}")[2]
+        if _skip_element(local_name, self._parents, self.references):
+            self._skip_depth = 1
+            return
+        self._parents.append(local_name)
+        LXMLTreeBuilderForXML.start(self, name, attrs, nsmap)
+
+    def end(self, name):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            return
+        self._parents.pop()
+        LXMLTreeBuilderForXML.end(self, name)
+
+    def data(self, content):
+        if not self._skip_depth:
+            LXMLTreeBuilderForXML.data(self, content)
+
+    def pi(self, target, data):
+        if not self._skip_depth:
+            LXMLTreeBuilderForXML.pi(self, target, data)
+
+    def comment(self, content):
+        if not self._skip_depth:
+            LXMLTreeBuilderForXML.comment(self, content)
+
+
 class JATSAffils(object):
     regex_email = re.compile(r"^[a-zA-Z0-9+_.-]+@[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)+")
     regex_auth_xid = re.compile(r"^A[0-9]+$")
+    regex_email_format = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
+    regex_orcid = re.compile(r"(\d{4}-){3}\d{3}(\d|X)")
+    regex_xaff_split = re.compile(r"\s*,\s*|\s+")
+
+    # affiliation cleanup, see _fix_affil
+    regex_empty_email = re.compile(r"\(e-*mail:\s*,+\s*\)")
+    regex_commas = re.compile(r",+")
+    regex_whitespace = re.compile(r"\s+")
+    regex_leading_commas = re.compile(r"^(\s*,+\s*)+")
+    regex_comma_space = re.compile(r"(\s*,\s+)+")
+    regex_trailing_commas = re.compile(r"[\s,]+$")
+    regex_parentheses = re.compile(r"[()]")
 
     def __init__(self):
         self.contrib_dict = {}
@@ -24,6 +255,7 @@ class JATSAffils(object):
         self.xref_dict = OrderedDict()
         self.xref_xid_dict = OrderedDict()
         self.email_xref = OrderedDict()
+        self.affil_cache = {}
         self.output = None
 
     def _decompose(self, soup=None, tag=None):
@@ -58,27 +290,35 @@ class JATSAffils(object):
     def _remove_unbalanced_parentheses(self, affstr):
         # Stack to track balanced parentheses
         stack = []
-        to_remove = set()
+        to_remove = []
 
-        for i, char in enumerate(affstr):
+        # only the parentheses need to be looked at
+        for match in self.regex_parentheses.finditer(affstr):
+            i = match.start()
             # Track the index of opening parentheses
-            if char == "(":
+            if match.group() == "(":
                 stack.append(i)
-            elif char == ")":
-                if stack:
-                    # Pop if there's a matching opening parenthesis
-                    stack.pop()
-                else:
-                    # Mark unbalanced closing parenthesis
-                    to_remove.add(i)
+            elif stack:
+                # Pop if there's a matching opening parenthesis
+                stack.pop()
+            else:
+                # Mark unbalanced closing parenthesis
+                to_remove.append(i)
 
         # Mark remaining unbalanced opening parentheses
-        to_remove.update(stack)
+        to_remove.extend(stack)
+        if not to_remove:
+            return affstr
 
         # Create a new string without the unbalanced parentheses
-        new_affstr = "".join([char for i, char in enumerate(affstr) if i not in to_remove])
+        new_affstr = []
+        start = 0
+        for i in sorted(to_remove):
+            new_affstr.append(affstr[start:i])
+            start = i + 1
+        new_affstr.append(affstr[start:])
 
-        return new_affstr
+        return "".join(new_affstr)
 
     def _fix_affil(self, affstring):
         """
@@ -87,6 +327,11 @@ class JATSAffils(object):
         :return: newaffstr: affiliation string with email addresses removed
                  emails: list of email addresses
         """
+        # the same affiliation is often given for many authors
+        if affstring in self.affil_cache:
+            newaffstr, emails = self.affil_cache[affstring]
+            return newaffstr, list(emails)
+
         aff_list = affstring.split(";")
         new_aff = []
         emails = []
@@ -95,17 +340,23 @@ class JATSAffils(object):
             # check for empty strings with commas
             check_a = a.replace(",", "")
             if check_a:
-                a = re.sub("\\(e-*mail:\\s*,+\\s*\\)", "", a)
+                # the substitutions are skipped when they can't change the string
+                if "mail:" in a:
+                    a = self.regex_empty_email.sub("", a)
                 a = a.replace("\\n", ",")
                 a = a.replace(" —", "—")
                 a = a.replace(" , ", ", ")
                 a = a.replace(", .", ".")
-                a = re.sub(",+", ",", a)
-                a = re.sub("\\s+", " ", a)
-                a = re.sub("^(\\s*,+\\s*)+", "", a)
-                a = re.sub("(\\s*,\\s+)+", ", ", a)
-                a = re.sub("(,\\s*)+$", "", a)
-                a = re.sub("\\s+$", "", a)
+                if ",," in a:
+                    a = self.regex_commas.sub(",", a)
+                a = self.regex_whitespace.sub(" ", a)
+                # only single spaces are left
+                if a.startswith((",", " ,")):
+                    a = self.regex_leading_commas.sub("", a)
+                if " ," in a:
+                    a = self.regex_comma_space.sub(", ", a)
+                if a.endswith((",", " ")):
+                    a = self.regex_trailing_commas.sub("", a)
                 if self.regex_email.match(a):
                     emails.append(a)
                 else:
@@ -114,6 +365,7 @@ class JATSAffils(object):
                         new_aff.append(a)
 
         newaffstr = "; ".join(new_aff)
+        self.affil_cache[affstring] = (newaffstr, tuple(emails))
         return newaffstr, emails
 
     def _fix_email(self, email):
@@ -124,27 +376,29 @@ class JATSAffils(object):
         """
         email_new = OrderedSet()
 
-        email_format = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
         email_parsed = False
         for em in email:
             if " " in em:
                 for e in em.strip().split():
                     try:
-                        if email_format.search(e):
-                            email_new.add(email_format.search(e).group(0))
+                        match = self.regex_email_format.search(e)
+                        if match:
+                            email_new.add(match.group(0))
                             email_parsed = True
                     except Exception as err:
                         logger.warning("Bad format in _fix_email: %s" % err)
             else:
                 try:
                     if type(em) == str:
-                        if email_format.search(em):
-                            email_new.add(email_format.search(em).group(0))
+                        match = self.regex_email_format.search(em)
+                        if match:
+                            email_new.add(match.group(0))
                             email_parsed = True
                     elif type(em) == list:
                         for e in em:
-                            if email_format.search(e):
-                                email_new.add(email_format.search(e).group(0))
+                            match = self.regex_email_format.search(e)
+                            if match:
+                                email_new.add(match.group(0))
                                 email_parsed = True
                 except Exception as err:
                     logger.warning("Bad format in _fix_email: %s" % err)
@@ -166,13 +420,13 @@ class JATSAffils(object):
         elif not isinstance(orcid, list):
             raise TypeError("ORCID must be str or list")
 
-        orcid_format = re.compile(r"(\d{4}-){3}\d{3}(\d|X)")
         for orc in orcid:
             osplit = orc.strip().split()
             for o in osplit:
                 # ORCID IDs sometimes have the URL prepended - remove it
-                if orcid_format.search(o):
-                    orcid_new.add(orcid_format.search(o).group(0))
+                match = self.regex_orcid.search(o)
+                if match:
+                    orcid_new.add(match.group(0))
         return list(orcid_new)
 
     def _reformat_affids(self):
@@ -207,7 +461,7 @@ class JATSAffils(object):
                 # contents of xaff field aren't always properly separated - fix that here
                 xaff_list = []
                 for item in auth.get("xaff", []):
-                    xi = re.split("\\s*,\\s*|\\s+", item)
+                    xi = self.regex_xaff_split.split(item)
                     for x in xi:
                         xaff_list.append(x)
 
@@ -292,7 +546,7 @@ class JATSAffils(object):
         if article_metadata.find("contrib-group"):
             art_contrib_groups = article_metadata.find_all("contrib-group")
 
-        authors_out = []
+        authors_out = _AuthorList()
         contribs_out = []
 
         # JATS puts author data in <contrib-group>, giving individual authors in each <contrib>
@@ -304,6 +558,7 @@ class JATSAffils(object):
             default_key = "ALLAUTH"
 
             num_contribs = len(contribs_raw)
+            processed = []
 
             # extract <contrib> from each <contrib-group>
             for idx, contrib in enumerate(contribs_raw):
@@ -358,56 +613,51 @@ class JATSAffils(object):
                             authors_out.append(self.collab)
 
                     # find nested collab authors and unnest them
-                    collab_contribs = collab.find_all("contrib")
-                    nested_contribs = []
-                    for ncontrib in collab_contribs:
-                        if ncontrib:
-                            nested_contribs.append(copy(ncontrib))
-                            ncontrib.decompose()
+                    collab_contribs = [c for c in collab.find_all("contrib") if c]
+                    nested_contribs = [copy(c) for c in collab_contribs]
+                    for ncontrib in _extract_all(collab_contribs):
+                        ncontrib.decompose()
 
                     if not nested_contribs:
                         nested_contribs = contrib.find_all("contrib")
+                        _extract_all([c for c in nested_contribs if "rid" not in c.attrs])
+
+                    if contrib.find("collab"):
+                        collab_institution = contrib.find("collab").find("institution")
+                    else:
+                        collab_institution = None
+
+                    # add new collab tag to each unnested author
+                    if collab_institution:
+                        collab_text = collab_institution.decode_contents()
+                    elif collab_name:
+                        collab_text = collab_name
+                    else:
+                        collab_text = None
 
                     nested_idx = idx + 1
                     for nested_contrib in nested_contribs:
                         if "rid" in nested_contrib.attrs:
-                            rid_match = next(
-                                (
-                                    (rid_ndx, author)
-                                    for rid_ndx, author in enumerate(authors_out)
-                                    if author.get("rid") == nested_contrib["rid"]
-                                ),
-                                None,
-                            )
+                            rid_match = authors_out.find_rid(nested_contrib["rid"])
                             if rid_match:
                                 author_tmp = rid_match[1]
-                                if contrib.find("collab").find("institution", None):
-                                    author_tmp["collab"] = (
-                                        contrib.find("collab").find("institution").get_text()
-                                    )
+                                if collab_institution:
+                                    author_tmp["collab"] = collab_institution.get_text()
                                     authors_out[rid_match[0]] = author_tmp
                         else:
-                            # add new collab tag to each unnested author
-                            if contrib.find("collab") and contrib.find("collab").find(
-                                "institution"
-                            ):
-                                collab_text = (
-                                    contrib.find("collab").find("institution").decode_contents()
-                                )
-                            elif collab_name:
-                                collab_text = collab_name
-                            else:
-                                collab_text = None
                             if collab_text:
                                 collabtag_string = "<collab>" + collab_text + "</collab>"
-                                collabtag = bs4.BeautifulSoup(collabtag_string, "xml").collab
+                                if isinstance(nested_contrib, LxmlTag):
+                                    collabtag = LxmlTag.fromstring(collabtag_string).collab
+                                else:
+                                    collabtag = bs4.BeautifulSoup(collabtag_string, "xml").collab
 
                             if not collabtag:
                                 collabtag = "ALLAUTH"
 
                             if collabtag:
                                 nested_contrib.insert(0, collabtag)
-                                contribs_raw.insert(nested_idx, nested_contrib.extract())
+                                contribs_raw.insert(nested_idx, nested_contrib)
                                 nested_idx += 1
 
                 # check if collabtag is present in the author author attributes
@@ -620,6 +870,10 @@ class JATSAffils(object):
                         auth["role"] = role
                         contribs_out.append(auth)
                         default_key = "ALLCONTRIB"
+                processed.append(contrib)
+
+            # removed from the tree together, see _extract_all
+            for contrib in _extract_all(processed):
                 contrib.decompose()
 
             if self.collab:
@@ -678,7 +932,7 @@ class JATSAffils(object):
                     if not auth.get("aff", []) and not auth.get("xaff", []):
                         auth["xaff"] = [xref]
 
-        self.contrib_dict = {"authors": authors_out, "contributors": contribs_out}
+        self.contrib_dict = {"authors": list(authors_out), "contributors": contribs_out}
 
         # now get the xref keys outside of contrib-group:
         # aff xrefs...
@@ -731,13 +985,34 @@ class JATSAffils(object):
 
 
 class JATSParser(BaseBeautifulSoupParser):
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    BACKENDS = ["bs4", "lxml"]
+    REFERENCE_CONTAINERS = ["back", "ref-list"]
+    REFERENCE_TAGS = ["ref"]
+
+    def __init__(self, backend="bs4", references="xml", fulltext=True, output="dict"):
+        """
+        :param backend: 'bs4' (default) parses the input into a BeautifulSoup tree; 'lxml' parses it
+            with lxml.etree and searches it with precompiled XPath, which is faster for large files.
+            Both backends give the same output.
+        :param references: 'xml' (default), 'lazy', 'offsets' or 'none', see IngestBase
+        :param fulltext: set to False to leave the body, and the back matter but the reference list,
+            out of the tree while parsing; the output is the same, but parsing full text articles
+            is faster. With the bs4 backend, this only applies to the lxml-xml parser.
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(references=references, output=output)
+        if backend not in self.BACKENDS:
+            raise ValueError("Unknown backend %s, must be one of %s" % (backend, self.BACKENDS))
+        self.backend = backend
+        self.fulltext = fulltext
+
+    def reset(self):
+        super(JATSParser, self).reset()
         self.back_meta = None
         self.article_meta = None
         self.journal_meta = None
         self.isErratum = False
+        self.titledoi = None
 
     def _get_date(self, d):
         """
@@ -1259,16 +1534,18 @@ class JATSParser(BaseBeautifulSoupParser):
 
     def _parse_references(self):
         if self.back_meta is not None:
-            ref_list_text = []
             if self.back_meta.find("ref-list"):
-                ref_results = self.back_meta.find("ref-list").find_all("ref")
+                ref_list = self.back_meta.find("ref-list")
+                if isinstance(ref_list, LxmlTag):
+                    # references are output as BeautifulSoup serializes them
+                    ref_list = ref_list.to_soup()
+                ref_results = [r.extract() for r in ref_list.find_all("ref")]
             else:
                 ref_results = []
-            for r in ref_results:
-                # output raw XML for reference service to parse later
-                s = str(r.extract()).replace("\n", " ").replace("\xa0", " ")
-                ref_list_text.append(s)
-            self.base_metadata["references"] = ref_list_text
+            # output raw XML for reference service to parse later
+            self.base_metadata["references"] = self._references_output(
+                ref_results, lambda r: str(r).replace("\n", " ").replace("\xa0", " ")
+            )
 
     def _parse_esources(self):
         links = []
@@ -1350,10 +1627,28 @@ class JATSParser(BaseBeautifulSoupParser):
         """
         Parse JATS XML into standard JSON format
         :param text: string, contents of XML file
+        :param bsparser: BeautifulSoup parser, e.g. 'lxml-xml' (default); not used by the lxml backend
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
+        if self.references == "offsets":
+            text = self.read_input(text)
+
+        # the reference list is only parsed for these modes
+        references = self.references in ["xml", "lazy"]
         try:
-            d = self.bsstrtodict(text, parser=bsparser)
+            if self.backend == "lxml":
+                if self.fulltext:
+                    d = self.lxmlstrtotree(text)
+                else:
+                    d = self.lxmlstrtotree(
+                        text, prune=lambda root: _prune_etree(root, references=references)
+                    )
+            elif not self.fulltext and bsparser == "lxml-xml":
+                d = self.bsstrtodict(text, parser=JATSFrontTreeBuilder(references=references))
+            else:
+                d = self.bsstrtodict(text, parser=bsparser)
         except Exception as err:
             raise XmlLoadException(err)
 
@@ -1416,7 +1711,7 @@ class JATSParser(BaseBeautifulSoupParser):
         self._parse_esources()
         self._parse_funding()
 
-        self._parse_references()
+        self._get_references(text)
 
         self.base_metadata = self._entity_convert(self.base_metadata)
 
@@ -1427,30 +1722,18 @@ class JATSParser(BaseBeautifulSoupParser):
     def add_fulltext(self):
         pass
 
-    def citation_context(
-        self,
-        text,
-        bsparser="lxml-xml",
-        input_bibcode=None,
-        num_char=500,
-        resolve_refs=False,
-        text_output=True,
-    ):
+    def iter_citation_context(self, text, bsparser="lxml-xml", num_char=500, text_output=True):
         """
-        For a given fulltext XML, find the paragraph(s) each reference is cited in. Returns a dictionary of the
-        references (key) and an array of the paragraph(s) they're cited in (value). If resolve_refs is set to True, the
-        keys are bibcodes, otherwise they're the internal ID of the reference
+        For a given fulltext XML, yield the paragraph(s) each citation of a reference is in, in the
+        order the citations appear in the text. The context of a paragraph is only built once, however
+        many references it cites.
 
         :param text: text of fulltext XML to parse
         :param bsparser: parser to use with BeautifulSoup
-        :param input_bibcode: string, bibcode of input XML, if known # TODO do I need this? do I need to resolve and return the paper's own bibcode?
         :param num_char: integer, check that citation paragraph is at least this long; if it's shorter, return the
             paragraphs before and after the citing paragraph as well
-        :param resolve_refs: boolean, set to True to convert reference IDs to bibcodes # TODO this isn't fully implemented yet
         :param text_output: boolean, set to True to output citation context as a string, or False to output citation context as a raw XML string
-        :return: dictionary: {"resolved": {bibcode1: [cite_context1, cite_context2, ...], ...},
-                              "unresolved": {reference1: [cite_context1, cite_context2, ...], ...}}
-                 where a reference appears in "resolved" if a bibcode has been found for it, and "unresolved" if not
+        :return: iterator of (reference ID, cite_context)
         """
         try:
             d = self.bsstrtodict(text, parser=bsparser)
@@ -1459,25 +1742,43 @@ class JATSParser(BaseBeautifulSoupParser):
         document = d.article
 
         self.back_meta = document.back
-        body = document.body
-        xrefs = body.find_all("xref", attrs={"ref-type": "bibr"})
-        raw_cites = {}  # {rid_1: ["context 1", "context 2", ...]}
-        for x in xrefs:
-            id = x["rid"]
+        return self._iter_citations(document.body, num_char, text_output)
+
+    def _iter_citations(self, body, num_char, text_output):
+        """
+        :param body: BeautifulSoup body tag
+        :param num_char: see iter_citation_context
+        :param text_output: see iter_citation_context
+        :return: iterator of (reference ID, cite_context)
+        """
+        if body is None:
+            return
+
+        para_texts = {}  # {id(paragraph): text}
+        para_contexts = {}  # {id(paragraph): context}
+
+        def para_text(para):
+            if id(para) not in para_texts:
+                para_texts[id(para)] = para.get_text()
+            return para_texts[id(para)]
+
+        for x in body.find_all("xref", attrs={"ref-type": "bibr"}):
             immediate_para = x.find_parent("p")  # try to find the containing paragraph
             if immediate_para:
-                context = immediate_para
-                if text_output:
-                    context = context.get_text()
-                    if len(context) < num_char:
-                        prev_para = immediate_para.find_previous_sibling("p")
-                        if prev_para:
-                            context = prev_para.get_text() + context
-                        next_para = immediate_para.find_next_sibling("p")
-                        if next_para:
-                            context = context + next_para.get_text()
-                else:
-                    context = str(context)
+                context = para_contexts.get(id(immediate_para))
+                if context is None:
+                    if text_output:
+                        context = para_text(immediate_para)
+                        if len(context) < num_char:
+                            prev_para = immediate_para.find_previous_sibling("p")
+                            if prev_para:
+                                context = para_text(prev_para) + context
+                            next_para = immediate_para.find_next_sibling("p")
+                            if next_para:
+                                context = context + para_text(next_para)
+                    else:
+                        context = str(immediate_para)
+                    para_contexts[id(immediate_para)] = context
             else:
                 # reference not contained in a paragraph, so just get whatever context we have
                 if text_output:
@@ -1486,7 +1787,78 @@ class JATSParser(BaseBeautifulSoupParser):
                     context = str(x.find_parent())
             if not context:
                 context = "WARNING NO CONTEXT FOUND"
-            if id in raw_cites.keys():
+            yield x["rid"], context
+
+    def _ref_bibcodes(self, ref_list, resolver=None, ref_ids=None):
+        """
+        :param ref_list: BeautifulSoup ref-list tag, or None
+        :param resolver: resolver.ReferenceIndex, to look up the references without a bibcode
+            ext-link
+        :param ref_ids: set of the reference IDs to look up in the resolver, all by default
+        :return: dictionary {reference ID: bibcode} of the references with a bibcode, in the order
+            of the reference list
+        """
+        bibcodes = {}
+        if ref_list is None:
+            return bibcodes
+        unresolved = []  # [(reference ID, reference)]
+        for r in ref_list.find_all("ref"):
+            ref_id = r.get("id")
+            if not ref_id or bibcodes.get(ref_id):
+                continue
+            link = r.find("ext-link", attrs={"ext-link-type": "bibcode"})
+            if link:
+                bibcodes[ref_id] = link.get_text()
+            elif ref_id not in bibcodes:
+                # None keeps the reference list order
+                bibcodes[ref_id] = None
+                if resolver is not None and (ref_ids is None or ref_id in ref_ids):
+                    # as output by _parse_references
+                    unresolved.append((ref_id, str(r).replace("\n", " ").replace("\xa0", " ")))
+
+        if unresolved:
+            found = resolver.lookup_many([raw for ref_id, raw in unresolved])
+            for (ref_id, raw), bibc in zip(unresolved, found):
+                if bibcodes[ref_id] is None:
+                    bibcodes[ref_id] = bibc
+        return {ref_id: bibc for ref_id, bibc in bibcodes.items() if bibc}
+
+    def citation_context(
+        self,
+        text,
+        bsparser="lxml-xml",
+        input_bibcode=None,
+        num_char=500,
+        resolve_refs=False,
+        text_output=True,
+        resolver=None,
+    ):
+        """
+        For a given fulltext XML, find the paragraph(s) each reference is cited in. Returns a dictionary of the
+        references (key) and an array of the paragraph(s) they're cited in (value), in the order the citations
+        appear in the text (see iter_citation_context, which yields them one at a time). If resolve_refs is set to
+        True, the keys are bibcodes where one is found, otherwise they're the internal ID of the reference
+
+        :param text: text of fulltext XML to parse
+        :param bsparser: parser to use with BeautifulSoup
+        :param input_bibcode: string, bibcode of input XML, if known # TODO do I need this? do I need to resolve and return the paper's own bibcode?
+        :param num_char: integer, check that citation paragraph is at least this long; if it's shorter, return the
+            paragraphs before and after the citing paragraph as well
+        :param resolve_refs: boolean, set to True to convert reference IDs to bibcodes: taken from the bibcode
+            ext-link of the reference or, for references without one, looked up in resolver if given; references
+            without a bibcode stay under their ID in "unresolved"
+        :param text_output: boolean, set to True to output citation context as a string, or False to output citation context as a raw XML string
+        :param resolver: resolver.ReferenceIndex, used with resolve_refs to look up the bibcodes of the references that
+            don't have a bibcode ext-link
+        :return: dictionary: {"resolved": {bibcode1: [cite_context1, cite_context2, ...], ...},
+                              "unresolved": {reference1: [cite_context1, cite_context2, ...], ...}}
+                 where a reference appears in "resolved" if a bibcode has been found for it, and "unresolved" if not
+        """
+        raw_cites = {}  # {rid_1: ["context 1", "context 2", ...]}
+        for id, context in self.iter_citation_context(
+            text, bsparser=bsparser, num_char=num_char, text_output=text_output
+        ):
+            if id in raw_cites:
                 raw_cites[id].append(context)
             else:
                 raw_cites[id] = [context]
@@ -1497,49 +1869,17 @@ class JATSParser(BaseBeautifulSoupParser):
 
         resolved_cites = {}
         if self.back_meta is not None:
-            if self.back_meta.find("ref-list"):
-                ref_results = self.back_meta.find("ref-list").find_all("ref")
-            else:
-                ref_results = []
-            for r in ref_results:
-                if r["id"]:
-                    ref_id = r["id"]
-                    bibc = None
-                    for e in r.find_all("ext-link"):
-                        if e.has_attr("ext-link-type") and e["ext-link-type"] == "bibcode":
-                            bibc = e.get_text()
-                            # if we have the bibcode and it matches something in our unresolved dict, add to output
-                            tmp = raw_cites.pop(ref_id, [])
-                            if tmp:
-                                resolved_cites[bibc] = tmp
-                    if not bibc:
-                        # load the parsed references file (this should happen just once per input file, so somewhere up above)
-                        # parsed references file: /proj/ads_references/resolved/<bibstem>/<volume?>/<bibcode>.iopft.xml.result
-                        # columns of this file: score \s parsed reference bibcode \s raw XML
-                        # check w/ Golnaz for a reader for this file
-                        # look at this file: https://github.com/golnazads/ADSReferencePipeline/blob/master/adsrefpipe/utils.py
-
-                        # if we don't have the bibcode, parse ref and add to a structure to query the API
-                        # authors = r.find_all("surname")
-
-                        # match the raw ref XML from the input file to the parsed reference bibcode
-                        # bibc = "BIB" + ref_id
-
-                        # options for resolving references
-                        # 1. parse references here, pass parsed references to /xml endpoint to get bibcode
-                        #     pros: cleanest, easiest for other people to run the code later (no special /proj access needed)
-                        #     cons: have to parse the reference a bit to pass it to the /xml endpoint (code duplication, re-inventing the wheel, etc.),
-                        #           will likely have to make multiple requests per input file (can only do 16 refs per request) so this will be slower
-                        #           (plus API request overhead) and could be a hit on our API depending on how many files are being processed
-                        # 2. use these files: /proj/ads_references/resolved/<bibstem>/<volume?>/<bibcode>.iopft.xml.result to match raw XML w/ parsed bibcode
-                        #     pros: only need to access one file per XML file, easy to code, no need to do anything special for different formats
-                        #     cons: have to construct the file path (e.g. know the bibstem, volume, bibcode of the input file), have to establish
-                        #           connection to /proj (though pipelines can be set up to do this automatically, harder for individual users to do on
-                        #           localhost)
-                        # 3. reference pipeline database? is that a thing? there's a model for it but not sure if that's running anywhere
-                        #     pros: potentially easier to connect to than /proj (maybe), don't need to know input file's bibcode
-                        #     cons: not sure this is deployed anywhere useful right now, or populated
-                        pass
+            bibcodes = self._ref_bibcodes(
+                self.back_meta.find("ref-list"), resolver=resolver, ref_ids=set(raw_cites)
+            )
+            for ref_id, bibc in bibcodes.items():
+                # if we have the bibcode and it matches something in our unresolved dict, add to output
+                tmp = raw_cites.pop(ref_id, [])
+                if tmp:
+                    resolved_cites[bibc] = tmp
+
+            # references without a bibcode ext-link that aren't in the resolver index (or when there's
+            # no resolver) stay under their ID in raw_cites, i.e. in "unresolved"
 
         out_cites = {"resolved": resolved_cites, "unresolved": raw_cites}
 
@@ -10,13 +10,23 @@ orcid_format = re.compile(r"(\d{4}-){3}\d{3}(\d|X)")
 
 
 class WileyParser(BaseBeautifulSoupParser):
-    def __init__(self):
-        super(BaseBeautifulSoupParser, self).__init__()
-        self.base_metadata = {}
+    REFERENCE_CONTAINERS = ["bibliography"]
+    REFERENCE_TAGS = ["citation"]
+
+    def __init__(self, references="xml", output="dict"):
+        """
+        :param references: 'xml' (default), 'lazy', 'offsets' or 'none', see IngestBase
+        :param output: 'dict' (default) or 'json', see IngestBase
+        """
+        super(BaseBeautifulSoupParser, self).__init__(references=references, output=output)
+
+    def reset(self):
+        super(WileyParser, self).reset()
         self.pubmeta_prod = None
         self.pubmeta_part = None
         self.pubmeta_unit = None
         self.content_meta = None
+        self.bib = None
 
     def _parse_ids(self):
         self.base_metadata["ids"] = {}
@@ -226,14 +236,13 @@ class WileyParser(BaseBeautifulSoupParser):
             self.base_metadata["keywords"] = keywords
 
     def _parse_references(self):
-        references = []
         if self.bib:
-            for ref in self.bib.find_all("citation"):
-                # output raw XML for reference service to parse later
-                ref_xml = str(ref.extract()).replace("\n", " ").replace("\xa0", " ")
-                references.append(ref_xml)
+            references = [ref.extract() for ref in self.bib.find_all("citation")]
 
-            self.base_metadata["references"] = references
+            # output raw XML for reference service to parse later
+            self.base_metadata["references"] = self._references_output(
+                references, lambda r: str(r).replace("\n", " ").replace("\xa0", " ")
+            )
 
     def parse(self, text):
         """
@@ -241,6 +250,11 @@ class WileyParser(BaseBeautifulSoupParser):
         :param text: string, contents of XML file
         :return: parsed file contents in JSON format
         """
+        self.reset()
+
+        if self.references == "offsets":
+            text = self.read_input(text)
+
         try:
             d = self.bsstrtodict(text, parser="lxml-xml")
         except Exception as err:
@@ -267,7 +281,7 @@ class WileyParser(BaseBeautifulSoupParser):
         self._parse_permissions()
         self._parse_authors()
         self._parse_keywords()
-        self._parse_references()
+        self._get_references(text)
 
         output = self.format(self.base_metadata, format="Wiley")
 
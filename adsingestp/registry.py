@@ -0,0 +1,233 @@
+import inspect
+import logging
+import re
+
+from adsingestp.ingest_exceptions import WrongFormatException
+from adsingestp.parsers.adsfeedback import ADSFeedbackParser
+from adsingestp.parsers.base import IngestBase
+from adsingestp.parsers.copernicus import CopernicusParser
+from adsingestp.parsers.crossref import CrossrefParser
+from adsingestp.parsers.datacite import DataciteParser
+from adsingestp.parsers.dubcore import DublinCoreParser
+from adsingestp.parsers.elsevier import ElsevierParser
+from adsingestp.parsers.jats import JATSParser
+from adsingestp.parsers.wiley import WileyParser
+
+logger = logging.getLogger(__name__)
+
+# input format: parser class
+PARSERS = {
+    "jats": JATSParser,
+    "crossref": CrossrefParser,
+    "datacite": DataciteParser,
+    "elsevier": ElsevierParser,
+    "wiley": WileyParser,
+    "copernicus": CopernicusParser,
+    "dubcore": DublinCoreParser,
+    "adsfeedback": ADSFeedbackParser,
+}
+
+# input format that's detected by sniff, e.g. for the --format option of the command line
+AUTO = "auto"
+
+# number of bytes at the start of a document that sniff looks at
+SNIFF_BYTES = 8192
+
+_PROLOG = re.compile(r"\s*(?:<\?.*?\?>|<!--.*?-->)", re.S)
+_DOCTYPE = re.compile(r"\s*<!DOCTYPE\s+([^\s>\[]+)([^>\[]*)(?:\[.*?\])?\s*>", re.S)
+_START_TAG = re.compile(r"\s*<([^\s/>!?]+)([^>]*)>", re.S)
+_NAMESPACE = re.compile(r"""xmlns(?::[^\s=]+)?\s*=\s*["']([^"']*)["']""")
+# first element of the metadata of an OAI-PMH record
+_METADATA = re.compile(
+    r"<(?:[^\s/>:]+:)?metadata\b[^>]*>(?:\s|<!--.*?-->)*<([^\s/>!?]+)([^>]*)>", re.S
+)
+
+# input format by root element name (without namespace prefix)
+_ROOT_FORMATS = {
+    "doi_records": "crossref",
+    "doi_record": "crossref",
+    "crossref": "crossref",
+    "resource": "datacite",
+    "oai_datacite": "datacite",
+    "component": "wiley",
+    "dc": "dubcore",
+}
+
+# input format by a substring of a namespace declared on the root element
+_NAMESPACE_FORMATS = [
+    ("elsevier.com", "elsevier"),
+    ("wiley.com/namespaces", "wiley"),
+    ("datacite.org", "datacite"),
+    ("crossref.org/xschema", "crossref"),
+    ("openarchives.org/OAI/2.0/oai_dc", "dubcore"),
+]
+
+# roots of OAI-PMH records and responses, whose format is that of their metadata
+_OAI_ROOTS = ["record", "OAI-PMH", "GetRecord", "ListRecords"]
+
+
+def _head(data):
+    """
+    :param data: input, str or bytes-like
+    :return: str, the first SNIFF_BYTES of the input, without byte order mark; bytes are decoded
+        as latin-1 (unless they start with a UTF-16 byte order mark), which is enough to read
+        the markup
+    """
+    head = data[:SNIFF_BYTES]
+    if isinstance(head, str):
+        return head.lstrip("\ufeff")
+    head = bytes(head)
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return head.decode("utf-16", "ignore").lstrip("\ufeff")
+    if head.startswith(b"\xef\xbb\xbf"):
+        head = head[3:]
+    return head.decode("latin-1")
+
+
+def _format_of(name, attributes, doctype, rest):
+    """
+    :param name: name of the root element, with its namespace prefix if any
+    :param attributes: str, attributes of the root element
+    :param doctype: str, external identifier of the DOCTYPE (e.g. the path to the DTD), or ""
+    :param rest: str, the rest of the document head
+    :return: input format, or None if it's not recognized
+    """
+    # e.g. Elsevier's ja:article, which isn't a JATS article
+    for namespace in _NAMESPACE.findall(attributes):
+        for substring, input_format in _NAMESPACE_FORMATS:
+            if substring in namespace:
+                return input_format
+
+    local_name = name.rpartition(":")[2]
+    if local_name in ["article", "conf-article"]:
+        # JATS and Copernicus articles look alike, but Copernicus has a DTD of its own
+        return "copernicus" if "copernicus" in doctype.lower() else "jats"
+
+    if local_name in _OAI_ROOTS:
+        match = _METADATA.search(rest)
+        if match is None or match.group(1).rpartition(":")[2] in _OAI_ROOTS:
+            return None
+        return _format_of(match.group(1), match.group(2), "", "")
+
+    if local_name in _ROOT_FORMATS:
+        return _ROOT_FORMATS[local_name]
+    return None
+
+
+def sniff(data):
+    """
+    Detects the format of a document from its first SNIFF_BYTES, without parsing it: JSON is ADS
+    feedback, and XML is recognized by its root element, the namespaces declared on it and its
+    DOCTYPE, or for OAI-PMH records, by the first element of their metadata
+
+    :param data: input, str or bytes-like; only its first SNIFF_BYTES are read
+    :return: input format (key of PARSERS), or None if it's not recognized
+    """
+    head = _head(data)
+    if head.lstrip()[:1] in ("{", "["):
+        return "adsfeedback"
+
+    pos = 0
+    match = _PROLOG.match(head, pos)
+    while match:
+        pos = match.end()
+        match = _PROLOG.match(head, pos)
+    doctype = ""
+    match = _DOCTYPE.match(head, pos)
+    if match:
+        doctype = match.group(2)
+        pos = match.end()
+        # comments can follow the DOCTYPE too
+        match = _PROLOG.match(head, pos)
+        while match:
+            pos = match.end()
+            match = _PROLOG.match(head, pos)
+
+    match = _START_TAG.match(head, pos)
+    if match is None:
+        return None
+    return _format_of(match.group(1), match.group(2), doctype, head[match.end() :])
+
+
+def sniff_file(path):
+    """
+    :param path: path to an input file
+    :return: input format (key of PARSERS), or None if it's not recognized, see sniff
+    """
+    with open(path, "rb") as fp:
+        return sniff(fp.read(SNIFF_BYTES))
+
+
+def create_parser(input_format, **options):
+    """
+    Creates a parser with the constructor options it accepts, e.g. so that one set of options can
+    be used for all formats; the options a parser doesn't accept (e.g. references, for formats
+    without references) are logged and left out
+    :param input_format: key of PARSERS
+    :param options: constructor options
+    :return: parser instance
+    """
+    parser_class = PARSERS[input_format]
+    parameters = inspect.signature(parser_class).parameters
+    dropped = sorted(k for k in options if k not in parameters)
+    if dropped:
+        logger.warning(
+            "%s doesn't take the options %s, which are left out",
+            parser_class.__name__,
+            ", ".join(dropped),
+        )
+    return parser_class(**{k: v for k, v in options.items() if k in parameters})
+
+
+class Dispatcher(object):
+    """
+    Parses documents of any of the formats in PARSERS, picking the parser with sniff, so that e.g.
+    a directory of files from several publishers can be parsed in one go. A document whose format
+    isn't recognized raises WrongFormatException, rather than being parsed by the wrong parser.
+
+    Example:
+
+        dispatcher = Dispatcher(references="none")
+        for filename in filenames:
+            with open(filename, "rb") as fp:
+                output = dispatcher.parse(fp.read())
+    """
+
+    def __init__(self, **options):
+        """
+        :param options: constructor options of the parsers, e.g. output="json"; each parser is
+            given the options it accepts, see create_parser
+        """
+        self.options = options
+        # parser instances, by input format
+        self._parsers = {}
+        self._reader = IngestBase()
+
+    def get_parser(self, input_format):
+        """
+        :param input_format: key of PARSERS
+        :return: parser instance, created the first time it's needed
+        """
+        if input_format not in self._parsers:
+            self._parsers[input_format] = create_parser(input_format, **self.options)
+        return self._parsers[input_format]
+
+    def parser_for(self, data):
+        """
+        :param data: input, str or bytes-like
+        :return: parser instance for the format of the input
+        """
+        input_format = sniff(data)
+        if input_format is None:
+            raise WrongFormatException("Unrecognized input format")
+        logger.debug("Detected input format: %s", input_format)
+        return self.get_parser(input_format)
+
+    def parse(self, data):
+        """
+        :param data: input, see IngestBase.read_input
+        :return: output of the parser for the format of the input
+        """
+        data = self._reader.read_input(data)
+        # parsers reset their state at the start of each document, so one instance is reused
+        return self.parser_for(data).parse(data)
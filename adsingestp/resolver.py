@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import re
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+_whitespace = re.compile(r"\s+")
+_whitespace_between_tags = re.compile(r">\s+<")
+
+# number of keys per query in ReferenceIndex.lookup_many; SQLite allows 999 parameters by default
+_LOOKUP_BATCH = 500
+
+
+def reference_key(raw_reference):
+    """
+    Hash of a raw reference, which is the same for references that only differ in whitespace, e.g.
+    as output by a parser and as written to a result file
+
+    :param raw_reference: reference XML string
+    :return: 16 byte digest
+    """
+    text = _whitespace.sub(" ", raw_reference.replace("\xa0", " "))
+    text = _whitespace_between_tags.sub("><", text).strip()
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ReferenceIndex(object):
+    """
+    On-disk index of resolved references, to look up the bibcode of a raw reference without a
+    round trip to the reference service. It's built from the result files of the reference
+    resolver, which have one reference per line: score, bibcode and raw reference XML, separated
+    by whitespace. References with a score of 0 weren't resolved, and aren't indexed; if a reference
+    was resolved more than once, the bibcode with the highest score is kept.
+
+    Example:
+
+        index = ReferenceIndex("references.db")
+        index.build(glob.glob("/proj/ads_references/resolved/AJ/158/*.result"))
+        bibcode = index.lookup(raw_reference)
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        :param path: path to the SQLite database, created if it doesn't exist; the index is kept in
+            memory by default
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS refs "
+            "(key BLOB PRIMARY KEY, bibcode TEXT NOT NULL, score REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def _parse_results(self, lines):
+        """
+        :param lines: iterable of result file lines
+        :return: iterator of (key, bibcode, score) of the resolved references
+        """
+        for line in lines:
+            columns = line.split(None, 2)
+            if len(columns) < 3:
+                continue
+            try:
+                score = float(columns[0])
+            except ValueError:
+                # e.g. a header
+                continue
+            if score > 0:
+                yield reference_key(columns[2]), columns[1], score
+
+    def add_results(self, lines):
+        """
+        Indexes the references of a result file
+
+        :param lines: iterable of result file lines
+        :return: none
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO refs VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "bibcode = excluded.bibcode, score = excluded.score "
+                "WHERE excluded.score > refs.score",
+                self._parse_results(lines),
+            )
+
+    def build(self, filenames):
+        """
+        Indexes the references of many result files. The database isn't journaled while it's built,
+        so an interrupted build can leave it corrupted: build it again from the result files.
+
+        :param filenames: list of paths to result files
+        :return: none
+        """
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        try:
+            for filename in filenames:
+                with open(filename, "r", encoding="utf-8", errors="replace") as fp:
+                    self.add_results(fp)
+        finally:
+            self.connection.execute("PRAGMA synchronous = FULL")
+            self.connection.execute("PRAGMA journal_mode = DELETE")
+        logger.info("Indexed %s references from %s files", len(self), len(filenames))
+
+    def lookup(self, raw_reference):
+        """
+        :param raw_reference: reference XML string
+        :return: bibcode, or None if the reference isn't in the index
+        """
+        row = self.connection.execute(
+            "SELECT bibcode FROM refs WHERE key = ?", (reference_key(raw_reference),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def lookup_many(self, raw_references):
+        """
+        :param raw_references: list of reference XML strings
+        :return: list of bibcodes (or None for references that aren't in the index), in the same
+            order
+        """
+        keys = [reference_key(r) for r in raw_references]
+        bibcodes = {}
+        for i in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[i : i + _LOOKUP_BATCH]
+            bibcodes.update(
+                self.connection.execute(
+                    "SELECT key, bibcode FROM refs WHERE key IN (%s)" % ",".join("?" * len(batch)),
+                    batch,
+                )
+            )
+        return [bibcodes.get(k) for k in keys]
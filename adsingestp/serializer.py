@@ -0,0 +1,61 @@
+import json
+from collections.abc import Sequence
+
+
+def _default(obj):
+    """
+    Serializes the types in parser output that JSON libraries don't know about, i.e.
+    LazyReferences and other sequences
+    :param obj: object
+    :return: JSON serializable object
+    """
+    if isinstance(obj, Sequence):
+        return list(obj)
+    raise TypeError("Type is not JSON serializable: %s" % type(obj).__name__)
+
+
+# JSON serialization of parser output: orjson or msgspec if either is installed, which are much
+# faster than the json module; all of them give the same output, compact UTF-8 encoded JSON
+try:
+    import orjson
+
+    BACKEND = "orjson"
+
+    def dumps(obj):
+        """
+        :param obj: parser output, e.g. as returned by IngestBase.format
+        :return: JSON bytes
+        """
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = "msgspec"
+        _encoder = msgspec.json.Encoder(enc_hook=_default)
+
+        def dumps(obj):
+            """
+            :param obj: parser output, e.g. as returned by IngestBase.format
+            :return: JSON bytes
+            """
+            return _encoder.encode(obj)
+
+        loads = msgspec.json.decode
+
+    except ImportError:
+        BACKEND = "json"
+
+        def dumps(obj):
+            """
+            :param obj: parser output, e.g. as returned by IngestBase.format
+            :return: JSON bytes
+            """
+            return json.dumps(
+                obj, default=_default, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+
+        loads = json.loads
@@ -0,0 +1,155 @@
+import abc
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# methods timed by instrument, besides the _parse_* stages
+TIMED_METHODS = ["parse", "bsstrtodict", "lxmlstrtotree", "_detag", "format"]
+
+# sink used for parsers created while it's set, see set_default_sink
+_default_sink = None
+
+
+class TimingSink(abc.ABC):
+    """
+    Receives the wall time of each call to a timed parser method. Subclass this and implement
+    record to send timings elsewhere; a subclass that doesn't can't be instantiated.
+    """
+
+    @abc.abstractmethod
+    def record(self, parser, stage, seconds):
+        """
+        :param parser: parser class name, e.g. 'JATSParser'
+        :param stage: method name, e.g. '_parse_author'
+        :param seconds: wall time of the call
+        :return: none
+        """
+
+
+class LoggingTimingSink(TimingSink):
+    """
+    Logs every timed call
+    """
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def record(self, parser, stage, seconds):
+        logger.log(self.level, "%s.%s took %.3f ms", parser, stage, seconds * 1000)
+
+
+class MemoryTimingSink(TimingSink):
+    """
+    Aggregates call counts and wall times per parser and stage
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def record(self, parser, stage, seconds):
+        with self._lock:
+            t = self.timings.get((parser, stage))
+            if t is None:
+                t = self.timings[(parser, stage)] = {"count": 0, "total": 0.0, "max": 0.0}
+            t["count"] += 1
+            t["total"] += seconds
+            if seconds > t["max"]:
+                t["max"] = seconds
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+
+    def stats(self):
+        """
+        :return: list of dictionaries, one per parser and stage, with the call count and the total,
+            mean and max wall time in seconds; the slowest stages first
+        """
+        with self._lock:
+            stats = [
+                {
+                    "parser": parser,
+                    "stage": stage,
+                    "count": t["count"],
+                    "total": t["total"],
+                    "mean": t["total"] / t["count"],
+                    "max": t["max"],
+                }
+                for (parser, stage), t in self.timings.items()
+            ]
+        return sorted(stats, key=lambda s: s["total"], reverse=True)
+
+    def to_prometheus(self, prefix="adsingestp"):
+        """
+        :param prefix: metric name prefix
+        :return: timings in the Prometheus text exposition format
+        """
+        metrics = [
+            ("stage_calls_total", "count", "Number of calls to each parser stage"),
+            ("stage_seconds_total", "total", "Wall time spent in each parser stage"),
+            ("stage_seconds_max", "max", "Longest call to each parser stage"),
+        ]
+        stats = sorted(self.stats(), key=lambda s: (s["parser"], s["stage"]))
+        lines = []
+        for name, key, description in metrics:
+            name = prefix + "_" + name
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, "gauge" if key == "max" else "counter"))
+            for s in stats:
+                lines.append(
+                    '%s{parser="%s",stage="%s"} %s' % (name, s["parser"], s["stage"], s[key])
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _timed(method, parser, stage, sink):
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            sink.record(parser, stage, time.perf_counter() - start)
+
+    return timed
+
+
+def instrument(parser, sink):
+    """
+    Times the parse method, each _parse_* stage and the _detag/bsstrtodict calls of a parser
+    instance. The timed methods are wrapped on the instance only, so parsers that aren't
+    instrumented run unchanged.
+
+    :param parser: parser instance
+    :param sink: TimingSink
+    :return: parser
+    """
+    name = type(parser).__name__
+    for attr in dir(type(parser)):
+        if attr.startswith("_parse_") or attr in TIMED_METHODS:
+            method = getattr(parser, attr)
+            if callable(method):
+                setattr(parser, attr, _timed(method, name, attr, sink))
+    return parser
+
+
+def set_default_sink(sink):
+    """
+    Instruments every parser created from now on, e.g. for a whole batch run
+
+    :param sink: TimingSink, or None to stop instrumenting new parsers
+    :return: none
+    """
+    global _default_sink
+    _default_sink = sink
+
+
+def get_default_sink():
+    """
+    :return: TimingSink set by set_default_sink, or None
+    """
+    return _default_sink
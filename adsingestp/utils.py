@@ -1,8 +1,11 @@
+import collections
 import collections.abc
+import functools
 import html
 import logging
 import os
 import re
+import threading
 
 import nameparser
 
@@ -119,6 +122,121 @@ AIP_DISCARD_KEYWORDS = [
 ]
 
 
+AUTHOR_NAMES_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "data_files", "author_names"
+)
+
+# Immutable container for the ADS author name dictionaries; each field is a frozenset
+# of upper-cased (as stored in the .dat files) name strings
+AuthorNameData = collections.namedtuple(
+    "AuthorNameData", ["first_names", "last_names", "suffix_names", "prefix_names"]
+)
+
+# Default number of distinct author strings memoized by each AuthorNames instance
+AUTHOR_NAMES_CACHE_SIZE = 10000
+
+_author_name_data = None
+_author_names = None
+_author_names_lock = threading.Lock()
+
+
+def _read_datfile(filename):
+    output_list = []
+    with open(filename, "r") as fp:
+        for line in fp.readlines():
+            if line.strip() != "" and line[0] != "#":
+                output_list.append(line.strip())
+    return output_list
+
+
+def _configure_nameparser(name_data):
+    """
+    Replace the nameparser suffix constants with the ADS suffix list. This modifies the
+    global nameparser configuration, so it should only be done when the name data is (re)loaded.
+
+    :param name_data: AuthorNameData
+    :return: none
+    """
+    # Remove the preset suffixes and add back only our suffixes
+    nameparser.config.CONSTANTS.suffix_acronyms.remove(
+        *nameparser.config.CONSTANTS.suffix_acronyms
+    )
+    nameparser.config.CONSTANTS.suffix_not_acronyms.remove(
+        *nameparser.config.CONSTANTS.suffix_not_acronyms
+    )
+    for s in name_data.suffix_names:
+        nameparser.config.CONSTANTS.suffix_acronyms.add(s)
+        nameparser.config.CONSTANTS.suffix_not_acronyms.add(s)
+
+
+def load_author_name_data(data_dirname=AUTHOR_NAMES_DIR):
+    """
+    Read the ADS author name dictionaries from disk. Most callers should use
+    get_author_name_data instead, which caches the result for the life of the process.
+
+    :param data_dirname: directory containing first.dat, last.dat, suffixes.dat and prefixes.dat
+    :return: AuthorNameData
+    """
+    logger.info("Loading ADS author names from: %s", data_dirname)
+    return AuthorNameData(
+        first_names=frozenset(_read_datfile(os.path.join(data_dirname, "first.dat"))),
+        last_names=frozenset(_read_datfile(os.path.join(data_dirname, "last.dat"))),
+        suffix_names=frozenset(_read_datfile(os.path.join(data_dirname, "suffixes.dat"))),
+        prefix_names=frozenset(_read_datfile(os.path.join(data_dirname, "prefixes.dat"))),
+    )
+
+
+def get_author_name_data():
+    """
+    Return the process-wide ADS author name dictionaries, loading them (and configuring
+    nameparser) on first use
+
+    :return: AuthorNameData
+    """
+    global _author_name_data
+    if _author_name_data is None:
+        with _author_names_lock:
+            if _author_name_data is None:
+                name_data = load_author_name_data()
+                _configure_nameparser(name_data)
+                _author_name_data = name_data
+    return _author_name_data
+
+
+def get_author_names():
+    """
+    Return the process-wide AuthorNames parser. Parsers should use this rather than
+    instantiating AuthorNames for every record.
+
+    :return: AuthorNames
+    """
+    global _author_names
+    if _author_names is None:
+        name_data = get_author_name_data()
+        with _author_names_lock:
+            if _author_names is None:
+                _author_names = AuthorNames(name_data=name_data)
+    return _author_names
+
+
+def reload_author_names(data_dirname=AUTHOR_NAMES_DIR):
+    """
+    Re-read the author name dictionaries from disk, e.g. after the .dat files have been updated,
+    and replace the shared name data and AuthorNames parser. AuthorNames instances created before
+    the reload keep the dictionaries they were built with.
+
+    :param data_dirname: directory containing the author name .dat files
+    :return: AuthorNameData
+    """
+    global _author_name_data, _author_names
+    name_data = load_author_name_data(data_dirname)
+    with _author_names_lock:
+        _configure_nameparser(name_data)
+        _author_name_data = name_data
+        _author_names = None
+    return name_data
+
+
 class AuthorNames(object):
     """
     Author names parser
@@ -132,32 +250,26 @@ class AuthorNames(object):
     }
     parse_titles = False
 
-    def __init__(self):
-        data_dirname = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)), "data_files", "author_names"
-        )
-        logger.info("Loading ADS author names from: %s", data_dirname)
-        self.first_names = self._read_datfile(os.path.join(data_dirname, "first.dat"))
-        self.last_names = self._read_datfile(os.path.join(data_dirname, "last.dat"))
-        suffix_names = self._read_datfile(os.path.join(data_dirname, "suffixes.dat"))
-
-        # Remove the preset suffixes and add back only our suffixes
-        nameparser.config.CONSTANTS.suffix_acronyms.remove(
-            *nameparser.config.CONSTANTS.suffix_acronyms
-        )
-        nameparser.config.CONSTANTS.suffix_not_acronyms.remove(
-            *nameparser.config.CONSTANTS.suffix_not_acronyms
-        )
-        for s in suffix_names:
-            nameparser.config.CONSTANTS.suffix_acronyms.add(s)
-            nameparser.config.CONSTANTS.suffix_not_acronyms.add(s)
+    def __init__(self, name_data=None, cache_size=AUTHOR_NAMES_CACHE_SIZE):
+        """
+        :param name_data: AuthorNameData to use; defaults to the shared, process-wide name data
+        :param cache_size: maximum number of parsed author strings to memoize (least recently used
+            entries are evicted first); set to 0 or None to disable memoization
+        """
+        if name_data is None:
+            name_data = get_author_name_data()
+        self.first_names = name_data.first_names
+        self.last_names = name_data.last_names
 
-        if self.parse_titles:
-            prefix_names = self._read_datfile(os.path.join(data_dirname, "prefixes.dat"))
+        if cache_size:
+            self._parse_cached = functools.lru_cache(maxsize=cache_size)(self._parse_frozen)
+        else:
+            self._parse_cached = None
 
+        if self.parse_titles:
             # Remove the preset titles and add back only our titles
             nameparser.config.CONSTANTS.titles.remove(*nameparser.config.CONSTANTS.titles)
-            for s in prefix_names:
+            for s in name_data.prefix_names:
                 nameparser.config.CONSTANTS.titles.add(s)
 
         # Compile regular expressions
@@ -168,13 +280,23 @@ class AuthorNames(object):
         self.regex_the = re.compile(r"^[Tt]he ")
         self.regex_multiple_sp = re.compile(r" +")
 
-    def _read_datfile(self, filename):
-        output_list = []
-        with open(filename, "r") as fp:
-            for line in fp.readlines():
-                if line.strip() != "" and line[0] != "#":
-                    output_list.append(line.strip())
-        return output_list
+    def cache_info(self):
+        """
+        Hit/miss statistics of the parsed author name cache
+
+        :return: functools cache info namedtuple (hits, misses, maxsize, currsize), or None if
+            memoization is disabled
+        """
+        if self._parse_cached is None:
+            return None
+        return self._parse_cached.cache_info()
+
+    def cache_clear(self):
+        """
+        Empty the parsed author name cache and reset its statistics
+        """
+        if self._parse_cached is not None:
+            self._parse_cached.cache_clear()
 
     def _extract_collaboration(self, author_str, default_to_last_name, collaborations_params):
         """
@@ -354,6 +476,7 @@ class AuthorNames(object):
         default_to_last_name=True,
         collaborations_params=default_collaborations_params,
         parse_titles=False,
+        use_cache=True,
     ):
         """
         Receives an author string and returns a list of re-formatted parsed author dictionaries
@@ -382,6 +505,7 @@ class AuthorNames(object):
         :param parse_titles: Boolean param to set whether to parse titles in author names. By default, this is
             turned off because most modern records do not include author titles, and the set of titles
             overlaps with some first names; recommended for older record parsing only. Default: False
+        :param use_cache: Boolean param to set whether to use (and populate) the parsed name cache. Default: True
         :return: list of parsed author dictionaries
         """
 
@@ -389,6 +513,36 @@ class AuthorNames(object):
             self.parse_titles = True
         full_collaborations_params = self.default_collaborations_params.copy()
         full_collaborations_params.update(collaborations_params)
+
+        if use_cache and self._parse_cached is not None:
+            params_key = tuple(
+                sorted(
+                    (k, tuple(v) if isinstance(v, list) else v)
+                    for k, v in full_collaborations_params.items()
+                )
+            )
+            try:
+                hash(params_key)
+            except TypeError:
+                params_key = None
+            if params_key is not None:
+                parsed = self._parse_cached(
+                    author_str, default_to_last_name, params_key, parse_titles
+                )
+                # cached entries are immutable; hand back fresh dicts that callers can add to
+                return [dict(a) for a in parsed]
+
+        return self._parse(author_str, default_to_last_name, full_collaborations_params)
+
+    def _parse_frozen(self, author_str, default_to_last_name, params_key, parse_titles):
+        """
+        Memoizable form of _parse: takes the collaboration params as a sorted tuple of key/value
+        pairs and returns the parsed authors as a tuple of (key, value) tuples
+        """
+        parsed = self._parse(author_str, default_to_last_name, dict(params_key))
+        return tuple(tuple(a.items()) for a in parsed)
+
+    def _parse(self, author_str, default_to_last_name, full_collaborations_params):
         corrected_authors_list = []
         author_str = self._clean_author_name(author_str)
         # Check for collaboration strings
@@ -0,0 +1,249 @@
+import gzip
+import logging
+import queue
+import threading
+
+from adsingestp import serializer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = [None, "gzip", "zstd"]
+
+# number of bytes of records NDJSONWriter collects before writing them out
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# put on the queue of a QueuedWriter to stop its thread
+_STOP = object()
+
+
+class NDJSONWriter(object):
+    """
+    Writes records as newline delimited JSON (NDJSON, or JSON Lines), one record per line, to a
+    file, a compressed file or a series of files ("shards") of limited size. Records are collected
+    and written out in batches, so that the output file, which may be on a network filesystem, gets
+    few large writes rather than one per record.
+
+    Example:
+
+        with NDJSONWriter("records-{shard:04d}.jsonl.gz", "gzip", max_bytes=2**30) as writer:
+            for text in inputs:
+                writer.write(parser.parse(text))
+    """
+
+    def __init__(self, output, compression=None, max_bytes=None, buffer_size=WRITE_BUFFER_SIZE):
+        """
+        :param output: path of the output file, or binary file object, e.g. sys.stdout.buffer,
+            which isn't closed by close. With max_bytes, a path containing "{shard}", which is
+            formatted with the number of each shard, starting at 0, e.g. "records-{shard:04d}.jsonl"
+        :param compression: None, 'gzip' or 'zstd' (requires the zstandard package)
+        :param max_bytes: integer, size of the shards: a new shard is started once the current one
+            reaches this size on disk, i.e. compressed. Shards are only closed between batches, so
+            they can be larger by up to a batch; the compressed stream is flushed after each batch.
+            None (default) writes a single file.
+        :param buffer_size: integer, number of bytes of records written out at a time
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                "Unknown compression %s, must be one of %s" % (compression, COMPRESSIONS)
+            )
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        if max_bytes is not None and (not isinstance(output, str) or "{shard" not in output):
+            raise ValueError("Writing shards requires an output path containing {shard}")
+
+        self.output = output
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        # number of records written, and paths of the files written to
+        self.records = 0
+        self.paths = []
+
+        self._buffer = []
+        self._buffered = 0
+        self._file = None
+        self._stream = None
+        if max_bytes is None:
+            self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        """
+        Opens the output file, or the next shard
+        :return: none
+        """
+        if isinstance(self.output, str):
+            path = self.output.format(shard=len(self.paths)) if self.max_bytes else self.output
+            self._file = open(path, "wb")
+            self.paths.append(path)
+        else:
+            self._file = self.output
+
+        if self.compression == "gzip":
+            # the default level of the gzip command; GzipFile's default, 9, is much slower
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=6)
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._file, closefd=False)
+        else:
+            self._stream = self._file
+
+    def _close(self):
+        """
+        Closes the output file, or the current shard
+        :return: none
+        """
+        if self._stream is not self._file:
+            # writes the end of the compressed stream, but doesn't close the file
+            self._stream.close()
+        if self._file is self.output:
+            self._file.flush()
+        else:
+            self._file.close()
+        self._file = self._stream = None
+
+    def _write_buffer(self):
+        """
+        Writes out the collected records, and starts a new shard if the current one is full
+        :return: none
+        """
+        if not self._buffer:
+            return
+        if self._stream is None:
+            self._open()
+        self._stream.write(b"".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+        if self.max_bytes is not None:
+            if self._stream is not self._file:
+                # so that the size of the file includes the batch
+                self._stream.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._close()
+
+    def write(self, record):
+        """
+        :param record: record dictionary, e.g. as returned by a parser, or JSON bytes, e.g. as
+            returned by a parser created with output="json"
+        :return: none
+        """
+        if not isinstance(record, bytes):
+            record = serializer.dumps(record)
+        self._buffer.append(record)
+        self._buffer.append(b"\n")
+        self._buffered += len(record) + 1
+        self.records += 1
+        if self._buffered >= self.buffer_size:
+            self._write_buffer()
+
+    def write_many(self, records):
+        """
+        :param records: iterable of records, see write
+        :return: none
+        """
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """
+        Writes out the collected records, including any compressed data that's been held back
+        :return: none
+        """
+        self._write_buffer()
+        if self._stream is not None:
+            self._stream.flush()
+            if self._stream is not self._file:
+                self._file.flush()
+
+    def close(self):
+        """
+        Writes out the collected records and closes the output
+        :return: none
+        """
+        self._write_buffer()
+        if self._stream is not None:
+            self._close()
+
+
+class QueuedWriter(object):
+    """
+    Writes records with an NDJSONWriter in a background thread, so that producers don't wait for
+    the output to be written. Records are passed through a bounded queue: when it's full, put
+    blocks until the writer has caught up, rather than records piling up in memory.
+
+    Example:
+
+        writer = QueuedWriter(NDJSONWriter("records.jsonl"), maxsize=100)
+        try:
+            for text in inputs:
+                writer.put(parser.parse(text))
+        finally:
+            writer.close()
+    """
+
+    def __init__(self, writer, maxsize=1000):
+        """
+        :param writer: NDJSONWriter, or any object with write and close methods
+        :param maxsize: integer, number of records the queue holds
+        """
+        self.writer = writer
+        self.queue = queue.Queue(maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="adsingestp-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        """
+        Writes the records from the queue until close is called. After an error, the remaining
+        records are dropped, so that producers aren't blocked; the error is raised by put and close.
+        :return: none
+        """
+        while True:
+            record = self.queue.get()
+            if record is _STOP:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self.writer.write(record)
+            except Exception as err:
+                logger.exception("Error writing record")
+                self._error = err
+
+    def put(self, record, timeout=None):
+        """
+        :param record: record, see NDJSONWriter.write
+        :param timeout: seconds to wait for space in the queue, or None (default) to wait until
+            there is; raises queue.Full if there's still none
+        :return: none
+        """
+        if self._error is not None:
+            raise self._error
+        self.queue.put(record, timeout=timeout)
+
+    def close(self):
+        """
+        Waits for the queued records to be written, and closes the writer
+        :return: none
+        """
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
+            self.writer.close()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,101 @@
+"""
+Benchmarks JATSParser on synthetic articles with many authors, e.g.
+
+    python benchmarks/benchmark_authors.py --authors 1000 --authors 10000
+
+Each article has a collaboration author with nested members, authors with affiliation, email and
+ORCID cross-references, and one affiliation per 20 authors, like large collaboration papers
+(see tests/stubdata/input/jats_springer_EPJC_*). The time per author should stay roughly constant
+as the number of authors grows.
+"""
+
+import time
+
+import click
+
+ARTICLE = """<?xml version="1.0" encoding="UTF-8"?>
+<article xmlns:xlink="http://www.w3.org/1999/xlink" article-type="research-article">
+<front>
+<journal-meta><journal-title-group><journal-title>Synthetic</journal-title></journal-title-group>
+<issn pub-type="epub">0000-0000</issn></journal-meta>
+<article-meta>
+<article-id pub-id-type="doi">10.0000/synthetic.%(n)d</article-id>
+<title-group><article-title>A paper with %(n)d authors</article-title></title-group>
+<contrib-group>
+%(contribs)s
+</contrib-group>
+%(affs)s
+<author-notes><corresp id="cor1">corresponding@example.org</corresp></author-notes>
+<pub-date pub-type="epub"><day>1</day><month>1</month><year>2023</year></pub-date>
+<volume>1</volume><fpage>1</fpage>
+</article-meta>
+</front>
+</article>
+"""
+
+COLLAB = """<contrib contrib-type="author"><collab><institution>The Synthetic Collaboration</institution>
+<contrib-group>%s</contrib-group></collab></contrib>"""
+
+CONTRIB = """<contrib contrib-type="author" id="A%(i)d"%(corresp)s>
+<contrib-id contrib-id-type="orcid">https://orcid.org/0000-0002-%(orcid)04d-000X</contrib-id>
+<name><surname>Surname%(i)d</surname><given-names>Given %(initial)s.</given-names></name>
+<xref ref-type="aff" rid="Aff%(aff)d">%(aff)d</xref>%(xref_corresp)s
+</contrib>"""
+
+AFF = """<aff id="Aff%(j)d"><label>%(j)d</label><institution>Department %(j)d, University %(j)d
+</institution>, <addr-line>City %(j)d</addr-line>, <country>Country</country></aff>"""
+
+
+def make_article(n_authors, n_members=None):
+    """
+    :param n_authors: number of authors
+    :param n_members: number of them nested in the collaboration, a tenth by default
+    :return: JATS XML text
+    """
+    if n_members is None:
+        n_members = n_authors // 10
+    contribs = []
+    for i in range(n_authors):
+        contribs.append(
+            CONTRIB
+            % {
+                "i": i,
+                "orcid": i % 10000,
+                "initial": chr(65 + i % 26),
+                "aff": i // 20,
+                "corresp": ' corresp="yes"' if i == 0 else "",
+                "xref_corresp": '<xref ref-type="corresp" rid="cor1"/>' if i == 0 else "",
+            }
+        )
+    members = contribs[:n_members]
+    contribs = [COLLAB % "\n".join(members)] + contribs[n_members:]
+    affs = [AFF % {"j": j} for j in range((n_authors + 19) // 20)]
+    return ARTICLE % {"n": n_authors, "contribs": "\n".join(contribs), "affs": "\n".join(affs)}
+
+
+@click.command()
+@click.option(
+    "--authors",
+    "-a",
+    "n_authors",
+    type=int,
+    multiple=True,
+    default=[1000, 2000, 5000, 10000],
+    show_default=True,
+)
+@click.option("--backend", type=click.Choice(["bs4", "lxml"]), default="bs4", show_default=True)
+def main(n_authors, backend):
+    from adsingestp.parsers.jats import JATSParser
+
+    click.echo("%8s %10s %14s" % ("authors", "seconds", "ms per author"))
+    for n in n_authors:
+        text = make_article(n)
+        start = time.perf_counter()
+        parsed = JATSParser(backend=backend).parse(text)
+        seconds = time.perf_counter() - start
+        assert len(parsed["authors"]) == n + 1
+        click.echo("%8d %10.2f %14.3f" % (n, seconds, seconds / n * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmarks IngestBase.format on the parsed metadata of the example files in tests/stubdata/input,
+e.g.
+
+    python benchmarks/benchmark_format.py --repeat 20
+    python benchmarks/benchmark_format.py --repeat 20 --output json
+
+For each parser, reports the time per record and the mean and largest peak memory (measured with
+tracemalloc) while formatting a record, which includes the output itself.
+"""
+
+import copy
+import os
+import time
+import tracemalloc
+
+import click
+from benchmark_parsers import STUBDATA_DIR, _parser_for
+
+
+def peak_memory(formatter, input_dict, format):
+    """
+    :param formatter: IngestBase instance
+    :param input_dict: parsed metadata dictionary
+    :param format: format name
+    :return: peak memory allocated while formatting, in bytes, including the output
+    """
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    output = formatter.format(input_dict, format)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    del output
+    return peak
+
+
+def collect_metadata(input_dir, parsers):
+    """
+    :param input_dir: directory of example files
+    :param parsers: list of parser names, all if empty
+    :return: dictionary {parser name: [(parsed metadata dictionary, format)]}
+    """
+    from adsingestp.cli import PARSERS
+    from adsingestp.parsers.base import IngestBase
+
+    collected = []
+    format_method = IngestBase.format
+
+    def collect(self, input_dict, format):
+        collected.append((copy.deepcopy(input_dict), format))
+        return format_method(self, input_dict, format)
+
+    metadata = {}
+    IngestBase.format = collect
+    try:
+        for f in sorted(os.listdir(input_dir)):
+            parser_name = _parser_for(f)
+            if not parser_name or (parsers and parser_name not in parsers):
+                continue
+            with open(os.path.join(input_dir, f), "rb") as fp:
+                data = fp.read()
+            del collected[:]
+            try:
+                PARSERS[parser_name]().parse(data)
+            except Exception:
+                continue
+            if collected:
+                metadata.setdefault(parser_name, []).extend(collected)
+    finally:
+        IngestBase.format = format_method
+    return metadata
+
+
+@click.command()
+@click.option("--repeat", "-r", type=click.IntRange(min=1), default=20, show_default=True)
+@click.option(
+    "--parser", "-p", "parsers", multiple=True, help="Only benchmark these parsers (repeatable)"
+)
+@click.option("--input-dir", default=STUBDATA_DIR, type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--output",
+    type=click.Choice(["dict", "json"]),
+    default="dict",
+    show_default=True,
+    help="Output mode of format; json includes serializing each record",
+)
+def main(repeat, parsers, input_dir, output):
+    from adsingestp.parsers.base import IngestBase
+
+    formatter = IngestBase(output=output)
+
+    click.echo(
+        "%-12s %8s %10s %14s %13s"
+        % ("parser", "records", "us/record", "mean peak KiB", "max peak KiB")
+    )
+    for parser_name, records in sorted(collect_metadata(input_dir, parsers).items()):
+        start = time.perf_counter()
+        for i in range(repeat):
+            for input_dict, format in records:
+                formatter.format(input_dict, format)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        try:
+            peaks = [peak_memory(formatter, input_dict, format) for input_dict, format in records]
+        finally:
+            tracemalloc.stop()
+        click.echo(
+            "%-12s %8d %10.1f %14.1f %13.1f"
+            % (
+                parser_name,
+                len(records),
+                seconds / repeat / len(records) * 1e6,
+                sum(peaks) / len(peaks) / 1024,
+                max(peaks) / 1024,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
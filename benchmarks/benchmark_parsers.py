@@ -0,0 +1,280 @@
+"""
+Benchmarks the parsers over the example files in tests/stubdata/input, e.g.
+
+    python benchmarks/benchmark_parsers.py --repeat 5 --output bench.json
+    python benchmarks/benchmark_parsers.py --baseline bench.json --tolerance 0.25
+
+Each file is parsed in a new process (so that its peak RSS can be measured), once to warm up and
+then --repeat times. The results are summarized per parser and per file, and written as JSON.
+With --baseline, the results are compared to an earlier JSON output, and the exit status is 1 if
+any parser got slower (or used more memory) by more than --tolerance.
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+
+import click
+
+STUBDATA_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "stubdata", "input")
+
+# file name prefix: parser (key of adsingestp.cli.PARSERS)
+FILE_PREFIXES = [
+    ("jats_", "jats"),
+    ("nlm_", "jats"),
+    ("mdpi_", "jats"),
+    ("ieee_jats_", "jats"),
+    ("crossref_", "crossref"),
+    ("datacite", "datacite"),
+    ("zenodo_", "datacite"),
+    ("els_", "elsevier"),
+    ("wiley_", "wiley"),
+    ("copernicus_", "copernicus"),
+    ("dubcore_", "dubcore"),
+    ("arxiv_", "dubcore"),
+    ("ads_feedback", "adsfeedback"),
+]
+
+# not a single record, see dubcore.MultiDublinCoreParser
+SKIP_FILES = ["arxiv_multi_20230125.xml"]
+
+# summary values compared with the baseline; True if larger is better
+COMPARED = {
+    "records_per_sec": True,
+    "mb_per_sec": True,
+    "p95_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def _parser_for(filename):
+    if filename in SKIP_FILES:
+        return None
+    for prefix, parser in FILE_PREFIXES:
+        if filename.startswith(prefix):
+            return parser
+    return None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        peak = peak / 1024
+    return peak / 1024
+
+
+def _percentile(values, percent):
+    """
+    :param values: sorted list of numbers
+    :param percent: percentile, 0-100
+    :return: percentile, interpolated between the closest values
+    """
+    if not values:
+        return None
+    k = (len(values) - 1) * percent / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def _benchmark_file(path, parser_name, repeat):
+    """
+    Runs in a new process: parses one file repeatedly
+
+    :param path: path to the input file
+    :param parser_name: key of adsingestp.cli.PARSERS
+    :param repeat: number of timed runs
+    :return: dictionary of results for this file
+    """
+    from adsingestp.cli import PARSERS
+
+    with open(path, "rb") as fp:
+        data = fp.read()
+
+    parser_class = PARSERS[parser_name]
+    try:
+        parser_class().parse(data)
+    except Exception as err:
+        return {"parser": parser_name, "bytes": len(data), "error": repr(err)}
+
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        parser_class().parse(data)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "parser": parser_name,
+        "bytes": len(data),
+        "latencies": latencies,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _summarize(latencies, nbytes, nruns, peak_rss_mb):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "runs": nruns,
+        "total_sec": total,
+        "records_per_sec": nruns / total if total else None,
+        "mb_per_sec": nbytes / 1024 / 1024 / total if total else None,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def run_benchmarks(filenames, repeat):
+    """
+    :param filenames: list of (path, parser name)
+    :param repeat: number of timed runs per file
+    :return: dictionary with the results per parser and per file
+    """
+    ctx = multiprocessing.get_context("spawn")
+    files = {}
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        for path, parser_name in filenames:
+            name = os.path.basename(path)
+            result = pool.apply(_benchmark_file, (path, parser_name, repeat))
+            if "error" in result:
+                files[name] = result
+                continue
+            files[name] = dict(
+                parser=parser_name,
+                bytes=result["bytes"],
+                **_summarize(
+                    result["latencies"],
+                    result["bytes"] * repeat,
+                    repeat,
+                    result["peak_rss_mb"],
+                ),
+            )
+            files[name]["latencies"] = result["latencies"]
+
+    parsers = {}
+    for parser_name in sorted(set(p for f, p in filenames)):
+        results = [r for r in files.values() if r["parser"] == parser_name and "error" not in r]
+        if not results:
+            continue
+        latencies = [t for r in results for t in r["latencies"]]
+        parsers[parser_name] = dict(
+            files=len(results),
+            errors=len([r for r in files.values() if r["parser"] == parser_name]) - len(results),
+            **_summarize(
+                latencies,
+                sum(r["bytes"] * r["runs"] for r in results),
+                len(latencies),
+                max(r["peak_rss_mb"] for r in results),
+            ),
+        )
+
+    for r in files.values():
+        r.pop("latencies", None)
+
+    return {
+        "meta": {
+            "date": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "parsers": parsers,
+        "files": files,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: output of run_benchmarks
+    :param baseline: output of an earlier run_benchmarks
+    :param tolerance: allowed relative change, e.g. 0.2 for 20%
+    :return: list of regression messages
+    """
+    regressions = []
+    for parser_name, summary in results["parsers"].items():
+        base = baseline.get("parsers", {}).get(parser_name)
+        if not base:
+            continue
+        for key, larger_is_better in COMPARED.items():
+            new = summary.get(key)
+            old = base.get(key)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            if (larger_is_better and change < -tolerance) or (
+                not larger_is_better and change > tolerance
+            ):
+                regressions.append(
+                    "%s: %s %.3g -> %.3g (%+.0f%%)" % (parser_name, key, old, new, change * 100)
+                )
+    return regressions
+
+
+@click.command()
+@click.option("--repeat", "-r", type=click.IntRange(min=1), default=5, show_default=True)
+@click.option(
+    "--parser", "-p", "parsers", multiple=True, help="Only benchmark these parsers (repeatable)"
+)
+@click.option("--output", "-o", type=click.File("w"), help="Write the results as JSON")
+@click.option("--baseline", "-b", type=click.File("r"), help="Earlier JSON output to compare with")
+@click.option(
+    "--tolerance",
+    "-t",
+    type=float,
+    default=0.2,
+    show_default=True,
+    help="Allowed relative change from the baseline",
+)
+@click.option("--input-dir", default=STUBDATA_DIR, type=click.Path(exists=True, file_okay=False))
+def main(repeat, parsers, output, baseline, tolerance, input_dir):
+    filenames = []
+    for f in sorted(os.listdir(input_dir)):
+        parser_name = _parser_for(f)
+        if parser_name and (not parsers or parser_name in parsers):
+            filenames.append((os.path.join(input_dir, f), parser_name))
+
+    results = run_benchmarks(filenames, repeat)
+
+    click.echo(
+        "%-12s %6s %10s %8s %9s %9s %9s %9s"
+        % ("parser", "files", "records/s", "MB/s", "p50 ms", "p95 ms", "p99 ms", "RSS MB")
+    )
+    for parser_name, s in results["parsers"].items():
+        click.echo(
+            "%-12s %6d %10.1f %8.2f %9.1f %9.1f %9.1f %9.1f"
+            % (
+                parser_name,
+                s["files"],
+                s["records_per_sec"],
+                s["mb_per_sec"],
+                s["p50_ms"],
+                s["p95_ms"],
+                s["p99_ms"],
+                s["peak_rss_mb"],
+            )
+        )
+    for name, r in results["files"].items():
+        if "error" in r:
+            click.echo("error in %s: %s" % (name, r["error"]))
+
+    if output:
+        json.dump(results, output, indent=2)
+
+    if baseline:
+        regressions = compare(results, json.load(baseline), tolerance)
+        for r in regressions:
+            click.echo("REGRESSION " + r)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
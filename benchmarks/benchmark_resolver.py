@@ -0,0 +1,87 @@
+"""
+Benchmarks building and querying a resolver.ReferenceIndex with synthetic result files, e.g.
+
+    python benchmarks/benchmark_resolver.py --references 1000000 --index /tmp/references.db
+
+The lookup time per reference should stay roughly constant as the index grows.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+import click
+
+REFERENCE = (
+    '<ref id="bib%(i)d"><mixed-citation publication-type="journal"><person-group '
+    'person-group-type="author"><name><surname>Surname%(i)d</surname><given-names>G.'
+    "</given-names></name></person-group> <year>%(year)d</year> <source>ApJ</source> "
+    "<volume>%(volume)d</volume> <fpage>%(page)d</fpage></mixed-citation></ref>"
+)
+
+
+def make_reference(i):
+    """
+    :param i: reference number
+    :return: reference XML string
+    """
+    return REFERENCE % {"i": i, "year": 1950 + i % 70, "volume": i % 900, "page": i % 9973}
+
+
+def write_results(directory, n_references, per_file):
+    """
+    :param directory: directory to write the result files to
+    :param n_references: number of references
+    :param per_file: number of references per result file
+    :return: list of paths
+    """
+    filenames = []
+    for start in range(0, n_references, per_file):
+        filename = os.path.join(directory, "%08d.result" % start)
+        with open(filename, "w") as fp:
+            for i in range(start, min(start + per_file, n_references)):
+                fp.write(
+                    "1.0\t%04dApJ...%03d.%04dS\t%s\n"
+                    % (1950 + i % 70, i % 900, i % 9973, make_reference(i))
+                )
+        filenames.append(filename)
+    return filenames
+
+
+@click.command()
+@click.option("--references", "-n", "n_references", type=int, default=100000, show_default=True)
+@click.option("--per-file", type=int, default=100, show_default=True)
+@click.option("--lookups", type=int, default=10000, show_default=True)
+@click.option("--index", type=click.Path(dir_okay=False), help="Index path, in memory by default")
+def main(n_references, per_file, lookups, index):
+    from adsingestp.resolver import ReferenceIndex
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = write_results(directory, n_references, per_file)
+        reference_index = ReferenceIndex(index or ":memory:")
+        start = time.perf_counter()
+        reference_index.build(filenames)
+        seconds = time.perf_counter() - start
+    click.echo(
+        "build: %d references in %.2f s, %.0f references/s"
+        % (len(reference_index), seconds, n_references / seconds)
+    )
+
+    queries = [make_reference(random.randrange(n_references)) for i in range(lookups)]
+    start = time.perf_counter()
+    found = [reference_index.lookup(q) for q in queries]
+    seconds = time.perf_counter() - start
+    assert all(found)
+    click.echo("lookup: %.1f us per reference" % (seconds / lookups * 1e6))
+
+    start = time.perf_counter()
+    found = reference_index.lookup_many(queries)
+    seconds = time.perf_counter() - start
+    assert all(found)
+    click.echo("lookup_many: %.1f us per reference" % (seconds / lookups * 1e6))
+    reference_index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmarks writing the formatted records of the example files in tests/stubdata/input with
+writer.NDJSONWriter, e.g.
+
+    python benchmarks/benchmark_writer.py --records 20000 --output-dir /mnt/network/tmp
+
+For each compression, reports records/sec and MB/sec (uncompressed) through an NDJSONWriter,
+through a QueuedWriter, and, for comparison, with a write call per record.
+"""
+
+import os
+import tempfile
+import time
+
+import click
+from benchmark_format import collect_metadata
+from benchmark_parsers import STUBDATA_DIR
+
+
+def write_each(path, records):
+    """
+    Writes each record with its own write call, as a consumer writing its own loop would
+    :param path: output path
+    :param records: list of records
+    :return: none
+    """
+    from adsingestp import serializer
+
+    with open(path, "wb", buffering=0) as fp:
+        for record in records:
+            fp.write(serializer.dumps(record) + b"\n")
+
+
+@click.command()
+@click.option("--records", "-n", "n_records", type=int, default=10000, show_default=True)
+@click.option("--output-dir", type=click.Path(exists=True, file_okay=False))
+def main(n_records, output_dir):
+    from adsingestp import serializer, writer
+    from adsingestp.parsers.base import IngestBase
+
+    formatter = IngestBase()
+    records = [
+        formatter.format(input_dict, format)
+        for parser_records in collect_metadata(STUBDATA_DIR, []).values()
+        for input_dict, format in parser_records
+    ]
+    records = [records[i % len(records)] for i in range(n_records)]
+    megabytes = sum(len(serializer.dumps(r)) + 1 for r in records) / 1e6
+
+    def report(name, seconds):
+        click.echo("%-24s %12.0f %8.1f" % (name, len(records) / seconds, megabytes / seconds))
+
+    click.echo("%-24s %12s %8s" % ("", "records/sec", "MB/sec"))
+    with tempfile.TemporaryDirectory(dir=output_dir) as directory:
+        start = time.perf_counter()
+        write_each(os.path.join(directory, "each.jsonl"), records)
+        report("write per record", time.perf_counter() - start)
+
+        for compression in writer.COMPRESSIONS:
+            if compression == "zstd" and writer.zstandard is None:
+                continue
+            path = os.path.join(directory, "records-%s.jsonl" % compression)
+            start = time.perf_counter()
+            with writer.NDJSONWriter(path, compression) as ndjson:
+                ndjson.write_many(records)
+            report("NDJSONWriter %s" % compression, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with writer.QueuedWriter(writer.NDJSONWriter(path, compression)) as queued:
+                for record in records:
+                    queued.put(record)
+            report("QueuedWriter %s" % compression, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import unittest
+
+from adsingestp import aio
+from adsingestp.ingest_exceptions import XmlLoadException
+from adsingestp.parsers.jats import JATSParser
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    Thread pool that records the largest number of documents submitted but not finished
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        future = super(CountingExecutor, self).submit(fn, *args, **kwargs)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.stubdata_dir = stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        self.inputs = []
+        for f in [
+            "jats_apj_859_2_101",
+            "jats_mnras_493_1_141",
+            "crossref_no_contrib_10.4213_im9580e",
+            "jats_aj_158_4_139",
+        ]:
+            with open(os.path.join(stubdata_dir, "input", f + ".xml"), "rb") as fp:
+                self.inputs.append(fp.read())
+
+    def titles(self, outputs):
+        return [o["title"]["textEnglish"] for o in outputs]
+
+    async def test_parse(self):
+        expected = JATSParser().parse(self.inputs[0])
+        output = await aio.parse_async("jats", self.inputs[0])
+        output["recordData"]["parsedTime"] = expected["recordData"]["parsedTime"]
+        self.assertEqual(output, expected)
+
+        async with aio.AsyncParser("process", max_workers=1, references="none") as parser:
+            output = await parser.parse("jats", self.inputs[0])
+        self.assertNotIn("references", output)
+
+        # the options are given to the parsers that take them
+        with open(os.path.join(self.stubdata_dir, "input", "ads_feedback.json"), "rb") as fp:
+            feedback = fp.read()
+        async with aio.AsyncParser(output="json", references="none") as parser:
+            output = await parser.parse("adsfeedback", feedback)
+        self.assertIsInstance(output, bytes)
+
+        with self.assertRaises(ValueError):
+            aio.AsyncParser("greenlet")
+
+    async def test_parse_stream(self):
+        jats_inputs = [self.inputs[i] for i in [0, 1, 3]]
+        expected = self.titles(JATSParser().parse(data) for data in jats_inputs)
+        executor = CountingExecutor(4)
+        parser = aio.AsyncParser(executor, max_in_flight=2)
+
+        outputs = [o async for o in parser.parse_stream("jats", jats_inputs * 3)]
+        self.assertEqual(self.titles(outputs), expected * 3)
+        self.assertEqual(executor.max_in_flight, 2)
+
+        outputs = [o async for o in parser.parse_stream("jats", jats_inputs, ordered=False)]
+        self.assertEqual(sorted(self.titles(outputs)), sorted(expected))
+
+        # async iterables of inputs
+        async def inputs():
+            for data in jats_inputs:
+                await asyncio.sleep(0)
+                yield data
+
+        outputs = [o async for o in parser.parse_stream("jats", inputs())]
+        self.assertEqual(self.titles(outputs), expected)
+
+        # errors
+        outputs = [
+            o async for o in parser.parse_stream("jats", self.inputs, return_exceptions=True)
+        ]
+        self.assertIsInstance(outputs[2], XmlLoadException)
+        self.assertEqual(self.titles(outputs[:2] + outputs[3:]), expected)
+        with self.assertRaises(XmlLoadException):
+            async for o in parser.parse_stream("jats", self.inputs):
+                pass
+
+        # the executor wasn't created by the parser, so it's left open
+        parser.close()
+        self.assertEqual(executor.submit(len, "abc").result(), 3)
+        executor.shutdown()
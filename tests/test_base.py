@@ -1,7 +1,11 @@
+import os
+import pathlib
+import tempfile
 import unittest
 
 import pytest
 
+from adsingestp import serializer
 from adsingestp.parsers import base
 
 
@@ -17,3 +21,224 @@ class TestBase(unittest.TestCase):
         record = parser._detag(data, parser.HTML_TAGS_HTML)
         record_corrected = "Kormendy J., Richstone D., 1995, ARA&amp;A, 33, 581"
         self.assertEqual(record, record_corrected)
+
+    def test_detag_tree(self):
+        parser = base.BaseBeautifulSoupParser()
+
+        # leaf elements are returned as their (escaped) text
+        d = parser.bsstrtodict("<article><year>2023</year><source>A&amp;A</source></article>")
+        self.assertEqual(parser._detag(d.find("year"), []), "2023")
+        self.assertEqual(parser._detag(d.find("source"), []), "A&amp;A")
+
+        # kept tags lose their attributes, other tags are unwrapped, <sc> is uppercased and
+        # <?index?> processing instructions are removed
+        data = (
+            '<article-title>The <italic toggle="yes">Gaia</italic> view of <sc>ASteCA</sc> '
+            'clusters<?index value="clusters"?> <xref ref-type="fn">1</xref><br/></article-title>'
+        )
+        d = parser.bsstrtodict(data)
+        self.assertEqual(
+            parser._detag(d.find("article-title"), ["italic", "br"]),
+            "The <italic>Gaia</italic> view of ASTECA clusters 1<br/>",
+        )
+
+        # <semantics> is replaced by its annotation and TeX is dropped if MathML is available
+        data = (
+            '<p xmlns:mml="http://www.w3.org/1998/Math/MathML">at <inline-formula><alternatives>'
+            "<mml:math><mml:mi>s</mml:mi></mml:math><tex-math>$s$</tex-math></alternatives>"
+            "</inline-formula> and <math><semantics><mi>m</mi><annotation>$m$</annotation>"
+            "</semantics></math></p>"
+        )
+        d = parser.bsstrtodict(data)
+        self.assertEqual(
+            parser._detag(d.find("p"), ["inline-formula", "mml:math", "mml:mi"]),
+            "at <inline-formula><mml:math><mml:mi>s</mml:mi></mml:math></inline-formula> and $m$",
+        )
+
+    def test_lxml_tag(self):
+        parser = base.BaseBeautifulSoupParser()
+        data = (
+            '<article xmlns:xlink="http://www.w3.org/1999/xlink"><contrib-group>'
+            '<contrib rid="a1"><name><surname>Smith</surname></name><xref>1</xref>, '
+            "NASA</contrib></contrib-group>"
+            '<ext-link xlink:href="https://example.org">link</ext-link></article>'
+        )
+        soup = parser.bsstrtodict(data)
+        tree = parser.lxmlstrtotree(data)
+
+        # searches and attributes match BeautifulSoup
+        self.assertEqual(tree.find("surname").get_text(), soup.find("surname").get_text())
+        self.assertEqual(tree.contrib["rid"], "a1")
+        self.assertEqual(tree.find("ext-link")["xlink:href"], "https://example.org")
+        self.assertEqual(tree.find("ext-link").attrs, soup.find("ext-link").attrs)
+        self.assertEqual(len(tree.find_all("contrib", {"rid": "a1"})), 1)
+        self.assertIsNone(tree.find("aff"))
+
+        # text on either side of a removed element stays separate, as in BeautifulSoup
+        tree.find("xref").decompose()
+        soup.find("xref").decompose()
+        self.assertEqual(
+            tree.find("contrib").get_text(separator="|"),
+            soup.find("contrib").get_text(separator="|"),
+        )
+        self.assertEqual(str(tree.find("contrib")), str(soup.find("contrib")))
+        self.assertEqual(
+            parser._detag(tree.find("contrib"), []), parser._detag(soup.find("contrib"), [])
+        )
+
+        # insertions at any position, of strings, new tags and existing children
+        for position in range(5):
+            for new in ["text", "tag", "child"]:
+                soup = parser.bsstrtodict("<a>x<b>1</b>y<c/></a>")
+                tree = parser.lxmlstrtotree("<a>x<b>1</b>y<c/></a>")
+                if new == "text":
+                    soup.a.insert(position, "new")
+                    tree.a.insert(position, "new")
+                elif new == "tag":
+                    soup.a.insert(position, parser.bsstrtodict("<d>2</d>").d)
+                    tree.a.insert(position, base.LxmlTag.fromstring("<d>2</d>").d)
+                else:
+                    soup.a.insert(position, soup.b)
+                    tree.a.insert(position, tree.b)
+                self.assertEqual(str(tree.a), str(soup.a))
+                self.assertEqual(tree.a.get_text("|"), soup.a.get_text("|"))
+                self.assertEqual(
+                    [str(c) for c in tree.a.contents], [str(c) for c in soup.a.contents]
+                )
+
+    def test_read_input(self):
+        data = '<?xml version="1.0" encoding="ISO-8859-1"?><a>caf\xe9</a>'.encode("latin-1")
+        parser = base.BaseBeautifulSoupParser()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "input.xml")
+            with open(filename, "wb") as fp:
+                fp.write(data)
+
+            with open(filename, "rb") as fp:
+                inputs = [data, bytearray(data), memoryview(data), pathlib.Path(filename), fp]
+                for source in inputs:
+                    if source is fp:
+                        fp.seek(0)
+                    self.assertEqual(parser.read_input(source), data)
+
+                    # the encoding is taken from the XML declaration
+                    if source is fp:
+                        fp.seek(0)
+                    self.assertEqual(parser.bsstrtodict(source).a.get_text(), "caf\xe9")
+                    if source is fp:
+                        fp.seek(0)
+                    self.assertEqual(parser.lxmlstrtotree(source).a.get_text(), "caf\xe9")
+
+        # BeautifulSoup only takes str or bytes, so other bytes-like objects are copied
+        self.assertIs(type(parser.read_input(memoryview(data))), bytes)
+        self.assertEqual(parser.read_input("<a/>"), "<a/>")
+        with self.assertRaises(TypeError):
+            parser.read_input(1)
+
+    def test_format(self):
+        parser = base.IngestBase()
+        input_dict = {
+            "title": "A title",
+            "subtitle": "",
+            "authors": [
+                {"surname": "Smith", "given": "", "aff": ["Univ A", ""], "affid": [["A1"], []]},
+                {"surname": "", "collab": ""},
+            ],
+            "ids": {"doi": "10.1000/1", "preprint": {"source": "", "id": ""}},
+            "issn": [("print", "1234-5678")],
+            "pubdate_print": "2023-01",
+            "funding": [{"agency": "", "grant": "123"}],
+            "references": ["<ref>1</ref>", ""],
+        }
+        output = parser.format(input_dict, format="JATS")
+
+        # empty values, and dictionaries and lists that are left empty, aren't in the output
+        self.assertEqual(output["title"], {"textEnglish": "A title"})
+        self.assertNotIn("subtitle", output)
+        self.assertEqual(
+            output["authors"],
+            [
+                {
+                    "name": {"surname": "Smith"},
+                    "affiliation": [{"affPubRaw": "Univ A", "affPubID": ["A1"]}],
+                }
+            ],
+        )
+        self.assertEqual(output["persistentIDs"], [{"DOI": "10.1000/1"}])
+        self.assertEqual(
+            output["publication"],
+            {"pubYear": "2023", "ISSN": [{"pubtype": "print", "issnString": "1234-5678"}]},
+        )
+        self.assertEqual(output["funding"], [{"grant": "123"}])
+        self.assertEqual(output["references"], ["<ref>1</ref>"])
+        self.assertNotIn("openAccess", output)
+        # references of an unsupported type are left out
+        with self.assertLogs("adsingestp.parsers.base", level="WARNING"):
+            output = parser.format({"title": "A title", "references": 1}, format="JATS")
+        self.assertNotIn("references", output)
+
+        # except for the record data
+        self.assertEqual(output["recordData"]["createdTime"], "")
+        self.assertEqual(list(parser.format({}, format="HTML")), ["recordData"])
+        self.assertEqual(parser.format({}, format="HTML")["recordData"]["loadType"], "fromURL")
+
+    def test_clean_empty(self):
+        parser = base.IngestBase()
+        input_dict = {
+            "title": "A title",
+            "keywords": ["a", "b"],
+            "authors": [{"surname": "Smith", "given": ""}, {"collab": ""}],
+            "createdTime": "",
+        }
+        expected = {
+            "title": "A title",
+            "keywords": ["a", "b"],
+            "authors": [{"surname": "Smith"}],
+            "createdTime": "",
+        }
+
+        # the input isn't changed, and parts without empty values aren't copied
+        output = parser._clean_empty(input_dict)
+        self.assertEqual(output, expected)
+        self.assertEqual(input_dict["authors"][0]["given"], "")
+        self.assertIs(output["keywords"], input_dict["keywords"])
+        clean = {"a": [{"b": "c"}]}
+        self.assertIs(parser._clean_empty(clean), clean)
+
+        # in place
+        authors = input_dict["authors"]
+        output = parser._clean_empty(input_dict, in_place=True)
+        self.assertIs(output, input_dict)
+        self.assertEqual(input_dict, expected)
+        self.assertIs(input_dict["authors"], authors)
+
+        # deeper than the recursion limit
+        nested = "x"
+        for i in range(5000):
+            nested = [{"a": nested, "b": ""}]
+        output = parser._clean_empty(nested)
+        for i in range(5000):
+            output = output[0]["a"]
+        self.assertEqual(output, "x")
+
+    def test_format_json(self):
+        input_dict = {"title": "A title", "authors": [{"surname": "Smîth"}]}
+        record = base.IngestBase().format(input_dict, format="JATS")
+
+        parser = base.IngestBase(output="json")
+        output = parser.format(input_dict, format="JATS")
+        self.assertIsInstance(output, bytes)
+        self.assertIn("Smîth".encode("utf-8"), output)
+        output = serializer.loads(output)
+        self.assertEqual(output["recordData"]["loadFormat"], "JATS")
+        del output["recordData"]["parsedTime"], record["recordData"]["parsedTime"]
+        self.assertEqual(output, record)
+
+        self.assertIsInstance(parser.format(input_dict, format="JATS", output="dict"), dict)
+        self.assertEqual(
+            serializer.loads(serializer.dumps({"references": base.LazyReferences(["a"], str)})),
+            {"references": ["a"]},
+        )
+        with self.assertRaises(ValueError):
+            base.IngestBase(output="xml")
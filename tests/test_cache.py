@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from click.testing import CliRunner
+
+from adsingestp import cache, cli
+from adsingestp.parsers.crossref import CrossrefParser
+from adsingestp.parsers.jats import JATSParser
+
+
+def _put_results(args):
+    """
+    Writes results to a cache from a worker process
+    :param args: (path of the cache database, worker number)
+    :return: number of results found in the cache
+    """
+    path, worker = args
+    result_cache = cache.ResultCache(path, max_bytes=50000)
+    found = 0
+    for i in range(100):
+        key = result_cache.key(JATSParser(), "input %d" % i)
+        if result_cache.get(key) is not None:
+            found += 1
+        result_cache.put(key, b'{"worker":%d,"padding":"%s"}' % (worker, b"x" * 1000))
+    result_cache.close()
+    return found
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        self.inputdir = os.path.join(stubdata_dir, "input")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "results.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key(self):
+        result_cache = cache.ResultCache(self.path)
+        key = result_cache.key(JATSParser(), b"<article/>")
+        self.assertEqual(key, result_cache.key(JATSParser(), "<article/>"))
+        # options that don't change the output don't change the key
+        self.assertEqual(key, result_cache.key(JATSParser(backend="lxml"), b"<article/>"))
+        self.assertNotEqual(key, result_cache.key(JATSParser(references="none"), b"<article/>"))
+        self.assertNotEqual(key, result_cache.key(CrossrefParser(), b"<article/>"))
+        self.assertNotEqual(key, result_cache.key(JATSParser(), b"<article />"))
+
+    def test_parse(self):
+        with open(os.path.join(self.inputdir, "jats_apj_859_2_101.xml"), "rb") as fp:
+            data = fp.read()
+        parses = []
+
+        class CountingParser(JATSParser):
+            def parse(self, text, bsparser="lxml-xml"):
+                parses.append(text)
+                return super(CountingParser, self).parse(text, bsparser)
+
+        result_cache = cache.ResultCache(self.path)
+        output = result_cache.parse(CountingParser(), data)
+        self.assertEqual(result_cache.parse(CountingParser(), data), output)
+        self.assertEqual(len(parses), 1)
+        self.assertEqual((result_cache.hits, result_cache.misses), (1, 1))
+
+        # JSON output is returned as it was stored
+        json_output = result_cache.parse(CountingParser(output="json"), data)
+        self.assertIsInstance(json_output, bytes)
+        self.assertEqual(result_cache.parse(CountingParser(output="json"), data), json_output)
+        self.assertEqual(len(parses), 2)
+
+        # parsers created with references="offsets" set reference_spans, so they always parse
+        parser = CountingParser(references="offsets")
+        for i in range(2):
+            self.assertEqual(result_cache.parse(parser, data)["title"], output["title"])
+        self.assertEqual(len(parses), 4)
+        self.assertTrue(parser.reference_spans)
+
+        # the counters are kept in the database, for all processes
+        result_cache.close()
+        result_cache = cache.ResultCache(self.path)
+        stats = result_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["results"]), (2, 2, 2))
+        result_cache.clear()
+        self.assertEqual(len(result_cache), 0)
+        self.assertEqual(result_cache.stats()["bytes"], 0)
+
+    def test_eviction(self):
+        result_cache = cache.ResultCache(self.path, max_bytes=2500)
+        keys = [bytes([i]) * 32 for i in range(5)]
+        for key in keys[:3]:
+            result_cache.put(key, b"x" * 1000)
+        # the least recently used result is removed
+        self.assertIsNone(result_cache.get(keys[0]))
+        self.assertIsNotNone(result_cache.get(keys[1]))
+        result_cache.put(keys[3], b"x" * 1000)
+        self.assertIsNone(result_cache.get(keys[2]))
+        self.assertIsNotNone(result_cache.get(keys[1]))
+
+        stats = result_cache.stats()
+        self.assertEqual((stats["results"], stats["bytes"], stats["evictions"]), (2, 2000, 2))
+
+        # lookups only read the database, and don't wait for another process that's writing:
+        # their updates are kept, and written with the next update
+        other = cache.ResultCache(self.path)
+        other.connection.execute("BEGIN IMMEDIATE")
+        changes = result_cache.connection.total_changes
+        self.assertIsNotNone(result_cache.get(keys[1]))
+        self.assertIsNone(result_cache.get(keys[0]))
+        self.assertEqual(result_cache.connection.total_changes, changes)
+        self.assertFalse(result_cache.connection.in_transaction)
+        with mock.patch.object(cache, "FLUSH_LOOKUPS", 3):
+            self.assertIsNotNone(result_cache.get(keys[1]))
+        self.assertEqual((other._counter("hits"), other._counter("misses")), (2, 2))
+        other.connection.rollback()
+        with mock.patch.object(cache, "FLUSH_LOOKUPS", 4):
+            self.assertIsNone(result_cache.get(keys[0]))
+        self.assertEqual((other._counter("hits"), other._counter("misses")), (4, 4))
+        other.close()
+        self.assertEqual((result_cache.stats()["hits"], result_cache.stats()["misses"]), (4, 4))
+
+        # replacing a result updates the size
+        result_cache.put(keys[1], b"x" * 10)
+        self.assertEqual(result_cache.stats()["bytes"], 1010)
+
+    def test_concurrent_workers(self):
+        with multiprocessing.Pool(4) as pool:
+            pool.map(_put_results, [(self.path, w) for w in range(4)])
+        result_cache = cache.ResultCache(self.path)
+        stats = result_cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 400)
+        self.assertLessEqual(stats["bytes"], 50000)
+        self.assertEqual(
+            stats["bytes"],
+            result_cache.connection.execute("SELECT SUM(size) FROM results").fetchone()[0],
+        )
+
+    def test_ingest_cli(self):
+        filenames = [
+            os.path.join(self.inputdir, f + ".xml")
+            for f in ["jats_apj_859_2_101", "jats_mnras_493_1_141"]
+        ]
+        runner = CliRunner()
+        args = ["ingest", "-f", "jats", "-w", "1", "--cache", self.path] + filenames
+        first = runner.invoke(cli.cli, args)
+        second = runner.invoke(cli.cli, args)
+        self.assertEqual(first.exit_code, 0)
+        # the second run returns the cached output, including its parsedTime
+        self.assertEqual(second.output, first.output)
+        stats = cache.ResultCache(self.path).stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+        # worker processes write their pending updates when they exit
+        args = ["ingest", "-f", "jats", "-w", "2", "--cache", self.path] + filenames
+        self.assertEqual(runner.invoke(cli.cli, args).output, first.output)
+        stats = cache.ResultCache(self.path).stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 2))
@@ -0,0 +1,62 @@
+import json
+import os
+import unittest
+
+from click.testing import CliRunner
+
+from adsingestp import cli
+from adsingestp.parsers import jats
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        self.inputdir = os.path.join(stubdata_dir, "input")
+
+    def test_ingest(self):
+        filenames = [
+            os.path.join(self.inputdir, f + ".xml")
+            for f in [
+                "jats_apj_859_2_101",
+                "jats_mnras_493_1_141",
+                "crossref_no_contrib_10.4213_im9580e",
+                "jats_aj_158_4_139",
+            ]
+        ]
+        runner = CliRunner()
+
+        for workers in ["1", "2"]:
+            result = runner.invoke(
+                cli.cli,
+                ["ingest", "--format", "jats", "--workers", workers, "--chunksize", "1"]
+                + filenames,
+            )
+            self.assertEqual(result.exit_code, 0)
+            output = [json.loads(line) for line in result.output.splitlines()]
+
+            # one line per file, in input order
+            self.assertEqual([o["file"] for o in output], filenames)
+
+            # a file in the wrong format gives an error record, without stopping the batch
+            self.assertEqual(output[2]["error"]["type"], "XmlLoadException")
+            for i in [0, 1, 3]:
+                with open(filenames[i], "rb") as fp:
+                    parsed = jats.JATSParser().parse(fp.read())
+                parsed["recordData"]["parsedTime"] = output[i]["record"]["recordData"][
+                    "parsedTime"
+                ]
+                self.assertEqual(output[i]["record"], parsed)
+
+        result = runner.invoke(
+            cli.cli, ["ingest", "-f", "jats", "-w", "2", "--unordered"] + filenames
+        )
+        output = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(sorted(o["file"] for o in output), sorted(filenames))
+
+    def test_find_files(self):
+        filenames = cli._find_files([os.path.join(self.inputdir, "jats_apj_*.xml")])
+        self.assertIn(os.path.join(self.inputdir, "jats_apj_859_2_101.xml"), filenames)
+        self.assertTrue(all(os.path.basename(f).startswith("jats_apj_") for f in filenames))
+
+        filenames = cli._find_files([self.inputdir])
+        self.assertEqual(len(filenames), len(os.listdir(self.inputdir)))
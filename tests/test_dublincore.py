@@ -1,6 +1,8 @@
 import datetime
+import io
 import json
 import os
+import pathlib
 import unittest
 
 from adsingestschema import ads_schema_validator
@@ -93,3 +95,61 @@ class TextDublinCoreMulti(unittest.TestCase):
             parsed = parser.parse(input_data, header=False)
 
             self.assertEqual(parsed, output_data_noheader)
+
+            # the input can also be given as bytes or a path
+            self.assertEqual(parser.parse(input_data.encode("utf-8")), output_data_noheader)
+            self.assertEqual(
+                parser.parse(pathlib.Path(test_infile), header=True), output_data_header
+            )
+
+    def test_dubcore_multi_stream(self):
+        filenames = [
+            "arxiv_multi_20230125",
+        ]
+
+        parser = dubcore.MultiDublinCoreParser()
+
+        for f in filenames:
+            test_infile = os.path.join(self.inputdir, f + ".xml")
+            test_outfile_header = os.path.join(self.outputdir, f + "_header.txt")
+            test_outfile_noheader = os.path.join(self.outputdir, f + "_noheader.txt")
+
+            with open(test_outfile_header, "r") as fp:
+                output_data_header = fp.read().strip().split("\n\n")
+
+            with open(test_outfile_noheader, "r") as fp:
+                output_data_noheader = fp.read().strip().split("\n\n")
+
+            # streaming gives the same records as parse, whatever the read size
+            parsed = list(parser.iter_records(test_infile, header=True))
+            self.assertEqual(parsed, output_data_header)
+
+            with open(test_infile, "rb") as fp:
+                parsed = list(
+                    parser.iter_chunks(fp, parser.start_re, parser.end_re, blocksize=100)
+                )
+            self.assertEqual([p.strip() for p in parsed], output_data_noheader)
+
+            parsed = list(parser.iter_records(test_infile, parsed=True))
+            self.assertEqual(len(parsed), len(output_data_noheader))
+            for p, record in zip(parsed, output_data_noheader):
+                expected = dubcore.DublinCoreParser().parse(record)
+                p["recordData"]["parsedTime"] = expected["recordData"]["parsedTime"] = ""
+                self.assertEqual(p, expected)
+
+    def test_dubcore_multi_truncated(self):
+        parser = dubcore.MultiDublinCoreParser()
+        with open(os.path.join(self.inputdir, "arxiv_multi_20230125.xml"), "r") as fp:
+            input_data = fp.read()
+        with open(os.path.join(self.outputdir, "arxiv_multi_20230125_noheader.txt"), "r") as fp:
+            output_data = fp.read().strip().split("\n\n")
+
+        # the input ends in the middle of the last record, which is skipped
+        truncated = input_data[: input_data.rindex("</record>") - 100]
+        with self.assertLogs("adsingestp.parsers.base", level="WARNING"):
+            self.assertEqual(parser.parse(truncated), output_data[:-1])
+        with self.assertLogs("adsingestp.parsers.base", level="WARNING"):
+            self.assertEqual(parser.parse(truncated.encode("utf-8")), output_data[:-1])
+        with self.assertLogs("adsingestp.parsers.base", level="WARNING"):
+            records = list(parser.iter_records(io.BytesIO(truncated.encode("utf-8"))))
+        self.assertEqual(records, output_data[:-1])
@@ -5,6 +5,7 @@ import unittest
 
 from adsingestschema import ads_schema_validator
 
+from adsingestp.ingest_exceptions import XmlLoadException
 from adsingestp.parsers import elsevier
 
 TIMESTAMP_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
@@ -72,3 +73,19 @@ class TestElsevier(unittest.TestCase):
             parsed["recordData"]["parsedTime"] = ""
 
             self.assertEqual(parsed, output_data)
+
+    def test_tree_builder(self):
+        data = (
+            '<ce:para xmlns:ce="http://www.elsevier.com/xml/common/schema">'
+            "H<ce:inf>2</ce:inf>O <ce:italic>in situ</ce:italic></ce:para>"
+        )
+        parser = elsevier.ElsevierParser()
+
+        # formatting tags are renamed while parsing
+        d = parser.bsstrtodict(data, parser=elsevier.ElsevierTreeBuilder)
+        self.assertEqual(str(d.p.sub), "<sub>2</sub>")
+        self.assertEqual(d.p.i.get_text(), "in situ")
+
+        # malformed documents aren't recovered from
+        with self.assertRaises(XmlLoadException):
+            parser.parse(data[:-5])
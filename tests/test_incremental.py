@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from adsingestp import cli, incremental
+from adsingestp.parsers.jats import JATSParser
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        self.inputdir = os.path.join(stubdata_dir, "input")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filenames = []
+        for f in ["jats_apj_859_2_101", "jats_mnras_493_1_141", "jats_aj_158_4_139"]:
+            self.filenames.append(os.path.join(self.tmpdir.name, f + ".xml"))
+            shutil.copy(os.path.join(self.inputdir, f + ".xml"), self.filenames[-1])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_output_hash(self):
+        record = {"recordData": {"parsedTime": "2024-01-01"}, "title": {"textEnglish": "A"}}
+        later = {"recordData": {"parsedTime": "2024-02-01"}, "title": {"textEnglish": "A"}}
+        self.assertEqual(incremental.output_hash(record), incremental.output_hash(later))
+        later["title"]["textEnglish"] = "B"
+        self.assertNotEqual(incremental.output_hash(record), incremental.output_hash(later))
+        self.assertEqual(record["recordData"]["parsedTime"], "2024-01-01")
+
+    def test_manifest(self):
+        path = os.path.join(self.tmpdir.name, "manifest.jsonl")
+        parser = JATSParser()
+        fingerprint = incremental.parser_fingerprint(parser)
+        self.assertEqual(fingerprint, incremental.parser_fingerprint(JATSParser()))
+        self.assertNotEqual(
+            fingerprint, incremental.parser_fingerprint(JATSParser(references="none"))
+        )
+
+        manifest = incremental.Manifest(path)
+        filename = self.filenames[0]
+        self.assertEqual(manifest.check(filename, fingerprint), incremental.NEW)
+        with open(filename, "rb") as fp:
+            output = parser.parse(fp.read())
+        self.assertTrue(manifest.update(filename, parser, fingerprint, output))
+        manifest.save()
+
+        manifest = incremental.Manifest(path)
+        self.assertEqual(
+            manifest.entries[filename]["parser"], "adsingestp.parsers.jats.JATSParser"
+        )
+        self.assertIsNone(manifest.check(filename, fingerprint))
+        self.assertEqual(manifest.check(filename, "other"), incremental.PARSER_CHANGED)
+        # the same output, parsed again
+        with open(filename, "rb") as fp:
+            self.assertFalse(
+                manifest.update(filename, parser, fingerprint, parser.parse(fp.read()))
+            )
+
+        # a file that was touched but not changed isn't processed
+        os.utime(filename, ns=(0, 0))
+        self.assertIsNone(manifest.check(filename, fingerprint))
+        with open(filename, "ab") as fp:
+            fp.write(b"\n")
+        self.assertEqual(manifest.check(filename, fingerprint), incremental.CHANGED)
+
+    def test_changed_while_parsed(self):
+        path = os.path.join(self.tmpdir.name, "manifest.jsonl")
+        parser = JATSParser()
+        fingerprint = incremental.parser_fingerprint(parser)
+        manifest = incremental.Manifest(path)
+        filename = self.filenames[0]
+        self.assertEqual(manifest.check(filename, fingerprint), incremental.NEW)
+
+        cli._init_worker("jats", hash_inputs=True)
+        result = cli._parse_file(filename)
+        with open(filename, "rb") as fp:
+            self.assertEqual(result["input"]["hash"], incremental.data_hash(fp.read()))
+        self.assertEqual(result["input"]["hash"], incremental.file_hash(filename))
+        # the file changes after it was read, but before the manifest is updated
+        with open(filename, "ab") as fp:
+            fp.write(b"\n")
+        manifest.update(filename, parser, fingerprint, result["record"], None, result["input"])
+        self.assertEqual(manifest.check(filename, fingerprint), incremental.CHANGED)
+
+        cli._init_worker("jats")
+        self.assertNotIn("input", cli._parse_file(filename))
+
+    def test_shards(self):
+        path = os.path.join(self.tmpdir.name, "manifest-{shard}.jsonl")
+        filenames = ["file%d.xml" % i for i in range(100)]
+        shards = [incremental.Manifest(path, shard, 3).select(filenames) for shard in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(filenames))
+        self.assertTrue(all(shards))
+
+        with self.assertRaises(ValueError):
+            incremental.Manifest(os.path.join(self.tmpdir.name, "manifest.jsonl"), 0, 3)
+        with self.assertRaises(ValueError):
+            incremental.Manifest(path, 3, 3)
+
+    def test_reprocess_cli(self):
+        runner = CliRunner()
+        state = os.path.join(self.tmpdir.name, "manifest-{shard:02d}.jsonl")
+
+        def reprocess(*args):
+            result = runner.invoke(
+                cli.cli,
+                ["reprocess", "-f", "jats", "-w", "1", "-s", state, "--shards", "2"]
+                + list(args)
+                + self.filenames,
+            )
+            self.assertEqual(result.exit_code, 0)
+            return [json.loads(line)["file"] for line in result.output.splitlines()]
+
+        # the two shards process all the files between them, once
+        processed = reprocess("--shard", "0") + reprocess("--shard", "1")
+        self.assertEqual(sorted(processed), sorted(self.filenames))
+        self.assertEqual(reprocess("--shard", "0") + reprocess("--shard", "1"), [])
+
+        # after resharding, the files processed by the other shards aren't processed again
+        result = runner.invoke(
+            cli.cli,
+            ["reprocess", "-f", "jats", "-w", "1", "-s", state] + self.filenames,
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "")
+
+        # only the changed file is processed; its output hasn't changed
+        with open(self.filenames[1], "ab") as fp:
+            fp.write(b"\n")
+        processed = reprocess("--shard", "0", "--changed-only") + reprocess(
+            "--shard", "1", "--changed-only"
+        )
+        self.assertEqual(processed, [])
+        self.assertEqual(reprocess("--shard", "0") + reprocess("--shard", "1"), [])
@@ -2,11 +2,13 @@ import datetime
 import json
 import os
 import unittest
+from unittest import mock
 
 import pytest
 from adsingestschema import ads_schema_validator
 
-from adsingestp.parsers import jats
+from adsingestp import resolver
+from adsingestp.parsers import base, jats
 
 TIMESTAMP_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
@@ -185,6 +187,39 @@ class TestJATS(unittest.TestCase):
 
             self.assertEqual(parsed, output_data)
 
+    def test_jats_lxml_backend(self):
+        # the lxml backend should give the same output as the default BeautifulSoup backend
+        filenames = [
+            "jats_apj_859_2_101",
+            "jats_springer_EPJC_s10052-023-11699-1",
+            "jats_springer_Article_collab_nlm",
+            "jats_a+a_nested_collab",
+            "jats_sci_fix_collab_duplication",
+            "jats_iop_blank_affil_removed",
+            "jats_aip_key_headings",
+            "jats_springer_SoPh_s11207-023-02231-5_mathtex",
+            "mdpi_climate-11-00147",
+        ]
+        for f in filenames:
+            test_infile = os.path.join(self.inputdir, f + ".xml")
+            test_outfile = os.path.join(self.outputdir, f + ".json")
+            parser = jats.JATSParser(backend="lxml")
+
+            with open(test_infile, "rb") as fp:
+                input_data = fp.read()
+
+            parsed = parser.parse(input_data)
+
+            with open(test_outfile, "rb") as fp:
+                output_text = fp.read()
+                output_data = json.loads(output_text)
+
+            parsed["recordData"]["parsedTime"] = ""
+            self.assertEqual(parsed, output_data)
+
+        with self.assertRaises(ValueError):
+            jats.JATSParser(backend="html")
+
     def test_jats_cite_context(self):
         filenames = [
             "jats_aj_158_4_139_fulltext",
@@ -228,3 +263,156 @@ class TestJATS(unittest.TestCase):
                 output_data_tags = json.loads(output_text)
             cite_context = parser.citation_context(input_data, text_output=False)
             self.assertEqual(cite_context, output_data_tags)
+
+            # the same contexts, one per citation, in the order they're cited
+            cites = list(parser.iter_citation_context(input_data))
+            self.assertEqual(
+                [c for rid, c in cites if rid == "ajab3643bib21"],
+                output_data["unresolved"]["ajab3643bib21"],
+            )
+            self.assertEqual(sum(len(c) for c in output_data["unresolved"].values()), len(cites))
+
+            # references without a bibcode ext-link are looked up in the resolver
+            input_data = input_data.replace(b'ext-link-type="bibcode"', b'ext-link-type="ads"')
+            refs = jats.JATSParser().parse(input_data)["references"]
+            index = resolver.ReferenceIndex()
+            index.add_results(
+                ["1.0 2011Icar..213..564F %s" % r for r in refs if 'id="ajab3643bib21"' in r]
+            )
+            cite_context_index = parser.citation_context(
+                input_data, resolve_refs=True, resolver=index
+            )
+            self.assertEqual(
+                cite_context_index["resolved"],
+                {"2011Icar..213..564F": output_data["unresolved"]["ajab3643bib21"]},
+            )
+            self.assertEqual(list(cite_context_index["unresolved"]), ["ajab3643bib22"])
+
+    def test_author_list(self):
+        authors = jats._AuthorList()
+        authors.append({"surname": "Smith", "aff": ["Univ A"], "rid": "A1"})
+        authors.append({"surname": "", "collab": "ATLAS", "aff": [], "rid": None})
+        authors.append({"surname": "Jones", "aff": ["Univ B"], "rid": "A2"})
+
+        self.assertIn({"collab": "ATLAS", "surname": "", "aff": [], "rid": None}, authors)
+        self.assertNotIn({"surname": "Smith", "aff": ["Univ B"], "rid": "A1"}, authors)
+        self.assertEqual(authors.find_rid("A2"), (2, authors[2]))
+        self.assertIsNone(authors.find_rid("A3"))
+
+        # replacing an author updates the index
+        author = authors[0]
+        author["collab"] = "ATLAS"
+        authors[0] = author
+        self.assertIn(
+            {"surname": "Smith", "aff": ["Univ A"], "rid": "A1", "collab": "ATLAS"}, authors
+        )
+        self.assertNotIn({"surname": "Smith", "aff": ["Univ A"], "rid": "A1"}, authors)
+        self.assertEqual(list(authors), [author, authors[1], authors[2]])
+        self.assertEqual(len(authors), 3)
+        with self.assertRaises(TypeError):
+            authors[0:1] = [author]
+        # authors can't be inserted or removed, which would leave the index stale
+        self.assertFalse(hasattr(authors, "insert") or hasattr(authors, "pop"))
+
+    def test_extract_all(self):
+        data = "<a><b>1</b>x<c>2</c>y<b>3</b><c>4</c></a>"
+        parser = base.BaseBeautifulSoupParser()
+        expected = parser.bsstrtodict(data)
+        for c in expected.find_all("c"):
+            c.extract()
+        # with the private Tag.extract argument, if this version of BeautifulSoup has it, and
+        # without it
+        for self_index in sorted({jats._EXTRACT_SELF_INDEX, False}):
+            with mock.patch.object(jats, "_EXTRACT_SELF_INDEX", self_index):
+                soup = parser.bsstrtodict(data)
+                extracted = jats._extract_all(soup.find_all("c"))
+                self.assertEqual(str(soup), str(expected))
+                self.assertEqual([c.get_text() for c in extracted], ["2", "4"])
+                self.assertTrue(all(c.parent is None for c in extracted))
+
+    def test_fix_affil(self):
+        affils = jats.JATSAffils()
+        affstring = " , Dept. of Physics,, Univ. A (Country ;  x@y.org ; , "
+        expected = ("Dept. of Physics, Univ. A Country", ["x@y.org"])
+        self.assertEqual(affils._fix_affil(affstring), expected)
+
+        # cached results can be changed by the caller without changing the cache
+        (affstr, emails) = affils._fix_affil(affstring)
+        emails.append("z@y.org")
+        self.assertEqual(affils._fix_affil(affstring), expected)
+
+    def test_jats_reuse(self):
+        filenames = [
+            "jats_nature_41467_2023_Article_40261_nlm",
+            "jats_apj_859_2_101",
+            "jats_mnras_493_1_141",
+        ]
+        for backend in jats.JATSParser.BACKENDS:
+            parser = jats.JATSParser(backend=backend)
+            for f in filenames:
+                with open(os.path.join(self.inputdir, f + ".xml"), "rb") as fp:
+                    input_data = fp.read()
+
+                # a reused parser doesn't keep anything from the previous document, e.g. that
+                # it was an erratum
+                parsed = parser.parse(input_data)
+                parsed_new = jats.JATSParser(backend=backend).parse(input_data)
+                parsed["recordData"]["parsedTime"] = parsed_new["recordData"]["parsedTime"]
+                self.assertEqual(parsed, parsed_new)
+
+    def test_jats_reference_modes(self):
+        with open(os.path.join(self.inputdir, "jats_apj_859_2_101.xml"), "rb") as fp:
+            input_data = fp.read()
+
+        parsed = jats.JATSParser().parse(input_data)
+        references = parsed["references"]
+
+        for backend in jats.JATSParser.BACKENDS:
+            parsed_lazy = jats.JATSParser(backend=backend, references="lazy").parse(input_data)
+            self.assertIsInstance(parsed_lazy["references"], base.LazyReferences)
+            self.assertEqual(len(parsed_lazy["references"]), len(references))
+            self.assertEqual(parsed_lazy["references"][-1], references[-1])
+            self.assertEqual(list(parsed_lazy["references"]), references)
+
+            parsed_none = jats.JATSParser(backend=backend, references="none").parse(input_data)
+            self.assertNotIn("references", parsed_none)
+            parsed_none["references"] = references
+            parsed_none["recordData"]["parsedTime"] = parsed["recordData"]["parsedTime"]
+            self.assertEqual(parsed_none, parsed)
+
+        # the offsets are kept out of the record, which stays schema-valid
+        parser = jats.JATSParser(references="offsets")
+        parsed_offsets = parser.parse(input_data)
+        self.assertNotIn("references", parsed_offsets)
+        ads_schema_validator().validate(parsed_offsets)
+        self.assertEqual(len(parser.reference_spans), len(references))
+        for start, end in parser.reference_spans:
+            self.assertTrue(input_data[start:end].startswith(b"<ref "))
+            self.assertTrue(input_data[start:end].endswith(b"</ref>"))
+
+        with self.assertRaises(ValueError):
+            jats.JATSParser(references="html")
+
+    def test_jats_front_only(self):
+        with open(os.path.join(self.inputdir, "jats_springer_badmarkup_1.xml"), "rb") as fp:
+            input_data = fp.read()
+
+        parsed = jats.JATSParser().parse(input_data)
+        for backend in jats.JATSParser.BACKENDS:
+            parsed_front = jats.JATSParser(backend=backend, fulltext=False).parse(input_data)
+            parsed_front["recordData"]["parsedTime"] = parsed["recordData"]["parsedTime"]
+            self.assertEqual(parsed_front, parsed)
+
+        # the body and the back matter but the reference list aren't in the tree
+        parser = jats.JATSParser()
+        d = parser.bsstrtodict(input_data, parser=jats.JATSFrontTreeBuilder())
+        self.assertIsNotNone(d.article.front)
+        self.assertIsNone(d.article.body)
+        self.assertEqual([c.name for c in d.article.back.find_all(recursive=False)], ["ref-list"])
+
+        d = parser.bsstrtodict(input_data, parser=jats.JATSFrontTreeBuilder(references=False))
+        self.assertIsNone(d.article.back)
+
+        d = parser.lxmlstrtotree(input_data, prune=jats._prune_etree)
+        self.assertIsNone(d.article.body)
+        self.assertIsNotNone(d.article.back.find("ref-list"))
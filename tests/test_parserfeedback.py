@@ -45,3 +45,30 @@ class TestFeedback(unittest.TestCase):
 
                 self.assertEqual(test_data.get("bibcode", ""), output_bibcode)
                 self.assertEqual(test_data.get("affiliations", ""), output_affil)
+
+    def test_parser_reuse(self):
+        inputs = []
+        for file in ["ads_feedback.json", "ads_feedback_escape.json"]:
+            with open(os.path.join(self.inputdir, file)) as fp:
+                inputs.append(fp.read())
+
+        # one instance parses each document it's given, rather than the first one again
+        parser = adsfeedback.ADSFeedbackParser()
+        outputs = [parser.parse(data) for data in inputs + inputs]
+        for data, output in zip(inputs + inputs, outputs):
+            self.assertEqual(output, adsfeedback.ADSFeedbackParser(data).parse())
+        self.assertNotEqual(outputs[0].get("title"), outputs[1].get("title"))
+
+        # without an argument, the document given to the constructor (or last parsed) is used
+        self.assertEqual(parser.parse()["title"], outputs[1]["title"])
+
+        # an empty string is parsed, and isn't valid JSON, rather than returning the previous record
+        with self.assertRaises(ValueError):
+            parser.parse("")
+
+    def test_json_output(self):
+        with open(os.path.join(self.inputdir, "ads_feedback.json")) as fp:
+            data = fp.read()
+        output = adsfeedback.ADSFeedbackParser(output="json").parse(data)
+        self.assertIsInstance(output, bytes)
+        self.assertEqual(json.loads(output), adsfeedback.ADSFeedbackParser().parse(data))
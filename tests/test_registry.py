@@ -0,0 +1,117 @@
+import os
+import unittest
+
+from click.testing import CliRunner
+
+from adsingestp import cli, registry, serializer
+from adsingestp.ingest_exceptions import WrongFormatException
+from adsingestp.parsers.crossref import CrossrefParser
+from adsingestp.parsers.jats import JATSParser
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        self.inputdir = os.path.join(stubdata_dir, "input")
+
+    def test_sniff_files(self):
+        # file name prefix: input format
+        prefixes = [
+            ("jats_", "jats"),
+            ("nlm_", "jats"),
+            ("mdpi_", "jats"),
+            ("ieee_jats_", "jats"),
+            ("crossref_", "crossref"),
+            ("datacite", "datacite"),
+            ("zenodo_", "datacite"),
+            ("els_", "elsevier"),
+            ("wiley_", "wiley"),
+            ("copernicus_", "copernicus"),
+            ("dubcore_", "dubcore"),
+            ("arxiv_", "dubcore"),
+            ("ads_feedback", "adsfeedback"),
+            # IEEE's own format, which there is no parser for
+            ("ieee_example_", None),
+        ]
+        for f in sorted(os.listdir(self.inputdir)):
+            expected = [p for prefix, p in prefixes if f.startswith(prefix)]
+            self.assertEqual(len(expected), 1, f)
+            with self.subTest(f):
+                self.assertEqual(registry.sniff_file(os.path.join(self.inputdir, f)), expected[0])
+
+    def test_sniff(self):
+        self.assertEqual(registry.sniff("\ufeff<article/>"), "jats")
+        self.assertEqual(registry.sniff(b"\xef\xbb\xbf  [{}]"), "adsfeedback")
+        self.assertEqual(registry.sniff("<article/>".encode("utf-16")), "jats")
+        self.assertEqual(registry.sniff("<conf-article>"), "jats")
+        self.assertEqual(
+            registry.sniff(
+                b'<?xml version="1.0"?>\n<!-- comment -->\n'
+                b'<!DOCTYPE article SYSTEM "copernicus.dtd" [<!ENTITY x "<y>">]>\n'
+                b"<!-- comment -->\n<article>"
+            ),
+            "copernicus",
+        )
+        self.assertEqual(
+            registry.sniff(
+                b'<ja:article xmlns:ja="http://www.elsevier.com/xml/ja/dtd" version="5.6">'
+            ),
+            "elsevier",
+        )
+        self.assertEqual(
+            registry.sniff(
+                b"<record><header/><metadata><!-- dc -->"
+                b'<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/">'
+            ),
+            "dubcore",
+        )
+        for data in [b"", b"plain text", b"<html>", b"<record><header/></record>"]:
+            self.assertIsNone(registry.sniff(data))
+        # only the head of the input is read
+        self.assertIsNone(registry.sniff(b" " * registry.SNIFF_BYTES + b"<article/>"))
+
+    def test_dispatcher(self):
+        with open(os.path.join(self.inputdir, "jats_apj_859_2_101.xml"), "rb") as fp:
+            jats = fp.read()
+        with open(
+            os.path.join(self.inputdir, "crossref_no_contrib_10.4213_im9580e.xml"), "rb"
+        ) as fp:
+            crossref = fp.read()
+
+        dispatcher = registry.Dispatcher(references="none", output="json")
+        self.assertIsInstance(dispatcher.parser_for(jats), JATSParser)
+        self.assertIsInstance(dispatcher.parser_for(crossref), CrossrefParser)
+        self.assertIs(dispatcher.parser_for(jats), dispatcher.parser_for(jats))
+
+        output = serializer.loads(dispatcher.parse(crossref))
+        expected = CrossrefParser().parse(crossref)
+        self.assertEqual(output["title"], expected["title"])
+        self.assertNotIn("references", serializer.loads(dispatcher.parse(jats)))
+        # every format gets the output option; options a parser doesn't take are logged
+        with open(os.path.join(self.inputdir, "ads_feedback.json"), "rb") as fp:
+            with self.assertLogs("adsingestp.registry", level="WARNING") as logs:
+                output = dispatcher.parse(fp)
+        self.assertIn("references", logs.output[0])
+        self.assertEqual(serializer.loads(output)["bibcode"], "2525ApJ..9999.9999T")
+
+        with self.assertRaises(WrongFormatException):
+            dispatcher.parse(b"<html><body/></html>")
+
+    def test_ingest_cli(self):
+        filenames = [
+            os.path.join(self.inputdir, f)
+            for f in [
+                "jats_apj_859_2_101.xml",
+                "crossref_no_contrib_10.4213_im9580e.xml",
+                "ieee_example_1.xml",
+            ]
+        ]
+        runner = CliRunner()
+        result = runner.invoke(cli.cli, ["ingest", "-f", "auto", "-w", "1"] + filenames)
+        self.assertEqual(result.exit_code, 0)
+        outputs = [serializer.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([o["file"] for o in outputs], filenames)
+        with open(filenames[0], "rb") as fp:
+            self.assertEqual(outputs[0]["record"]["title"], JATSParser().parse(fp)["title"])
+        self.assertIn("record", outputs[1])
+        self.assertEqual(outputs[2]["error"]["type"], "WrongFormatException")
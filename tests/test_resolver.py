@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from adsingestp import cli, resolver
+
+REF_1 = '<ref id="bib1"><mixed-citation>Foo, A. 2011, Icarus, 213, 564</mixed-citation></ref>'
+REF_2 = '<ref id="bib2"><mixed-citation>Bar, B. 2017, Icarus, 286, 94</mixed-citation></ref>'
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.results = [
+            "1.0\t2011Icar..213..564F\t%s\n" % REF_1,
+            "0.0\t...................\t%s\n" % REF_2,
+        ]
+
+    def test_reference_key(self):
+        self.assertEqual(
+            resolver.reference_key(REF_1),
+            resolver.reference_key(REF_1.replace("<mixed", "\n  <mixed").replace(" ", "\xa0", 1)),
+        )
+        self.assertNotEqual(resolver.reference_key(REF_1), resolver.reference_key(REF_2))
+
+    def test_index(self):
+        index = resolver.ReferenceIndex()
+        index.add_results(["score bibcode reference\n"] + self.results)
+
+        # references that weren't resolved aren't indexed
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.lookup(REF_1), "2011Icar..213..564F")
+        self.assertIsNone(index.lookup(REF_2))
+        self.assertEqual(index.lookup_many([REF_2, REF_1]), [None, "2011Icar..213..564F"])
+
+        # the bibcode with the highest score is kept
+        index.add_results(["0.5\t2011Icar..213..564X\t%s\n" % REF_1])
+        self.assertEqual(index.lookup(REF_1), "2011Icar..213..564F")
+        index.add_results(["2.0\t2011Icar..213..564G\t%s\n" % REF_1])
+        self.assertEqual(index.lookup(REF_1), "2011Icar..213..564G")
+        index.close()
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results_file = os.path.join(tmpdir, "2019AJ....158..139F.iopft.xml.result")
+            with open(results_file, "w") as fp:
+                fp.writelines(self.results)
+            index_file = os.path.join(tmpdir, "references.db")
+
+            result = CliRunner().invoke(cli.cli, ["index-references", index_file, tmpdir + "/*"])
+            self.assertEqual(result.exit_code, 0)
+
+            index = resolver.ReferenceIndex(index_file)
+            self.assertEqual(index.lookup(REF_1), "2011Icar..213..564F")
+            index.close()
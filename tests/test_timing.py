@@ -0,0 +1,73 @@
+import os
+import unittest
+
+from adsingestp import timing
+from adsingestp.parsers import dubcore
+
+
+class TestTiming(unittest.TestCase):
+    def setUp(self):
+        stubdata_dir = os.path.join(os.path.dirname(__file__), "stubdata/")
+        with open(os.path.join(stubdata_dir, "input", "arxiv_1711_05739.xml"), "rb") as fp:
+            self.input_data = fp.read()
+
+    def tearDown(self):
+        timing.set_default_sink(None)
+
+    def test_instrument(self):
+        sink = timing.MemoryTimingSink()
+        parser = timing.instrument(dubcore.DublinCoreParser(), sink)
+        parsed = parser.parse(self.input_data)
+
+        stats = {s["stage"]: s for s in sink.stats()}
+        for stage in ["parse", "bsstrtodict", "_parse_title", "_parse_author", "format"]:
+            self.assertIn(stage, stats)
+            self.assertEqual(stats[stage]["parser"], "DublinCoreParser")
+        self.assertEqual(stats["parse"]["count"], 1)
+        self.assertGreaterEqual(stats["parse"]["total"], stats["_parse_author"]["total"])
+        self.assertEqual(sink.stats()[0]["stage"], "parse")
+
+        # instrumenting doesn't change the output
+        unparsed = dubcore.DublinCoreParser().parse(self.input_data)
+        parsed["recordData"]["parsedTime"] = unparsed["recordData"]["parsedTime"] = ""
+        self.assertEqual(parsed, unparsed)
+
+        prometheus = sink.to_prometheus()
+        self.assertIn("# TYPE adsingestp_stage_seconds_total counter", prometheus)
+        self.assertIn(
+            'adsingestp_stage_calls_total{parser="DublinCoreParser",stage="parse"} 1', prometheus
+        )
+
+        sink.reset()
+        self.assertEqual(sink.stats(), [])
+
+    def test_sink(self):
+        class IncompleteSink(timing.TimingSink):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSink()
+
+        calls = []
+
+        class ListSink(timing.TimingSink):
+            def record(self, parser, stage, seconds):
+                calls.append((parser, stage))
+
+        timing.instrument(dubcore.DublinCoreParser(), ListSink()).parse(self.input_data)
+        self.assertIn(("DublinCoreParser", "parse"), calls)
+
+    def test_default_sink(self):
+        sink = timing.MemoryTimingSink()
+        timing.set_default_sink(sink)
+        dubcore.DublinCoreParser().parse(self.input_data)
+        dubcore.DublinCoreParser().parse(self.input_data)
+        stats = {s["stage"]: s for s in sink.stats()}
+        self.assertEqual(stats["parse"]["count"], 2)
+
+        # parsers created without a default sink aren't instrumented
+        timing.set_default_sink(None)
+        parser = dubcore.DublinCoreParser()
+        self.assertNotIn("parse", vars(parser))
+        parser.parse(self.input_data)
+        self.assertEqual({s["stage"]: s for s in sink.stats()}["parse"]["count"], 2)
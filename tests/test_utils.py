@@ -149,3 +149,70 @@ class TestAuthorNames(unittest.TestCase):
             )
 
             self.assertEqual(parsed, expected_authors[idx])
+
+    def test_shared_name_data(self):
+        # the name dictionaries are loaded once and shared by every parser
+        self.assertIs(utils.get_author_names(), utils.get_author_names())
+        self.assertIs(utils.get_author_name_data(), utils.get_author_name_data())
+        self.assertIs(self.name_parser.first_names, utils.get_author_name_data().first_names)
+
+        name_data = utils.get_author_name_data()
+        self.assertIsInstance(name_data.first_names, frozenset)
+        self.assertIsInstance(name_data.last_names, frozenset)
+        self.assertIn("ELIZABETH", name_data.first_names)
+        with self.assertRaises(AttributeError):
+            name_data.first_names = frozenset()
+
+    def test_reload_name_data(self):
+        old_parser = utils.get_author_names()
+        old_data = utils.get_author_name_data()
+
+        new_data = utils.reload_author_names()
+
+        self.assertIsNot(new_data, old_data)
+        self.assertIs(utils.get_author_name_data(), new_data)
+        self.assertIsNot(utils.get_author_names(), old_parser)
+        self.assertEqual(new_data, old_data)
+        self.assertEqual(
+            utils.get_author_names().parse("Elizabeth Miller"),
+            old_parser.parse("Elizabeth Miller"),
+        )
+
+    def test_parse_cache(self):
+        name_parser = utils.AuthorNames(cache_size=2)
+
+        parsed = name_parser.parse("Elizabeth Miller")
+        self.assertEqual(name_parser.cache_info().misses, 1)
+        self.assertEqual(name_parser.cache_info().hits, 0)
+
+        # callers get their own copy, so annotating it doesn't touch the cache
+        parsed[0]["orcid"] = "0000-0002-1825-0097"
+        parsed_again = name_parser.parse("Elizabeth Miller")
+        self.assertEqual(name_parser.cache_info().hits, 1)
+        self.assertNotIn("orcid", parsed_again[0])
+        self.assertEqual(parsed_again, name_parser.parse("Elizabeth Miller", use_cache=False))
+
+        # different params are cached separately
+        name_parser.parse(
+            "Collaboration, Gaia",
+            collaborations_params={"fix_arXiv_mixed_collaboration_string": True},
+        )
+        self.assertEqual(name_parser.cache_info().misses, 2)
+        self.assertEqual(
+            name_parser.parse("Collaboration, Gaia"),
+            [{"nameraw": "Collaboration, Gaia", "collab": "Collaboration, Gaia"}],
+        )
+        self.assertEqual(name_parser.cache_info().misses, 3)
+
+        # bounded: least recently used entries are evicted
+        self.assertEqual(name_parser.cache_info().currsize, 2)
+        name_parser.parse("Elizabeth Miller")
+        self.assertEqual(name_parser.cache_info().misses, 4)
+
+        name_parser.cache_clear()
+        self.assertEqual(name_parser.cache_info().currsize, 0)
+
+        # opt out entirely
+        uncached_parser = utils.AuthorNames(cache_size=0)
+        self.assertIsNone(uncached_parser.cache_info())
+        self.assertEqual(uncached_parser.parse("Elizabeth Miller"), parsed_again)
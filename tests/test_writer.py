@@ -0,0 +1,118 @@
+import gzip
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import unittest
+
+from click.testing import CliRunner
+
+from adsingestp import cli, writer
+
+
+class TestWriter(unittest.TestCase):
+    def setUp(self):
+        self.records = [{"title": "Record %d" % i, "authors": ["Smîth"]} for i in range(100)]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read_lines(self, path, compression=None):
+        opener = gzip.open if compression == "gzip" else open
+        with opener(path, "rb") as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_ndjson(self):
+        path = os.path.join(self.tmpdir.name, "records.jsonl")
+        with writer.NDJSONWriter(path, buffer_size=100) as ndjson:
+            ndjson.write_many(self.records[:-1])
+            # records already serialized by a parser with output="json"
+            ndjson.write(b'{"title":"Record 99","authors":["Sm\xc3\xaeth"]}')
+        self.assertEqual(ndjson.records, 100)
+        self.assertEqual(ndjson.paths, [path])
+        self.assertEqual(self.read_lines(path), self.records)
+
+        # binary file objects aren't closed
+        output = io.BytesIO()
+        with writer.NDJSONWriter(output, compression="gzip") as ndjson:
+            ndjson.write_many(self.records)
+        self.assertEqual(
+            [json.loads(line) for line in gzip.decompress(output.getvalue()).splitlines()],
+            self.records,
+        )
+
+        with self.assertRaises(ValueError):
+            writer.NDJSONWriter(path, compression="bz2")
+        with self.assertRaises(ValueError):
+            writer.NDJSONWriter(path, max_bytes=1000)
+
+    def test_shards(self):
+        path = os.path.join(self.tmpdir.name, "records-{shard:02d}.jsonl.gz")
+        with writer.NDJSONWriter(path, "gzip", max_bytes=200, buffer_size=1000) as ndjson:
+            ndjson.write_many(self.records)
+
+        # each shard ends with a whole record, and no empty shard is left at the end
+        self.assertGreater(len(ndjson.paths), 1)
+        self.assertEqual(ndjson.paths[1], path.format(shard=1))
+        records = []
+        for p in ndjson.paths:
+            shard = self.read_lines(p, "gzip")
+            self.assertTrue(shard)
+            records.extend(shard)
+        self.assertEqual(records, self.records)
+
+    def test_queued_writer(self):
+        # a writer that waits to be released, to fill the queue
+        release = threading.Event()
+        written = []
+
+        class SlowWriter(object):
+            def write(self, record):
+                release.wait()
+                written.append(record)
+
+            def close(self):
+                written.append("closed")
+
+        queued = writer.QueuedWriter(SlowWriter(), maxsize=2)
+        queued.put(1)
+        queued.put(2)
+        queued.put(3)
+        with self.assertRaises(queue.Full):
+            queued.put(4, timeout=0.1)
+        release.set()
+        queued.close()
+        self.assertEqual(written, [1, 2, 3, "closed"])
+
+        # errors are raised in the producer
+        queued = writer.QueuedWriter(writer.NDJSONWriter(io.BytesIO()))
+        queued.put({"unserializable": object()})
+        with self.assertRaises(TypeError):
+            queued.close()
+
+    def test_ingest_cli(self):
+        inputdir = os.path.join(os.path.dirname(__file__), "stubdata", "input")
+        filenames = [
+            os.path.join(inputdir, f + ".xml")
+            for f in ["jats_apj_859_2_101", "jats_mnras_493_1_141", "jats_aj_158_4_139"]
+        ]
+        output = os.path.join(self.tmpdir.name, "records-{shard}.jsonl.gz")
+        result = CliRunner().invoke(
+            cli.cli,
+            ["ingest", "-f", "jats", "-w", "1", "-o", output, "--compression", "gzip"]
+            + ["--max-bytes", "1"]
+            + filenames,
+        )
+        self.assertEqual(result.exit_code, 0)
+        # the output is only written in batches, so all three records are in one shard
+        records = self.read_lines(output.format(shard=0), "gzip")
+        self.assertEqual([r["file"] for r in records], filenames)
+        self.assertFalse(os.path.exists(output.format(shard=1)))
+
+        result = CliRunner().invoke(
+            cli.cli, ["ingest", "-f", "jats", "--max-bytes", "1"] + filenames
+        )
+        self.assertEqual(result.exit_code, 2)